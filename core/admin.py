@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Doctor, Patient, Appointment, MedicalRecord
+from .models import (
+    User, Doctor, Patient, Appointment, MedicalRecord,
+    DoctorSchedule, ScheduleBreak, ScheduleException,
+)
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -26,3 +29,23 @@ class PatientAdmin(admin.ModelAdmin):
 
 admin.site.register(Appointment)
 admin.site.register(MedicalRecord)
+
+
+class ScheduleBreakInline(admin.TabularInline):
+    model = ScheduleBreak
+    extra = 0
+
+
+@admin.register(DoctorSchedule)
+class DoctorScheduleAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes')
+    list_filter = ('weekday',)
+    list_select_related = ('doctor__user',)
+    inlines = [ScheduleBreakInline]
+
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'start_time', 'end_time', 'is_available', 'reason')
+    list_filter = ('is_available',)
+    list_select_related = ('doctor__user',)
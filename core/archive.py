@@ -0,0 +1,129 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Value
+from django.utils import timezone
+
+from . import pdfs
+from .models import Appointment, ArchivedAppointment, ArchivedMedicalRecord, MedicalRecord
+from .timeranges import start_of_day
+
+
+# ---------------------------------------------------
+# WHAT MOVES
+# ---------------------------------------------------
+# Finished appointments and medical records older than the cutoff move from
+# the live tables to the Archived* tables (same columns, same ids). Rollups
+# and daily counters keep counting archived appointments, so charts and
+# reconciliation see the full history.
+ARCHIVED_STATUSES = ('Completed', 'Rejected')
+
+TABLES = {
+    'appointments': {
+        'model': Appointment,
+        'archive': ArchivedAppointment,
+        'date_field': 'date_time',
+        'filter': Q(status__in=ARCHIVED_STATUSES),
+        'fields': ['id', 'patient_id', 'doctor_id', 'date_time', 'status', 'active_slot'],
+    },
+    'records': {
+        'model': MedicalRecord,
+        'archive': ArchivedMedicalRecord,
+        'date_field': 'created_at',
+        'filter': Q(),
+        'fields': ['id', 'patient_id', 'doctor_id', 'description', 'created_at'],
+    },
+}
+
+
+def cutoff(days=None):
+    """Start of the local day ``days`` (default ARCHIVE_AFTER_DAYS) ago."""
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    return start_of_day(timezone.localdate() - timedelta(days=days))
+
+
+def pending(kind, before):
+    spec = TABLES[kind]
+    return spec['model'].objects.filter(spec['filter'], **{f"{spec['date_field']}__lt": before})
+
+
+# ---------------------------------------------------
+# MOVING ROWS (used by `manage.py archive_old_data`)
+# ---------------------------------------------------
+# Every batch is its own short transaction: lock the oldest `batch_size`
+# matching rows, copy them, delete them. A batch either moves completely
+# or not at all, and moved rows no longer match, so an interrupted run
+# simply continues where it stopped when started again.
+def move_batch(kind, before, batch_size):
+    spec = TABLES[kind]
+    with transaction.atomic():
+        rows = list(
+            pending(kind, before)
+            .select_for_update()
+            .order_by(spec['date_field'], 'id')
+            .values(*spec['fields'])[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        spec['archive'].objects.bulk_create([spec['archive'](**row) for row in rows])
+        # A raw DELETE: no per-row signals, so the rollups, counters, search
+        # index and cached PDFs (all still valid for archived rows) stay put.
+        moved = spec['model'].objects.filter(pk__in=[row['id'] for row in rows])
+        moved._raw_delete(moved.db)
+    return len(rows)
+
+
+def archive(kind, before, batch_size=500, limit=None, pause=0.0, progress=None):
+    moved = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        count = move_batch(kind, before, size)
+        if not count:
+            break
+        moved += count
+        if progress:
+            progress(kind, moved)
+        if pause:
+            # Let other writers at the table between batches
+            time.sleep(pause)
+    return moved
+
+
+# ---------------------------------------------------
+# READING FULL HISTORY (live + archived)
+# ---------------------------------------------------
+# One UNION ALL query per list, as dicts with an `archived` flag.
+def patient_appointments(patient):
+    fields = ('id', 'date_time', 'status', 'doctor_id')
+    live = Appointment.objects.filter(patient=patient).values(*fields, archived=Value(False))
+    cold = ArchivedAppointment.objects.filter(patient=patient).values(*fields, archived=Value(True))
+    return live.union(cold, all=True).order_by('-date_time', '-id')
+
+
+def patient_records(patient):
+    fields = ('id', 'created_at', 'description', 'doctor_id')
+    live = MedicalRecord.objects.filter(patient=patient).values(*fields, archived=Value(False))
+    cold = ArchivedMedicalRecord.objects.filter(patient=patient).values(*fields, archived=Value(True))
+    return live.union(cold, all=True).order_by('-created_at', '-id')
+
+
+def archived_record_queryset():
+    return ArchivedMedicalRecord.objects.select_related('patient__user', 'doctor__user')
+
+
+def find_record(pk):
+    """The live record, else its archived copy, else None."""
+    return pdfs.record_queryset().filter(pk=pk).first() or archived_record_queryset().filter(pk=pk).first()
+
+
+def records_by_id(ids):
+    """in_bulk() over both tables; the archive is only queried for ids the live table lacks."""
+    records = pdfs.record_queryset().in_bulk(ids) if ids else {}
+    missing = [pk for pk in ids if pk not in records]
+    if missing:
+        records.update(archived_record_queryset().in_bulk(missing))
+    return records
+
@@ -0,0 +1,220 @@
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from .models import Appointment, DoctorSchedule, ScheduleException
+from .timeranges import date_range, in_range, start_of_day
+
+
+DAY_MINUTES = 24 * 60
+
+
+# ---------------------------------------------------
+# MINUTE-OF-DAY INTERVAL HELPERS
+# ---------------------------------------------------
+# Schedules are handled as (start_minute, end_minute) pairs within a local
+# day, which keeps the per-day work to a few integer comparisons.
+def to_minutes(t, default):
+    return default if t is None else t.hour * 60 + t.minute
+
+
+def subtract(windows, cuts):
+    """Remove every (start, end) in `cuts` from the (start, end, slot) windows."""
+    for cut_start, cut_end in cuts:
+        remaining = []
+        for start, end, slot in windows:
+            if cut_end <= start or cut_start >= end:
+                remaining.append((start, end, slot))
+                continue
+            if start < cut_start:
+                remaining.append((start, cut_start, slot))
+            if cut_end < end:
+                remaining.append((cut_end, end, slot))
+        windows = remaining
+    return windows
+
+
+# ---------------------------------------------------
+# PER-DOCTOR CALENDAR (plain data, no ORM)
+# ---------------------------------------------------
+class DoctorCalendar:
+    """
+    weekly:     {weekday: [(start_min, end_min, slot_minutes, [(break_start, break_end), ...])]}
+    exceptions: {date: [(start_min, end_min, is_available, slot_minutes)]}
+    busy:       sorted POSIX timestamps of active appointment start times
+    """
+
+    __slots__ = ('doctor_id', 'weekly', 'exceptions', 'busy', '_weekday_windows')
+
+    def __init__(self, doctor_id, weekly=None, exceptions=None, busy=None):
+        self.doctor_id = doctor_id
+        self.weekly = weekly or {}
+        self.exceptions = exceptions or {}
+        self.busy = sorted(busy or ())
+        self._weekday_windows = {}
+
+    def weekday_windows(self, weekday):
+        if weekday not in self._weekday_windows:
+            windows = []
+            for start, end, slot, breaks in self.weekly.get(weekday, ()):
+                windows.extend(subtract([(start, end, slot)], breaks))
+            windows.sort()
+            self._weekday_windows[weekday] = windows
+        return self._weekday_windows[weekday]
+
+    def windows(self, day):
+        windows = self.weekday_windows(day.weekday())
+        if day not in self.exceptions:
+            return windows
+
+        windows = list(windows)
+        blocked = []
+        for start, end, is_available, slot in self.exceptions.get(day, ()):
+            if is_available:
+                windows.append((start, end, slot))
+            else:
+                blocked.append((start, end))
+
+        windows = subtract(windows, blocked)
+        windows.sort()
+        return windows
+
+    def free_slots(self, first_day, last_day, tz, not_before=None, midnights=None):
+        """Yield (timestamp, doctor_id, slot_minutes) for every free slot, in order."""
+        busy = self.busy
+        hint = 0
+        last_end = not_before or float('-inf')
+
+        for day, midnight in midnights or local_midnights(first_day, last_day, tz):
+            windows = self.windows(day)
+            if windows:
+                for start, end, slot in windows:
+                    length = slot * 60
+                    ts = midnight + start * 60
+                    stop = midnight + end * 60
+                    while ts + length <= stop:
+                        # Overlapping windows / past slots are skipped, which
+                        # keeps timestamps increasing for the busy pointer.
+                        if ts >= last_end:
+                            # An appointment starting in (ts - length, ts + length)
+                            # overlaps this slot.
+                            hint = bisect_right(busy, ts - length, hint)
+                            if hint == len(busy) or busy[hint] >= ts + length:
+                                yield ts, self.doctor_id, slot
+                                last_end = ts + length
+                        ts += length
+
+
+def local_midnights(first_day, last_day, tz):
+    days = []
+    day = first_day
+    while day <= last_day:
+        days.append((day, start_of_day(day, tz).timestamp()))
+        day += timedelta(days=1)
+    return days
+
+
+def merged_free_slots(calendars, first_day, last_day, tz, not_before=None):
+    """Free slots of many doctors as one time-ordered stream."""
+    midnights = local_midnights(first_day, last_day, tz)
+    return heapq.merge(*(
+        calendar.free_slots(first_day, last_day, tz, not_before, midnights) for calendar in calendars
+    ))
+
+
+# ---------------------------------------------------
+# LOADING CALENDARS FROM THE DATABASE (fixed query count)
+# ---------------------------------------------------
+def load_calendars(doctor_ids, first_day, last_day, exclude_appointment=None):
+    doctor_ids = list(doctor_ids)
+    calendars = {doctor_id: DoctorCalendar(doctor_id) for doctor_id in doctor_ids}
+
+    schedules = (
+        DoctorSchedule.objects
+        .filter(doctor_id__in=doctor_ids)
+        .prefetch_related('breaks')
+    )
+    for rule in schedules:
+        breaks = [(to_minutes(b.start_time, 0), to_minutes(b.end_time, DAY_MINUTES)) for b in rule.breaks.all()]
+        calendars[rule.doctor_id].weekly.setdefault(rule.weekday, []).append(
+            (to_minutes(rule.start_time, 0), to_minutes(rule.end_time, DAY_MINUTES), rule.slot_minutes, breaks)
+        )
+
+    exceptions = ScheduleException.objects.filter(
+        doctor_id__in=doctor_ids, date__gte=first_day, date__lte=last_day
+    ).values_list('doctor_id', 'date', 'start_time', 'end_time', 'is_available', 'slot_minutes')
+    for doctor_id, day, start, end, is_available, slot in exceptions:
+        calendars[doctor_id].exceptions.setdefault(day, []).append(
+            (to_minutes(start, 0), to_minutes(end, DAY_MINUTES), is_available, slot)
+        )
+
+    # Pad the window so an appointment just before midnight still blocks
+    # the first slot of the next day.
+    start, end = date_range(first_day - timedelta(days=1), last_day)
+    appointments = (
+        Appointment.objects
+        .filter(doctor_id__in=doctor_ids, **in_range('date_time', (start, end)))
+        .exclude(status='Rejected')
+    )
+    if exclude_appointment is not None:
+        appointments = appointments.exclude(pk=exclude_appointment)
+
+    busy = defaultdict(list)
+    for doctor_id, date_time in appointments.values_list('doctor_id', 'date_time').order_by('date_time'):
+        busy[doctor_id].append(date_time.timestamp())
+    for doctor_id, starts in busy.items():
+        calendars[doctor_id].busy = starts   # already sorted by the query
+
+    return calendars
+
+
+# ---------------------------------------------------
+# PUBLIC API
+# ---------------------------------------------------
+def _slot(ts, doctor_id, slot, tz):
+    return {
+        'doctor_id': doctor_id,
+        'start': datetime.fromtimestamp(ts, tz),
+        'end': datetime.fromtimestamp(ts + slot * 60, tz),
+    }
+
+
+def free_slots(doctor, first_day, last_day):
+    tz = timezone.get_current_timezone()
+    calendar = load_calendars([doctor.pk], first_day, last_day)[doctor.pk]
+    now = timezone.now().timestamp()
+    return [_slot(*row, tz) for row in calendar.free_slots(first_day, last_day, tz, not_before=now)]
+
+
+def next_free_slots(doctors, limit=50, days=30, first_day=None):
+    """
+    Earliest `limit` free slots across a doctor queryset, e.g.
+    next_free_slots(Doctor.objects.filter(specialization='Cardiology')).
+    Runs five queries however many doctors or days are involved.
+    """
+    tz = timezone.get_current_timezone()
+    first_day = first_day or timezone.localdate()
+    last_day = first_day + timedelta(days=days - 1)
+
+    doctor_ids = list(doctors.values_list('pk', flat=True))
+    calendars = load_calendars(doctor_ids, first_day, last_day).values()
+    now = timezone.now().timestamp()
+
+    stream = merged_free_slots(calendars, first_day, last_day, tz, not_before=now)
+    return [_slot(*row, tz) for row in islice(stream, limit)]
+
+
+def has_schedule(doctor):
+    return DoctorSchedule.objects.filter(doctor=doctor).exists()
+
+
+def is_slot_free(doctor, date_time, exclude_appointment=None):
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(date_time, tz).date()
+    calendar = load_calendars([doctor.pk], day, day, exclude_appointment)[doctor.pk]
+    wanted = date_time.timestamp()
+    return any(ts == wanted for ts, _, _ in calendar.free_slots(day, day, tz))
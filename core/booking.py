@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+
+from .models import Appointment
+
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.01
+
+
+class SlotUnavailable(Exception):
+    def __init__(self, message="This time slot has just been booked. Please choose another one."):
+        super().__init__(message)
+        self.message = message
+
+
+def slot_taken(doctor_id, date_time, exclude=None):
+    qs = Appointment.objects.filter(doctor_id=doctor_id, date_time=date_time, active_slot=True)
+    if exclude is not None:
+        qs = qs.exclude(pk=exclude)
+    return qs.exists()
+
+
+# ---------------------------------------------------
+# BOOKING
+# ---------------------------------------------------
+# The unique (doctor, date_time, active_slot) constraint is what keeps two
+# concurrent requests from both winning a slot; no row or table locks are
+# taken. The loser's INSERT/UPDATE fails with IntegrityError and is turned
+# into SlotUnavailable. Transient lock errors (deadlock, lock wait timeout,
+# "database is locked") are retried with jittered exponential backoff.
+def book(appointment, attempts=MAX_ATTEMPTS):
+    creating = appointment._state.adding
+
+    for attempt in range(attempts):
+        try:
+            try:
+                with transaction.atomic():
+                    appointment.save()
+                return appointment
+            except IntegrityError:
+                if slot_taken(appointment.doctor_id, appointment.date_time, exclude=appointment.pk):
+                    raise SlotUnavailable()
+                raise
+
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            if creating:
+                # The INSERT was rolled back -> start again as a new row
+                appointment.pk = None
+                appointment._state.adding = True
+            time.sleep(BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random()))
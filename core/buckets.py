@@ -0,0 +1,64 @@
+from collections import Counter
+
+from django.db import connection
+
+from . import counters, rollups
+from .models import AppointmentCounter, AppointmentRollup
+
+
+# ---------------------------------------------------
+# BULK BUCKET MOVES
+# ---------------------------------------------------
+# core.signals moves one appointment at a time between (period, doctor,
+# status) buckets, two queries per table. Bulk operations that skip the
+# signals (raw deletes, one-UPDATE status changes) pass all their moves
+# here instead: new target buckets are created in one INSERT, then every
+# bucket of a table is adjusted with a single executemany().
+TABLES = [
+    # (module with bucket_for(), model, period column)
+    (rollups, AppointmentRollup, 'month'),
+    (counters, AppointmentCounter, 'day'),
+]
+
+
+def _apply(model, period, deltas):
+    deltas = {bucket: delta for bucket, delta in deltas.items() if bucket is not None and delta}
+    if not deltas:
+        return
+
+    # Like bump(): decrements never create a bucket
+    model.objects.bulk_create(
+        [model(**{period: key, 'doctor_id': doctor_id, 'status': status, 'count': 0})
+         for (key, doctor_id, status), delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+
+    quote = connection.ops.quote_name
+    column = {name: quote(model._meta.get_field(name).column) for name in (period, 'doctor', 'status', 'count')}
+    sql = 'UPDATE {table} SET {count} = {count} + %s WHERE {period} = %s AND {doctor} = %s AND {status} = %s'.format(
+        table=quote(model._meta.db_table), count=column['count'],
+        period=column[period], doctor=column['doctor'], status=column['status'],
+    )
+    period_field = model._meta.get_field(period)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (delta, period_field.get_db_prep_value(key, connection), doctor_id, status)
+            for (key, doctor_id, status), delta in deltas.items()
+        ])
+
+
+def move_many(moves):
+    """
+    Bulk version of core.signals._move(). `moves` yields (old_state, new_state)
+    pairs of (date_time, doctor_id, status); None on either side for a row
+    that is created or deleted.
+    """
+    moves = Counter(moves)
+    for table, model, period in TABLES:
+        deltas = Counter()
+        for (old, new), count in moves.items():
+            if old is not None:
+                deltas[table.bucket_for(*old)] -= count
+            if new is not None:
+                deltas[table.bucket_for(*new)] += count
+        _apply(model, period, deltas)
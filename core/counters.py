@@ -0,0 +1,144 @@
+from collections import Counter, namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Appointment, AppointmentCounter, ArchivedAppointment, Doctor
+
+
+STATUSES = ['Pending', 'Confirmed', 'Completed', 'Rejected']
+
+Drift = namedtuple('Drift', 'day doctor_id status stored actual')
+
+
+# ---------------------------------------------------
+# INCREMENTAL UPDATES (called from core.signals)
+# ---------------------------------------------------
+# Same scheme as core.rollups, one day wide instead of one month: every
+# status transition moves one appointment from one (day, doctor, status)
+# bucket to another with F() increments, inside Appointment.save()'s
+# transaction.
+def bucket_for(date_time, doctor_id, status):
+    if date_time is None or doctor_id is None:
+        return None
+    return (timezone.localtime(date_time).date(), doctor_id, status)
+
+
+def bump(bucket, delta):
+    if bucket is None or delta == 0:
+        return
+
+    day, doctor_id, status = bucket
+    rows = AppointmentCounter.objects.filter(day=day, doctor_id=doctor_id, status=status)
+
+    if rows.update(count=F('count') + delta) or delta < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            AppointmentCounter.objects.create(day=day, doctor_id=doctor_id, status=status, count=delta)
+    except IntegrityError:
+        rows.update(count=F('count') + delta)
+
+
+def move(old_bucket, new_bucket):
+    if old_bucket == new_bucket:
+        return
+    bump(old_bucket, -1)
+    bump(new_bucket, 1)
+
+
+# ---------------------------------------------------
+# DASHBOARD READS
+# ---------------------------------------------------
+def summary(doctor_id, day=None):
+    """Status totals for one doctor, plus how many fall on ``day`` (default today)."""
+    day = day or timezone.localdate()
+    counts = dict.fromkeys(STATUSES, 0)
+    on_day = 0
+    rows = (
+        AppointmentCounter.objects
+        .filter(doctor_id=doctor_id)
+        .values('status')
+        .annotate(total=Sum('count'), on_day=Sum('count', filter=Q(day=day)))
+        .order_by()
+    )
+    for row in rows:
+        counts[row['status']] = row['total'] or 0
+        on_day += row['on_day'] or 0
+    return {'status_counts': counts, 'today_count': on_day}
+
+
+# ---------------------------------------------------
+# RECONCILIATION (used by `manage.py reconcile_counters`)
+# ---------------------------------------------------
+# Works one doctor at a time so memory stays bounded by the number of
+# (day, status) buckets of a single doctor. Both sides are read in one
+# transaction (a consistent snapshot) and repairs are applied as F()
+# deltas, so transitions committed in the meantime are not overwritten.
+def actual_counts(doctor_id):
+    # Archived appointments still count (see core.archive)
+    totals = Counter()
+    for model in (Appointment, ArchivedAppointment):
+        rows = (
+            model.objects
+            .filter(doctor_id=doctor_id)
+            .annotate(day=TruncDate('date_time'))
+            .values('day', 'status')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for row in rows:
+            totals[row['day'], row['status']] += row['total']
+    return totals
+
+
+def stored_counts(doctor_id):
+    rows = AppointmentCounter.objects.filter(doctor_id=doctor_id).values_list('day', 'status', 'count')
+    return {(day, status): count for day, status, count in rows}
+
+
+def find_drift(doctor_id):
+    with transaction.atomic():
+        actual = actual_counts(doctor_id)
+        stored = stored_counts(doctor_id)
+    return [
+        Drift(day, doctor_id, status, stored.get((day, status), 0), actual.get((day, status), 0))
+        for day, status in sorted(actual.keys() | stored.keys())
+        if stored.get((day, status), 0) != actual.get((day, status), 0)
+    ]
+
+
+@transaction.atomic
+def repair(drift):
+    for d in drift:
+        bump((d.day, d.doctor_id, d.status), d.actual - d.stored)
+    for doctor_id in {d.doctor_id for d in drift}:
+        AppointmentCounter.objects.filter(doctor_id=doctor_id, count=0).delete()
+
+
+def reconcile(doctor_ids=None, fix=False):
+    """Yield (doctor_id, drift) per doctor; with ``fix``, repair each doctor as it goes."""
+    if doctor_ids is None:
+        doctor_ids = list(Doctor.objects.order_by('id').values_list('id', flat=True))
+    for doctor_id in doctor_ids:
+        drift = find_drift(doctor_id)
+        if drift and fix:
+            repair(drift)
+        yield doctor_id, drift
+
+
+@transaction.atomic
+def rebuild():
+    AppointmentCounter.objects.all().delete()
+    created = 0
+    for doctor_id in Doctor.objects.order_by('id').values_list('id', flat=True):
+        buckets = [
+            AppointmentCounter(day=day, doctor_id=doctor_id, status=status, count=total)
+            for (day, status), total in actual_counts(doctor_id).items()
+        ]
+        AppointmentCounter.objects.bulk_create(buckets, batch_size=1000)
+        created += len(buckets)
+    return created
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import counters, rollups
+from .middleware import recorded_queries
+from .models import Appointment, Doctor, MedicalRecord, Patient
+from .timeranges import day_range, in_range
+
+
+# ---------------------------------------------------
+# DASHBOARD QUERIES
+# ---------------------------------------------------
+# Each dashboard is a dict of independent queries (name -> callable that
+# returns a fully evaluated result). The WSGI view runs them one after the
+# other; the ASGI view runs them at the same time, each on its own worker
+# thread and therefore its own database connection.
+def patient_queries(patient):
+    return {
+        'appointments': lambda: list(
+            Appointment.objects.filter(patient=patient)
+            .select_related('doctor__user').order_by('-date_time')
+        ),
+        'records': lambda: list(
+            MedicalRecord.objects.filter(patient=patient)
+            .select_related('doctor__user').order_by('-created_at')
+        ),
+    }
+
+
+def doctor_queries(doctor):
+    return {
+        'appointments': lambda: list(
+            Appointment.objects.filter(doctor=doctor)
+            .select_related('patient__user').order_by('-date_time')
+        ),
+        'patients': lambda: list(
+            Patient.objects.filter(appointment__doctor=doctor).select_related('user').distinct()
+        ),
+        'records': lambda: list(
+            MedicalRecord.objects.filter(patient__appointment__doctor=doctor)
+            .select_related('patient__user').distinct()
+        ),
+        # Read from the daily counters (kept in sync by core.signals)
+        'summary': lambda: counters.summary(doctor.pk),
+    }
+
+
+def doctor_context(doctor, results):
+    return {
+        'doctor': doctor,
+        # Default day for the "all pending on ..." bulk action
+        'tomorrow': timezone.localdate() + timedelta(days=1),
+        **results,
+    }
+
+
+def staff_queries():
+    return {
+        'total_patients': Patient.objects.count,
+        'total_appointments': Appointment.objects.count,
+        'doctors_count': Doctor.objects.count,
+        # Read from the rollup table (kept in sync by core.signals)
+        'status_counts': rollups.status_counts,
+        'monthly': rollups.monthly_counts,
+    }
+
+
+def staff_context(results):
+    status_counts = results['status_counts']
+    monthly = results['monthly']
+    return {
+        'total_patients': results['total_patients'],
+        'total_appointments': results['total_appointments'],
+        'doctors_count': results['doctors_count'],
+        # Lazy: only costs a query if the template ever iterates it
+        'todays_appointments': Appointment.objects.filter(**in_range('date_time', day_range())),
+
+        # chart data
+        'pending_count': status_counts['Pending'],
+        'confirmed_count': status_counts['Confirmed'],
+        'completed_count': status_counts['Completed'],
+        'rejected_count': status_counts['Rejected'],
+        'month_labels': list(monthly.keys()),
+        'month_counts': list(monthly.values()),
+    }
+
+
+# ---------------------------------------------------
+# RUNNERS
+# ---------------------------------------------------
+def run(queries):
+    return {name: query() for name, query in queries.items()}
+
+
+def _on_worker(func):
+    def call(*args, **kwargs):
+        # Worker threads never see request_started/finished, so drop
+        # connections past CONN_MAX_AGE (or broken ones) here instead.
+        close_old_connections()
+        with recorded_queries():
+            return func(*args, **kwargs)
+    return call
+
+
+def in_worker(func):
+    """sync_to_async on the shared thread pool instead of the one main sync thread."""
+    return sync_to_async(_on_worker(func), thread_sensitive=False)
+
+
+async def arun(queries):
+    results = await asyncio.gather(*(in_worker(query)() for query in queries.values()))
+    return dict(zip(queries, results))
@@ -0,0 +1,117 @@
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import buckets, pdfs, search
+from .models import (
+    Appointment, AppointmentEvent, ArchivedAppointment, ArchivedMedicalRecord, MedicalRecord, Patient,
+    ReminderDelivery, User,
+)
+
+
+# ---------------------------------------------------
+# PENDING DELETION
+# ---------------------------------------------------
+# Requesting a deletion only flags the patient and disables their login
+# (two UPDATEs); the rows themselves are removed by the 'delete_patient'
+# job, see delete_patient() below.
+def mark_pending(patient):
+    now = timezone.now()
+    with transaction.atomic():
+        Patient.objects.filter(pk=patient.pk, deletion_requested_at__isnull=True).update(deletion_requested_at=now)
+        User.objects.filter(pk=patient.user_id).update(is_active=False)
+    patient.deletion_requested_at = patient.deletion_requested_at or now
+
+
+# ---------------------------------------------------
+# DEPENDENT ROWS
+# ---------------------------------------------------
+# A cascading patient.delete() loads every related row into memory and
+# deletes them all in one transaction. Here each table is emptied in
+# batches instead, with raw DELETEs, so no per-row signals fire: every
+# batch does by hand what those receivers would have done.
+def _appointments_gone(rows):
+    # Rollups and counters include archived appointments, so both tables count
+    buckets.move_many(((row['date_time'], row['doctor_id'], row['status']), None) for row in rows)
+    ids = [row['id'] for row in rows]
+    AppointmentEvent.objects.filter(appointment_id__in=ids).delete()
+    ReminderDelivery.objects.filter(appointment_id__in=ids).delete()
+
+
+def _records_gone(rows):
+    ids = [row['id'] for row in rows]
+    # Outside the database: only once the batch has committed
+    transaction.on_commit(lambda: search.remove_records(ids))
+    transaction.on_commit(lambda: pdfs.invalidate(*ids))
+
+
+DEPENDENTS = [
+    # (name, model, columns the cleanup needs, cleanup)
+    ('appointments', Appointment, ('id', 'date_time', 'doctor_id', 'status'), _appointments_gone),
+    ('archived_appointments', ArchivedAppointment, ('id', 'date_time', 'doctor_id', 'status'), _appointments_gone),
+    ('records', MedicalRecord, ('id',), _records_gone),
+    ('archived_records', ArchivedMedicalRecord, ('id',), _records_gone),
+]
+
+
+def remaining(patient_id):
+    return {name: model.objects.filter(patient_id=patient_id).count() for name, model, _, _ in DEPENDENTS}
+
+
+def delete_batch(model, fields, cleanup, patient_id, batch_size):
+    """Delete up to `batch_size` of the patient's rows in `model`, in one short transaction."""
+    with transaction.atomic():
+        rows = list(
+            model.objects.filter(patient_id=patient_id)
+            .select_for_update()
+            .order_by('id')
+            .values(*fields)[:batch_size]
+        )
+        if not rows:
+            return 0
+        doomed = model.objects.filter(pk__in=[row['id'] for row in rows])
+        doomed._raw_delete(doomed.db)
+        cleanup(rows)
+    return len(rows)
+
+
+# ---------------------------------------------------
+# THE PIPELINE (run by the 'delete_patient' job)
+# ---------------------------------------------------
+def delete_patient(patient_id, batch_size=1000, pause=0.0, progress=None):
+    """
+    Delete the patient, their user and everything that belongs to them.
+
+    Safe to interrupt and run again: every batch commits on its own and the
+    patient row goes last. `progress(report)` is called after each batch
+    with {'rows': {table: deleted}, 'done': n, 'total': n}.
+    """
+    patient = Patient.objects.filter(pk=patient_id).first()
+    if patient is None:
+        return None
+    if not patient.pending_deletion:
+        mark_pending(patient)
+
+    left = remaining(patient_id)
+    report = {'rows': dict.fromkeys(left, 0), 'done': 0, 'total': sum(left.values())}
+    for name, model, fields, cleanup in DEPENDENTS:
+        while True:
+            count = delete_batch(model, fields, cleanup, patient_id, batch_size)
+            if not count:
+                break
+            report['rows'][name] += count
+            report['done'] += count
+            if progress:
+                progress(report)
+            if pause:
+                # Let other writers in between batches
+                time.sleep(pause)
+
+    # Anything added since (a booking racing the deletion) goes through the
+    # regular cascade along with the patient and the user.
+    with transaction.atomic():
+        user = User.objects.get(pk=patient.user_id)
+        patient.delete()
+        user.delete()
+    return report
@@ -0,0 +1,84 @@
+import hashlib
+
+from django.core.cache import caches
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+
+from .models import Doctor
+
+
+# ---------------------------------------------------
+# CACHED PUBLIC DOCTOR DIRECTORY
+# ---------------------------------------------------
+# The doctor list and profile pages are the same for every visitor, so the
+# rendered fragment (plus its ETag / Last-Modified) is cached until
+# core.signals drops it on a Doctor or doctor User change. The timeout is
+# only a backstop.
+CACHE_ALIAS = 'directory'
+TIMEOUT = 60 * 60 * 24
+LIST_KEY = 'doctor_list'
+
+
+def profile_key(pk):
+    return f'doctor_profile:{pk}'
+
+
+def cache():
+    return caches[CACHE_ALIAS]
+
+
+def _entry(html):
+    return {
+        'html': html,
+        'etag': 'W/"%s"' % hashlib.md5(html.encode()).hexdigest(),
+        'last_modified': int(timezone.now().timestamp()),
+    }
+
+
+def doctor_list():
+    entry = cache().get(LIST_KEY)
+    if entry is None:
+        doctors = Doctor.objects.select_related('user').order_by('id')
+        entry = _entry(render_to_string('doctors/includes/doctor_cards.html', {'doctors': doctors}))
+        cache().set(LIST_KEY, entry, TIMEOUT)
+    return entry
+
+
+def doctor_profile(pk):
+    """Cached profile fragment, or None when there is no such doctor."""
+    entry = cache().get(profile_key(pk))
+    if entry is None:
+        doctor = Doctor.objects.select_related('user').filter(pk=pk).first()
+        if doctor is None:
+            return None
+        entry = _entry(render_to_string('doctors/includes/doctor_card.html', {'doctor': doctor}))
+        cache().set(profile_key(pk), entry, TIMEOUT)
+    return entry
+
+
+def invalidate(*doctor_ids):
+    cache().delete_many([LIST_KEY] + [profile_key(pk) for pk in doctor_ids])
+
+
+# ---------------------------------------------------
+# RESPONSES
+# ---------------------------------------------------
+def respond(request, template, entry):
+    """Render `template` around a cached fragment, or answer 304."""
+    not_modified = get_conditional_response(
+        request, etag=entry['etag'], last_modified=entry['last_modified'],
+    )
+    if not_modified is None:
+        response = render(request, template, {'fragment': mark_safe(entry['html'])})
+    else:
+        response = not_modified
+
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Shared caches may store it, but must revalidate on every use
+    response['Cache-Control'] = 'public, no-cache'
+    return response
@@ -0,0 +1,122 @@
+import logging
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import AppointmentEvent
+
+
+logger = logging.getLogger(__name__)
+
+CODES = AppointmentEvent.STATUS_CODES
+
+
+# ---------------------------------------------------
+# RECORDING (buffered per request)
+# ---------------------------------------------------
+# Every status change (and every new booking) appends one AppointmentEvent.
+# Events are only kept once the change has committed (on_commit), collected
+# in a per-request buffer and written with one bulk INSERT when the request
+# ends (EventBufferMiddleware), or earlier once STATUS_EVENT_BATCH_SIZE
+# have piled up. Outside a buffer (commands, workers) they are written as
+# soon as the change commits.
+_buffer = ContextVar('status_event_buffer', default=None)
+
+
+def record(appointment_id, doctor_id, old_status, new_status, at=None):
+    if old_status == new_status:
+        return
+    event = (appointment_id, doctor_id, CODES.get(old_status, AppointmentEvent.NONE), CODES[new_status],
+             at or timezone.now())
+    # robust: a failed history write is logged, never raised into the code
+    # that made the (already committed) change
+    transaction.on_commit(lambda: _add(event), robust=True)
+
+
+def _add(event):
+    pending = _buffer.get()
+    if pending is None:
+        write([event])
+        return
+    pending.append(event)
+    if len(pending) >= settings.STATUS_EVENT_BATCH_SIZE:
+        flush()
+
+
+def flush():
+    pending = _buffer.get()
+    if pending:
+        events, pending[:] = list(pending), []
+        write(events)
+
+
+def write(events):
+    """Insert (appointment_id, doctor_id, from_code, to_code, at) tuples, filling in `elapsed`."""
+    ids = {event[0] for event in events}
+    last_at = dict(
+        AppointmentEvent.objects.filter(appointment_id__in=ids)
+        .values('appointment_id').annotate(last=Max('at'))
+        .values_list('appointment_id', 'last')
+        .order_by()
+    )
+    rows = []
+    for appointment_id, doctor_id, from_status, status, at in sorted(events, key=lambda event: event[4]):
+        previous = last_at.get(appointment_id)
+        rows.append(AppointmentEvent(
+            appointment_id=appointment_id, doctor_id=doctor_id, from_status=from_status, status=status, at=at,
+            elapsed=None if previous is None else max(int((at - previous).total_seconds()), 0),
+        ))
+        last_at[appointment_id] = at
+    AppointmentEvent.objects.bulk_create(rows, batch_size=settings.STATUS_EVENT_BATCH_SIZE)
+
+
+class EventBufferMiddleware:
+    """Collects the request's status events and writes them in one go at the end."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _buffer.set([])
+        try:
+            return self.get_response(request)
+        finally:
+            pending = _buffer.get()
+            _buffer.reset(token)
+            if pending:
+                try:
+                    write(pending)
+                except Exception:
+                    # The status changes themselves are committed; losing their
+                    # history must not turn the response into an error
+                    logger.exception("Could not write %d status event(s)", len(pending))
+
+
+# ---------------------------------------------------
+# ANALYTICS
+# ---------------------------------------------------
+# Durations are stored on the event (`elapsed`) and indexed per doctor and
+# transition, so a median is a COUNT plus one or two rows read at an offset
+# of the index - no join between events, no sort, no full scan.
+def median_elapsed(doctor_id, from_status, to_status):
+    """Median seconds of the doctor's `from_status` -> `to_status` transitions (None if none)."""
+    durations = (
+        AppointmentEvent.objects
+        .filter(doctor_id=doctor_id, from_status=CODES[from_status], status=CODES[to_status],
+                elapsed__isnull=False)
+        .order_by('elapsed')
+        .values_list('elapsed', flat=True)
+    )
+    count = durations.count()
+    if not count:
+        return None
+    middle = list(durations[(count - 1) // 2:count // 2 + 1])
+    return sum(middle) / len(middle)
+
+
+def median_time_to_confirm(doctor_ids):
+    """{doctor_id: median seconds from Pending to Confirmed, or None}."""
+    return {doctor_id: median_elapsed(doctor_id, 'Pending', 'Confirmed') for doctor_id in doctor_ids}
@@ -0,0 +1,272 @@
+import csv
+import io
+import json
+import shutil
+import zipfile
+import zlib
+from datetime import date, timedelta
+from itertools import chain
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import pdfs
+from .archive import archived_record_queryset
+from .models import Appointment, ArchivedAppointment, MedicalRecord
+from .timeranges import start_of_day
+
+
+CHUNK_SIZE = 500
+
+
+# ---------------------------------------------------
+# STREAM BUFFER
+# ---------------------------------------------------
+class StreamBuffer:
+    """Write-only file object whose contents are handed out in chunks."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        if data:
+            self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+# ---------------------------------------------------
+# KEYSET CHUNKS
+# ---------------------------------------------------
+# Rows are read in (date, id) order, one indexed range query per chunk.
+# That keeps memory at one chunk on every backend: .iterator() alone
+# doesn't, since mysqlclient buffers the whole result.
+def keyset_chunks(queryset, date_field, key, chunk_size=CHUNK_SIZE):
+    """Yield lists of up to `chunk_size` rows; key(row) gives a row's (date, id)."""
+    qs = queryset.order_by(date_field, 'id')
+    after = None
+    while True:
+        chunk = qs
+        if after is not None:
+            last_date, last_id = after
+            chunk = qs.filter(Q(**{f'{date_field}__gt': last_date}) |
+                              Q(**{date_field: last_date, 'id__gt': last_id}))
+        rows = list(chunk[:chunk_size])
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = key(rows[-1])
+
+
+# ---------------------------------------------------
+# APPOINTMENT CSV ROWS
+# ---------------------------------------------------
+APPOINTMENT_COLUMNS = ['id', 'date_time', 'status', 'doctor', 'specialization']
+
+
+def appointment_rows(queryset):
+    rows = queryset.values_list('id', 'date_time', 'status', 'doctor__user__first_name',
+                                'doctor__user__last_name', 'doctor__specialization')
+    for chunk in keyset_chunks(rows, 'date_time', lambda row: (row[1], row[0]), CHUNK_SIZE):
+        for pk, date_time, status, first, last, specialization in chunk:
+            yield [pk, timezone.localtime(date_time).isoformat(), status,
+                   f'{first} {last}'.strip(), specialization]
+
+
+# ---------------------------------------------------
+# PATIENT HISTORY ZIP (record PDFs + appointments.csv)
+# ---------------------------------------------------
+def record_filename(record):
+    return f"records/{timezone.localtime(record.created_at):%Y-%m-%d}_{record.pk}.pdf"
+
+
+def patient_archive(patient, progress=None, doctor=None):
+    """
+    Yield a ZIP archive of `patient`'s history piece by piece. Records are
+    read in keyset chunks and every PDF comes from the disk cache
+    (rendered on a miss), so memory stays flat however long the history is.
+    With `doctor`, only that doctor's records are included (as in record_pdf).
+    """
+    buffer = StreamBuffer()
+    records_filter = Q(patient=patient) if doctor is None else Q(patient=patient, doctor=doctor)
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        # Full history: archived records (the oldest) first, then live ones
+        records = chain.from_iterable(
+            chain.from_iterable(keyset_chunks(queryset.filter(records_filter), 'created_at',
+                                              lambda record: (record.created_at, record.pk), CHUNK_SIZE))
+            for queryset in (archived_record_queryset(), pdfs.record_queryset())
+        )
+        for record in records:
+            src, _ = pdfs.open_pdf(record)
+            with src, archive.open(record_filename(record), 'w') as dst:
+                shutil.copyfileobj(src, dst)
+            if progress:
+                progress(record)
+            yield from buffer.drain()
+
+        with archive.open('appointments.csv', 'w', force_zip64=True) as raw:
+            out = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            writer = csv.writer(out)
+            writer.writerow(APPOINTMENT_COLUMNS)
+            rows = chain(
+                appointment_rows(ArchivedAppointment.objects.filter(patient=patient)),
+                appointment_rows(Appointment.objects.filter(patient=patient)),
+            )
+            for i, row in enumerate(rows, 1):
+                writer.writerow(row)
+                if i % CHUNK_SIZE == 0:
+                    out.flush()
+                    yield from buffer.drain()
+            out.flush()
+            out.detach()
+
+    # Central directory is written when the archive closes
+    yield from buffer.drain()
+
+
+def patient_archive_name(patient):
+    return f"patient_{patient.pk}_history.zip"
+
+
+# ---------------------------------------------------
+# TABLE EXPORTS (CSV / JSONL, optionally gzipped)
+# ---------------------------------------------------
+# Rows are read as values_list() tuples, in keyset chunks (see above).
+FORMATS = ('csv', 'jsonl')
+
+
+def _iso(value):
+    return timezone.localtime(value).isoformat() if value else ''
+
+
+def _name(first, last):
+    return f'{first or ""} {last or ""}'.strip()
+
+
+EXPORTS = {
+    'appointments': {
+        'model': Appointment,
+        'date_field': 'date_time',
+        'columns': ['id', 'date_time', 'status', 'patient_id', 'patient',
+                    'doctor_id', 'doctor', 'specialization'],
+        'values': ['id', 'date_time', 'status',
+                   'patient_id', 'patient__user__first_name', 'patient__user__last_name',
+                   'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name',
+                   'doctor__specialization'],
+        'row': lambda v: [v[0], _iso(v[1]), v[2], v[3], _name(v[4], v[5]), v[6], _name(v[7], v[8]), v[9]],
+    },
+    'records': {
+        'model': MedicalRecord,
+        'date_field': 'created_at',
+        'columns': ['id', 'created_at', 'patient_id', 'patient', 'doctor_id', 'doctor', 'description'],
+        'values': ['id', 'created_at',
+                   'patient_id', 'patient__user__first_name', 'patient__user__last_name',
+                   'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name',
+                   'description'],
+        'row': lambda v: [v[0], _iso(v[1]), v[2], _name(v[3], v[4]), v[5] or '', _name(v[6], v[7]), v[8]],
+    },
+}
+STATUSES = [value for value, _ in Appointment._meta.get_field('status').choices]
+
+
+def parse_filters(kind, params):
+    """
+    Validate export filters from a query string / command options:
+    from / to (YYYY-MM-DD, inclusive), doctor, patient, status.
+    Raises ValueError with a readable message.
+    """
+    filters = {}
+    for name in ('from', 'to'):
+        if params.get(name):
+            try:
+                filters[name] = date.fromisoformat(params[name])
+            except ValueError:
+                raise ValueError(f"{name} must be a date (YYYY-MM-DD).")
+    for name in ('doctor', 'patient'):
+        if params.get(name):
+            try:
+                filters[name] = int(params[name])
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} must be a number.")
+    if params.get('status'):
+        if kind != 'appointments':
+            raise ValueError("status only applies to appointments.")
+        if params['status'] not in STATUSES:
+            raise ValueError(f"status must be one of {', '.join(STATUSES)}.")
+        filters['status'] = params['status']
+    return filters
+
+
+def export_queryset(kind, filters):
+    spec = EXPORTS[kind]
+    date_field = spec['date_field']
+    qs = spec['model'].objects.all()
+    if 'from' in filters:
+        qs = qs.filter(**{f'{date_field}__gte': start_of_day(filters['from'])})
+    if 'to' in filters:
+        qs = qs.filter(**{f'{date_field}__lt': start_of_day(filters['to'] + timedelta(days=1))})
+    if 'doctor' in filters:
+        qs = qs.filter(doctor_id=filters['doctor'])
+    if 'patient' in filters:
+        qs = qs.filter(patient_id=filters['patient'])
+    if 'status' in filters:
+        qs = qs.filter(status=filters['status'])
+    return qs
+
+
+def export_rows(kind, queryset, chunk_size=CHUNK_SIZE):
+    """Yield lists of formatted rows, one list per chunk."""
+    spec = EXPORTS[kind]
+    rows = queryset.values_list(*spec['values'])
+    for chunk in keyset_chunks(rows, spec['date_field'], lambda row: (row[1], row[0]), chunk_size):
+        yield [spec['row'](row) for row in chunk]
+
+
+def export_chunks(kind, queryset, fmt='csv', chunk_size=CHUNK_SIZE):
+    """Yield the export as encoded bytes, one piece per chunk of rows."""
+    columns = EXPORTS[kind]['columns']
+    out = io.StringIO()
+    writer = csv.writer(out) if fmt == 'csv' else None
+
+    if writer:
+        writer.writerow(columns)
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+
+    for rows in export_rows(kind, queryset, chunk_size):
+        if writer:
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                out.write('\n')
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)   # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def table_export(kind, filters=None, fmt='csv', compress=False, chunk_size=CHUNK_SIZE):
+    chunks = export_chunks(kind, export_queryset(kind, filters or {}), fmt, chunk_size)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def table_export_name(kind, fmt='csv', compress=False):
+    return f"{kind}_{timezone.localdate():%Y%m%d}.{fmt}" + ('.gz' if compress else '')
@@ -0,0 +1,10 @@
+# Vocabulary for synthetic medical record descriptions, shared by the
+# benchmark and seeding commands (bench_search, seed_scale).
+
+DRUGS = ['metformin', 'insulin', 'lisinopril', 'atorvastatin', 'amoxicillin', 'ibuprofen',
+         'omeprazole', 'salbutamol', 'warfarin', 'levothyroxine']
+FINDINGS = ['hypertension', 'diabetes', 'asthma', 'migraine', 'fracture', 'infection', 'anemia',
+            'arrhythmia', 'dermatitis', 'bronchitis', 'obesity', 'insomnia']
+FILLER = ['patient', 'reports', 'mild', 'severe', 'pain', 'since', 'last', 'week', 'follow', 'up',
+          'prescribed', 'dose', 'daily', 'blood', 'pressure', 'normal', 'review', 'in', 'two', 'months',
+          'no', 'allergies', 'stable', 'improving', 'advised', 'rest', 'fluids', 'monitor', 'levels']
@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Patient, Appointment, MedicalRecord, User
+from .models import Patient, Appointment, Doctor, MedicalRecord, User
+from . import availability, booking
 
 
 # ===========================
@@ -92,6 +93,28 @@ class AppointmentForm(forms.ModelForm):
             'date_time': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Doctor.__str__ reads the user -> avoid one query per <option>
+        self.fields['doctor'].queryset = Doctor.objects.select_related('user')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        doctor = cleaned_data.get('doctor')
+        date_time = cleaned_data.get('date_time')
+
+        if doctor and date_time and booking.slot_taken(doctor.pk, date_time, exclude=self.instance.pk):
+            raise forms.ValidationError(booking.SlotUnavailable().message)
+
+        # Doctors without a structured schedule still accept any time
+        if doctor and date_time and availability.has_schedule(doctor):
+            if not availability.is_slot_free(doctor, date_time, exclude_appointment=self.instance.pk):
+                raise forms.ValidationError(
+                    "The doctor is not available at that time. Please choose a free slot."
+                )
+
+        return cleaned_data
+
 
 
 # ===========================
@@ -107,6 +130,12 @@ class MedicalRecordForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Patient/Doctor __str__ read the user -> avoid one query per <option>
+        self.fields['patient'].queryset = self.fields['patient'].queryset.select_related('user')
+        self.fields['doctor'].queryset = Doctor.objects.select_related('user')
+
 
 # ===========================
 # SIGNUP FORM
@@ -0,0 +1,226 @@
+import logging
+import random
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import booking
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# name -> function; filled by @task in core.tasks (imported in CoreConfig.ready)
+TASKS = {}
+
+CLAIM_ATTEMPTS = 5
+
+# The job whose function is running in this thread, for report()
+_current = ContextVar('current_job', default=None)
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+# ---------------------------------------------------
+# ENQUEUE
+# ---------------------------------------------------
+# Jobs are rows in the main database, so enqueueing inside a transaction
+# (e.g. from a post_save receiver) only publishes the job if that
+# transaction commits.
+def enqueue(name, kwargs=None, priority=0, dedup_key=None, delay=0, max_attempts=3, user=None):
+    """
+    Queue `name(**kwargs)`. With a dedup_key, a job with the same key that is
+    still queued or running is returned instead of adding a second one.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown job {name!r}.")
+
+    job = Job(
+        name=name,
+        kwargs=kwargs or {},
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts,
+        dedup_key=dedup_key,
+        active_key=dedup_key,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        existing = Job.objects.filter(active_key=dedup_key).first() if dedup_key else None
+        if existing is None:
+            raise
+        return existing
+    return job
+
+
+# ---------------------------------------------------
+# CLAIM / RUN
+# ---------------------------------------------------
+# A worker picks the best candidate and claims it with a conditional UPDATE
+# (... WHERE id = %s AND status = 'queued'). Two workers racing for the same
+# row can't both win, and no row locks are held while the job runs.
+def _retrying(func):
+    """Run one short statement, retrying transient lock errors like core.booking does."""
+    for attempt in range(CLAIM_ATTEMPTS):
+        try:
+            return func()
+        except OperationalError:
+            if attempt == CLAIM_ATTEMPTS - 1:
+                raise
+            time.sleep(booking.BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random()))
+
+
+def _finish(job, **fields):
+    # Only while this worker still holds the job: if it ran past
+    # JOB_LOCK_TIMEOUT without reporting, it may have been requeued (and
+    # claimed again) meanwhile, and that newer run owns the row now.
+    updated = _retrying(lambda: Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by,
+    ).update(locked_by='', locked_at=None, **fields))
+    if not updated:
+        logger.warning("%s lost its lock to another worker; its outcome is not recorded", job)
+    return updated
+
+
+def claim(worker):
+    for _ in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        candidate = _retrying(lambda: (
+            Job.objects
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        ))
+        if candidate is None:
+            return None
+        claimed = _retrying(lambda: Job.objects.filter(pk=candidate, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        ))
+        if claimed:
+            return _retrying(lambda: Job.objects.get(pk=candidate))
+    return None
+
+
+def backoff(attempts):
+    """Seconds before retry number `attempts`: exponential with jitter."""
+    return settings.JOB_BACKOFF_SECONDS * (2 ** (attempts - 1)) * (1 + random.random())
+
+
+def run(job):
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown job {job.name!r}.")
+        token = _current.set(job)
+        try:
+            result = func(**job.kwargs)
+        finally:
+            _current.reset(token)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            logger.warning("%s failed (attempt %d of %d), retrying", job, job.attempts, job.max_attempts)
+            _finish(
+                job, status=Job.QUEUED, run_at=now + timedelta(seconds=backoff(job.attempts)), last_error=error,
+            )
+        else:
+            logger.error("%s failed for good after %d attempts", job, job.attempts)
+            _finish(job, status=Job.FAILED, active_key=None, finished_at=now, last_error=error)
+        return False
+
+    _finish(job, status=Job.DONE, result=result, active_key=None, finished_at=timezone.now())
+    return True
+
+
+def report(result):
+    """
+    Store interim progress as the running job's result (shown by the status
+    endpoint). Also a heartbeat: it refreshes locked_at, so a long job that
+    reports keeps requeue_stale() away. False once the job isn't ours anymore.
+    """
+    job = _current.get()
+    if job is None:
+        return False
+    return bool(_retrying(lambda: Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by,
+    ).update(result=result, locked_at=timezone.now())))
+
+
+def requeue_stale(older_than=None):
+    """Put back jobs whose worker died mid-run (no claim or report() for JOB_LOCK_TIMEOUT)."""
+    older_than = settings.JOB_LOCK_TIMEOUT if older_than is None else older_than
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=older_than))
+    failed = _retrying(lambda: stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, active_key=None, finished_at=now, locked_by='', locked_at=None,
+        last_error='Worker stopped while running the job.',
+    ))
+    requeued = _retrying(lambda: stale.update(status=Job.QUEUED, run_at=now, locked_by='', locked_at=None))
+    return requeued + failed
+
+
+def prune_finished(older_than_days=None, batch_size=1000):
+    """Delete done / failed jobs finished more than JOB_RETENTION_DAYS ago, in short batches."""
+    days = settings.JOB_RETENTION_DAYS if older_than_days is None else older_than_days
+    finished = Job.objects.filter(status__in=(Job.DONE, Job.FAILED),
+                                  finished_at__lt=timezone.now() - timedelta(days=days))
+    deleted = 0
+    while True:
+        ids = _retrying(lambda: list(finished.values_list('id', flat=True)[:batch_size]))
+        if not ids:
+            return deleted
+        deleted += _retrying(lambda: Job.objects.filter(pk__in=ids).delete()[0])
+        if len(ids) < batch_size:
+            return deleted
+
+
+# ---------------------------------------------------
+# WORKER LOOP (used by `manage.py run_workers`)
+# ---------------------------------------------------
+def work(worker, stop=None, poll=1.0, burst=False):
+    """Claim and run jobs until `stop` is set (or, with burst, until none are due)."""
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set():
+        # Long-lived threads never see request_started/finished
+        close_old_connections()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll)
+            continue
+        run(job)
+        done += 1
+    return done
+
+
+def as_json(job):
+    return {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_at': job.run_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': job.result,
+        'error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+    }
@@ -0,0 +1,58 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive
+from core.timeranges import start_of_day
+
+
+class Command(BaseCommand):
+    help = (
+        "Move Completed/Rejected appointments and medical records older than the cutoff "
+        "into the archive tables, in small batches. Safe to interrupt and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive rows older than this many days "
+                                                     "(default settings.ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--before', help="Archive rows before this day (YYYY-MM-DD) instead.")
+        parser.add_argument('--only', choices=sorted(archive.TABLES), action='append',
+                            help="Only this table (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per transaction.")
+        parser.add_argument('--limit', type=int, help="Stop after this many rows per table.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would move.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['before']:
+            try:
+                before = start_of_day(date.fromisoformat(options['before']))
+            except ValueError:
+                raise CommandError("--before must be YYYY-MM-DD.")
+        else:
+            before = archive.cutoff(options['days'])
+
+        for kind in options['only'] or sorted(archive.TABLES):
+            if options['dry_run']:
+                count = archive.pending(kind, before).count()
+                self.stdout.write(f"{kind}: {count} row(s) before {before:%Y-%m-%d} would move.")
+                continue
+
+            started = time.perf_counter()
+            moved = archive.archive(
+                kind, before,
+                batch_size=options['batch_size'],
+                limit=options['limit'],
+                pause=options['pause'],
+                progress=self.progress,
+            )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"{kind}: moved {moved} row(s) before {before:%Y-%m-%d} in {elapsed:.1f}s."
+            ))
+
+    def progress(self, kind, moved):
+        if self.verbosity > 1:
+            self.stdout.write(f"  {kind}: {moved} moved")
@@ -0,0 +1,147 @@
+import random
+import time
+from contextlib import ExitStack
+from datetime import datetime, time as clock, timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.utils import timezone
+
+from core import availability
+from core.availability import DoctorCalendar, merged_free_slots
+from core.models import Appointment, Doctor, DoctorSchedule, Patient, ScheduleBreak, ScheduleException, User
+
+
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'Pediatrics', 'Neurology', 'General Practice']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with doctor schedules, leave and booked appointments, "
+        "then time the free-slot engine end to end (loading queries included)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--booked', type=float, default=0.4, help="Fraction of slots already booked.")
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def build(self, doctors, first_day, days, booked, tz, rng):
+        calendars = []
+        for doctor_id in range(1, doctors + 1):
+            slot = rng.choice([15, 20, 30])
+            weekly = {}
+            for weekday in rng.sample(range(6), rng.randint(3, 6)):
+                start, end = rng.choice([(9 * 60, 17 * 60), (10 * 60, 18 * 60), (8 * 60, 14 * 60)])
+                weekly[weekday] = [(start, end, slot, [(13 * 60, 14 * 60)])]
+            calendar = DoctorCalendar(doctor_id, weekly)
+
+            # A few days of leave, then book a fraction of the remaining slots
+            for _ in range(rng.randint(0, 3)):
+                calendar.exceptions[first_day + timedelta(days=rng.randrange(days))] = [
+                    (0, availability.DAY_MINUTES, False, slot)
+                ]
+            last_day = first_day + timedelta(days=days - 1)
+            calendar.busy = [
+                ts for ts, _, _ in calendar.free_slots(first_day, last_day, tz) if rng.random() < booked
+            ]
+            calendars.append(calendar)
+        return calendars
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            stack.callback(teardown_databases, old_config, verbosity=0)
+            self.run(options)
+
+    def run(self, options):
+        tz = timezone.get_current_timezone()
+        rng = random.Random(options['seed'])
+        first_day = timezone.localdate()
+        days, limit = options['days'], options['limit']
+        last_day = first_day + timedelta(days=days - 1)
+
+        started = time.perf_counter()
+        calendars = self.build(options['doctors'], first_day, days, options['booked'], tz, rng)
+        rows = self.seed(calendars, tz, rng)
+        self.stdout.write(f"Seeded {options['doctors']} doctors x {days} days ({rows:,} rows) "
+                          f"in {time.perf_counter() - started:.1f}s")
+
+        doctor_ids = list(Doctor.objects.values_list('pk', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            loaded = availability.load_calendars(doctor_ids, first_day, last_day).values()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"Load calendars: {elapsed:.2f}s, {len(queries)} queries")
+
+        started = time.perf_counter()
+        total = sum(1 for _ in merged_free_slots(loaded, first_day, last_day, tz))
+        elapsed = time.perf_counter() - started
+        expected = sum(1 for _ in merged_free_slots(calendars, first_day, last_day, tz))
+        if total != expected:
+            self.stderr.write(f"Loaded calendars give {total} free slots, generated ones {expected}!")
+        self.stdout.write(f"All free slots: {total:,} in {elapsed:.2f}s ({total / elapsed:,.0f} slots/s)")
+
+        for label, doctors in [('all doctors', Doctor.objects.all()),
+                               ('cardiologists', Doctor.objects.filter(specialization='Cardiology'))]:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                first = availability.next_free_slots(doctors, limit=limit, days=days, first_day=first_day)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(f"Next {len(first)} free slots, {label}: {elapsed * 1000:.1f} ms, "
+                              f"{len(queries)} queries (end to end)")
+
+        # Engine only, on the calendars already in memory
+        started = time.perf_counter()
+        list(islice(merged_free_slots(loaded, first_day, last_day, tz), limit))
+        self.stdout.write(f"Next {limit} free slots, in-memory merge only: "
+                          f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # ---------------------------------------------------
+    # DATA
+    # ---------------------------------------------------
+    # Writes the generated calendars as schedules, breaks, whole-day leave and
+    # appointments, so the database holds exactly what build() produced.
+    def seed(self, calendars, tz, rng):
+        users = User.objects.bulk_create(
+            [User(username=f'bench-doctor{calendar.doctor_id}', is_doctor=True) for calendar in calendars]
+            + [User(username='bench-patient', is_patient=True)]
+        )
+        doctors = Doctor.objects.bulk_create(
+            [Doctor(user=user, specialization=rng.choice(SPECIALIZATIONS)) for user in users[:-1]]
+        )
+        patient = Patient.objects.create(user=users[-1], phone='1', age=40)
+
+        def minutes(value):
+            return clock(value // 60, value % 60)
+
+        schedules, breaks, exceptions, appointments = [], [], [], []
+        for calendar, doctor in zip(calendars, doctors):
+            for weekday, rules in calendar.weekly.items():
+                for start, end, slot, cuts in rules:
+                    schedule = DoctorSchedule(doctor=doctor, weekday=weekday, start_time=minutes(start),
+                                              end_time=minutes(end), slot_minutes=slot)
+                    schedules.append(schedule)
+                    breaks.extend((schedule, cut) for cut in cuts)
+            for day, rules in calendar.exceptions.items():
+                for _, _, is_available, slot in rules:
+                    exceptions.append(ScheduleException(doctor=doctor, date=day, is_available=is_available,
+                                                        slot_minutes=slot))
+            for ts in calendar.busy:
+                appointments.append(Appointment(patient=patient, doctor=doctor, status='Confirmed',
+                                                date_time=datetime.fromtimestamp(ts, tz), active_slot=True))
+
+        DoctorSchedule.objects.bulk_create(schedules, batch_size=5000)
+        ScheduleBreak.objects.bulk_create(
+            [ScheduleBreak(schedule=schedule, start_time=minutes(start), end_time=minutes(end))
+             for schedule, (start, end) in breaks],
+            batch_size=5000,
+        )
+        ScheduleException.objects.bulk_create(exceptions, batch_size=5000)
+        # bulk_create skips the signals, so no rollups/counters are kept here
+        Appointment.objects.bulk_create(appointments, batch_size=5000)
+        return len(users) + len(schedules) + len(breaks) + len(exceptions) + len(appointments)
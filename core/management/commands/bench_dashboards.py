@@ -0,0 +1,115 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from core import views
+from core.models import User
+from core.profiles import ProfileLoader
+
+
+def make_request(user):
+    request = RequestFactory().get('/dashboard/')
+    request.user = user
+
+    async def auser():
+        return user
+
+    request.auser = auser
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request.profiles = ProfileLoader(request)
+    return request
+
+
+def percentiles(timings):
+    cuts = statistics.quantiles(timings, n=100)
+    return cuts[49], cuts[98]
+
+
+class Command(BaseCommand):
+    help = "Compare p50/p99 latency of the sync (WSGI) and async (ASGI) dashboards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per role and mode.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--latency-ms', type=float, default=1.0,
+                            help="Simulated network round trip added to every query "
+                                 "(the local test database answers in microseconds).")
+        parser.add_argument('--role', choices=['staff', 'doctor', 'patient'], action='append')
+
+    def handle(self, *args, **options):
+        users = {
+            'staff': User.objects.filter(is_staff=True).first(),
+            'doctor': User.objects.filter(is_doctor=True, is_staff=False, doctor__isnull=False).first(),
+            'patient': User.objects.filter(is_patient=True, is_staff=False, patient__isnull=False).first(),
+        }
+        roles = options['role'] or [role for role, user in users.items() if user]
+        for role in roles:
+            if users[role] is None:
+                raise CommandError(f"No {role} user in the database.")
+
+        self.install_latency(options['latency_ms'] / 1000)
+
+        self.stdout.write(
+            f"{options['requests']} requests per run, concurrency {options['concurrency']}, "
+            f"+{options['latency_ms']} ms per query"
+        )
+        self.stdout.write(f"{'role':8} {'mode':6} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+        for role in roles:
+            for mode, bench in (('sync', self.bench_sync), ('async', self.bench_async)):
+                started = time.perf_counter()
+                timings = bench(users[role], options['requests'], options['concurrency'])
+                elapsed = time.perf_counter() - started
+                p50, p99 = percentiles(timings)
+                self.stdout.write(
+                    f"{role:8} {mode:6} {p50 * 1000:9.2f} {p99 * 1000:9.2f} {len(timings) / elapsed:9.1f}"
+                )
+
+    def install_latency(self, delay):
+        def slow(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_wrapper(sender, connection, **kwargs):
+            if slow not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow)
+
+        if delay:
+            connection_created.connect(add_wrapper, weak=False)
+            connections.close_all()
+
+    # --------- WSGI: one thread per in-flight request ----------
+    def bench_sync(self, user, count, concurrency):
+        def one(_):
+            request = make_request(user)
+            started = time.perf_counter()
+            views.dashboard(request)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(one, range(count)))
+
+    # --------- ASGI: one event loop, queries fan out to worker threads ----------
+    def bench_async(self, user, count, concurrency):
+        async def main():
+            # Room for every query of every in-flight request
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concurrency * 6))
+            gate = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with gate:
+                    request = make_request(user)
+                    started = time.perf_counter()
+                    await views.dashboard_async(request)
+                    return time.perf_counter() - started
+
+            return await asyncio.gather(*(one() for _ in range(count)))
+
+        return asyncio.run(main())
@@ -0,0 +1,154 @@
+import random
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from core import counters, deletion, rollups
+from core.models import (
+    Appointment, ArchivedAppointment, ArchivedMedicalRecord, Doctor, MedicalRecord, Patient, User,
+)
+
+
+STRATEGIES = ['cascade', 'batched']
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete one patient with a long history from a throwaway database, once with the "
+        "cascading patient.delete() and once with core.deletion, and compare time, peak "
+        "memory, queries and the longest transaction (how long other writers could be blocked)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help="Related rows of the patient.")
+        parser.add_argument('--archived-share', type=float, default=0.2,
+                            help="Share of the rows that sit in the archive tables.")
+        parser.add_argument('--batch-size', type=int, default=settings.DELETE_BATCH_SIZE)
+        parser.add_argument('--strategy', choices=STRATEGIES, action='append')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            tmp = stack.enter_context(TemporaryDirectory())
+            stack.enter_context(override_settings(
+                PDF_CACHE_DIR=f'{tmp}/pdf_cache',
+                SEARCH_INDEX_PATH=f'{tmp}/search.sqlite3',
+            ))
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            stack.callback(teardown_databases, old_config, verbosity=0)
+
+            self.stdout.write(f"{'strategy':9} {'rows':>8} {'seconds':>8} {'rows/s':>9} "
+                              f"{'peak MiB':>9} {'queries':>8} {'longest tx ms':>14}")
+            for strategy in options['strategy'] or STRATEGIES:
+                patient, doctor_ids = self.seed(options['rows'], options['archived_share'], options['seed'])
+                patient_id = patient.pk
+                row = getattr(self, f'run_{strategy}')(patient, options['batch_size'])
+                self.check_consistent(patient_id, doctor_ids)
+                self.stdout.write(
+                    f"{strategy:9} {options['rows']:8,} {row['seconds']:8.2f} "
+                    f"{options['rows'] / row['seconds']:9,.0f} {row['peak'] / 2 ** 20:9.1f} "
+                    f"{row['queries']:8,} {row['longest'] * 1000:14.1f}"
+                )
+
+    # ---------------------------------------------------
+    # DATA
+    # ---------------------------------------------------
+    def seed(self, rows, archived_share, seed):
+        rng = random.Random(seed)
+        suffix = User.objects.count()
+        doctors = [
+            Doctor.objects.create(
+                user=User.objects.create(username=f'bench-doctor-{suffix}-{i}', is_doctor=True),
+                specialization='General Practice',
+            )
+            for i in range(4)
+        ]
+        user = User.objects.create(username=f'bench-patient-{suffix}', is_patient=True)
+        patient = Patient.objects.create(user=user, phone='000', age=70)
+
+        appointments = rows * 6 // 10
+        records = rows - appointments
+        start = timezone.now() - timedelta(minutes=30 * appointments)
+        statuses = ['Completed'] * 7 + ['Rejected', 'Confirmed', 'Pending']
+
+        def appointment(i, **extra):
+            status = rng.choice(statuses)
+            return dict(
+                patient=patient, doctor=doctors[i % len(doctors)], status=status,
+                date_time=start + timedelta(minutes=30 * i),
+                active_slot=None if status == 'Rejected' else True, **extra
+            )
+
+        def record(i, **extra):
+            return dict(patient=patient, doctor=doctors[i % len(doctors)],
+                        description=f'Visit note {i}', created_at=start + timedelta(minutes=30 * i), **extra)
+
+        archived_appts = int(appointments * archived_share)
+        archived_records = int(records * archived_share)
+        base = 10 ** 9   # ids the live tables won't reach here
+        with transaction.atomic():
+            ArchivedAppointment.objects.bulk_create(
+                [ArchivedAppointment(id=base + i, **appointment(i)) for i in range(archived_appts)], batch_size=2000)
+            Appointment.objects.bulk_create(
+                [Appointment(**appointment(i)) for i in range(archived_appts, appointments)], batch_size=2000)
+            ArchivedMedicalRecord.objects.bulk_create(
+                [ArchivedMedicalRecord(id=base + i, **record(i)) for i in range(archived_records)], batch_size=2000)
+            MedicalRecord.objects.bulk_create(
+                [MedicalRecord(**record(i)) for i in range(archived_records, records)], batch_size=2000)
+        rollups.rebuild()
+        counters.rebuild()
+        return patient, [doctor.pk for doctor in doctors]
+
+    def check_consistent(self, patient_id, doctor_ids):
+        gone = not Patient.objects.filter(pk=patient_id).exists()
+        left = sum(deletion.remaining(patient_id).values())
+        drift = [d for doctor_id in doctor_ids for d in counters.find_drift(doctor_id)]
+        if not gone or left or drift:
+            self.stderr.write(f"  inconsistent: patient gone={gone}, rows left={left}, counter drift={len(drift)}")
+
+    # ---------------------------------------------------
+    # STRATEGIES
+    # ---------------------------------------------------
+    def measure(self, func):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(record):
+                longest = func()
+            seconds = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {'seconds': seconds, 'peak': peak, 'queries': len(queries), 'longest': longest or seconds}
+
+    def run_cascade(self, patient, batch_size):
+        def cascade():
+            # What patient_delete used to do: one transaction for everything
+            with transaction.atomic():
+                user = patient.user
+                patient.delete()
+                user.delete()
+        return self.measure(cascade)
+
+    def run_batched(self, patient, batch_size):
+        def batched():
+            marks = [time.perf_counter()]
+            deletion.delete_patient(patient.pk, batch_size=batch_size,
+                                    progress=lambda report: marks.append(time.perf_counter()))
+            return max(b - a for a, b in zip(marks, marks[1:])) if len(marks) > 1 else None
+        return self.measure(batched)
@@ -0,0 +1,83 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import search
+from core.fixtures_text import DRUGS, FILLER, FINDINGS
+
+
+QUERIES = ['metformin', 'diabetes metformin', 'severe asthma', 'warfarin monitor', 'arrhyth*',
+           'blood pressure hypertension', 'fracture pain']
+
+
+class Command(BaseCommand):
+    help = "Benchmark record search on a synthetic FTS index (temporary file, no database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=1_000_000)
+        parser.add_argument('--doctors', type=int, default=500)
+        parser.add_argument('--patients', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=20_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def rows(self, options, rng):
+        now = timezone.now()
+        for pk in range(1, options['records'] + 1):
+            words = rng.choices(FILLER, k=rng.randint(8, 30))
+            words.insert(rng.randrange(len(words)), rng.choice(FINDINGS))
+            if rng.random() < 0.3:
+                words.insert(rng.randrange(len(words)), rng.choice(DRUGS))
+            yield (pk, ' '.join(words), rng.randint(1, options['patients']), rng.randint(1, options['doctors']),
+                   now - timedelta(minutes=rng.randint(0, 5 * 365 * 24 * 60)))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(Path(tmp) / 'bench.sqlite3', isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(search.SCHEMA)
+
+            started = time.perf_counter()
+            rows = self.rows(options, rng)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) == options['batch_size']:
+                    search.index_rows(batch, conn)
+                    batch = []
+            if batch:
+                search.index_rows(batch, conn)
+            search.optimize(conn)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Indexed {options['records']:,} records in {elapsed:.1f}s "
+                f"({options['records'] / elapsed:,.0f} records/s)"
+            )
+
+            since = timezone.now() - timedelta(days=365)
+            cases = [(q, q, {}) for q in QUERIES] + [
+                ('metformin, one doctor', 'metformin', {'doctor_id': 7}),
+                ('diabetes, one patient', 'diabetes', {'patient_id': 42}),
+                ('metformin, last year', 'metformin', {'start': since}),
+            ]
+            for label, text, filters in cases:
+                timings = []
+                for _ in range(options['repeat']):
+                    t = time.perf_counter()
+                    hits = search.search(text, limit=20, conn=conn, **filters)
+                    timings.append((time.perf_counter() - t) * 1000)
+                self.stdout.write(
+                    f"  {label:45} {len(hits):3} hits  "
+                    f"median {statistics.median(timings):7.2f} ms  max {max(timings):7.2f} ms"
+                )
+            conn.close()
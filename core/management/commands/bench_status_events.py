@@ -0,0 +1,107 @@
+import random
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from core import events
+from core.models import AppointmentEvent
+
+
+E = AppointmentEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a throwaway database with appointment status events and time the "
+        "per-doctor median Pending -> Confirmed query against fetching every duration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2_000_000)
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            stack.callback(teardown_databases, old_config, verbosity=0)
+
+            started = time.perf_counter()
+            total = self.seed(options['events'], options['doctors'], random.Random(options['seed']))
+            self.stdout.write(f"Inserted {total:,} events in {time.perf_counter() - started:.1f}s.")
+
+            doctor_ids = list(range(1, options['doctors'] + 1))
+            indexed = self.best_of(options['repeat'], lambda: events.median_time_to_confirm(doctor_ids))
+            fetched = self.best_of(options['repeat'], lambda: self.fetch_all(doctor_ids))
+
+            if indexed['result'] != fetched['result']:
+                self.stderr.write("Medians differ between the two methods!")
+            self.stdout.write(f"{'method':22} {'ms':>9}")
+            self.stdout.write(f"{'indexed median':22} {indexed['seconds'] * 1000:9.1f}")
+            self.stdout.write(f"{'fetch every duration':22} {fetched['seconds'] * 1000:9.1f}")
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - started)
+        return {'seconds': min(timings), 'result': result}
+
+    def fetch_all(self, doctor_ids):
+        rows = (
+            AppointmentEvent.objects
+            .filter(from_status=E.PENDING, status=E.CONFIRMED, elapsed__isnull=False)
+            .values_list('doctor_id', 'elapsed')
+        )
+        durations = {doctor_id: [] for doctor_id in doctor_ids}
+        for doctor_id, elapsed in rows.iterator(chunk_size=10_000):
+            durations[doctor_id].append(elapsed)
+        return {doctor_id: statistics.median(values) if values else None for doctor_id, values in durations.items()}
+
+    # ---------------------------------------------------
+    # DATA
+    # ---------------------------------------------------
+    # Booked -> (Confirmed -> Completed | Rejected), with a per-doctor typical
+    # time to confirm, inserted with raw executemany() like seed_scale.
+    def seed(self, total, doctors, rng):
+        columns = ['appointment_id', 'doctor_id', 'from_status', 'status', 'at', 'elapsed']
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(E._meta.db_table),
+            ', '.join(connection.ops.quote_name(name) for name in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        at_field = E._meta.get_field('at')
+        typical = [rng.uniform(1, 48) * 3600 for _ in range(doctors)]
+        start = timezone.now() - timedelta(days=3 * 365)
+
+        batch, inserted, appointment_id = [], 0, 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            while inserted + len(batch) < total:
+                appointment_id += 1
+                doctor = rng.randrange(doctors)
+                at = start + timedelta(seconds=rng.randrange(3 * 365 * 86400))
+                steps = [(E.NONE, E.PENDING, None)]
+                if rng.random() < 0.85:
+                    steps.append((E.PENDING, E.CONFIRMED, int(rng.lognormvariate(0, 0.8) * typical[doctor])))
+                    steps.append((E.CONFIRMED, E.COMPLETED, rng.randrange(86400, 30 * 86400)))
+                else:
+                    steps.append((E.PENDING, E.REJECTED, rng.randrange(60, 7 * 86400)))
+                for from_status, status, elapsed in steps:
+                    at += timedelta(seconds=elapsed or 0)
+                    batch.append((appointment_id, doctor + 1, from_status, status,
+                                  at_field.get_db_prep_value(at, connection), elapsed))
+                if len(batch) >= 10_000:
+                    cursor.executemany(sql, batch)
+                    inserted += len(batch)
+                    batch = []
+            cursor.executemany(sql, batch)
+            inserted += len(batch)
+        return inserted
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import math
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from core import middleware
+from core.middleware import QueryRecorder
+from core.models import Appointment, Doctor, MedicalRecord, User
+
+
+# ---------------------------------------------------
+# VIEW MATRIX
+# ---------------------------------------------------
+# (view name, role, url kwargs from the fixtures, query string). Roles log in
+# as the busiest doctor, one of their patients and a staff user.
+CASES = [
+    ('core:home', 'anonymous', None, None),
+    ('core:index', 'anonymous', None, None),
+    ('core:services', 'anonymous', None, None),
+    ('core:contact', 'anonymous', None, None),
+    ('core:login', 'anonymous', None, None),
+    ('core:signup', 'anonymous', None, None),
+    ('core:doctor_list', 'anonymous', None, None),
+    ('core:doctor_profile', 'anonymous', lambda f: {'pk': f['doctor'].pk}, None),
+    ('core:doctor_availability', 'anonymous', lambda f: {'pk': f['doctor'].pk}, None),
+    ('core:available_slots', 'anonymous', None, None),
+
+    ('core:dashboard', 'patient', None, None),
+    ('core:patient_list', 'patient', None, None),
+    ('core:appointment_list', 'patient', None, None),
+    ('core:appointment_create', 'patient', None, None),
+    ('core:appointment_detail', 'patient', lambda f: {'id': f['appointment'].pk}, None),
+    ('core:appointment_edit', 'patient', lambda f: {'id': f['appointment'].pk}, None),
+    ('core:record_pdf', 'patient', lambda f: {'pk': f['record'].pk}, None),
+    ('core:record_search', 'patient', None, {'q': 'pain'}),
+    ('core:patient_timeline', 'patient', lambda f: {'pk': f['patient'].pk}, None),
+
+    ('core:dashboard', 'doctor', None, None),
+    ('core:patient_list', 'doctor', None, None),
+    ('core:patient_create', 'doctor', None, None),
+    ('core:patient_profile', 'doctor', lambda f: {'pk': f['patient'].pk}, None),
+    ('core:patient_edit', 'doctor', lambda f: {'pk': f['patient'].pk}, None),
+    ('core:patient_export', 'doctor', lambda f: {'pk': f['patient'].pk}, None),
+    ('core:patient_timeline', 'doctor', lambda f: {'pk': f['patient'].pk}, {'limit': 50}),
+    ('core:appointment_list', 'doctor', None, None),
+    ('core:record_create', 'doctor', lambda f: {'patient_id': f['patient'].pk}, None),
+    ('core:record_search', 'doctor', None, {'q': 'metformin'}),
+
+    ('core:dashboard', 'staff', None, None),
+    ('core:patient_list', 'staff', None, None),
+    ('core:appointment_list', 'staff', None, None),
+    ('core:record_list', 'staff', None, None),
+    ('core:record_search', 'staff', None, {'q': 'blood pressure'}),
+    ('core:table_export', 'staff', lambda f: {'kind': 'appointments'}, lambda f: {
+        'from': (f['today'] - timedelta(days=7)).isoformat(), 'to': f['today'].isoformat(),
+    }),
+]
+
+# GET on these changes data, so they are never driven (job_status just
+# reads one row and the seeded datasets have no jobs)
+SKIPPED = {
+    'core:logout', 'core:patient_delete', 'core:record_delete',
+    'core:approve_appointment', 'core:reject_appointment', 'core:appointment_bulk_status',
+    'core:job_status',
+}
+
+# A case regresses when p95 or peak memory grows by more than the threshold
+# (and by more than these absolute floors), or when it runs more queries.
+MIN_P95_DELTA_MS = 1.0
+MIN_MEMORY_DELTA_KB = 64
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def case_name(view, role):
+    return f'{view}[{role}]'
+
+
+# ---------------------------------------------------
+# COMMAND
+# ---------------------------------------------------
+class Command(BaseCommand):
+    help = (
+        "Drive every GET view in core.urls as each role and report p50/p95/p99 latency, "
+        "queries and peak memory per view, as JSON. With --sizes, each dataset is seeded "
+        "into a throwaway test database; otherwise the current database is used. "
+        "Set MEDICARE_ASGI=1 with --client asgi to include the async dashboard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', help="Appointments per seeded dataset.")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed requests per view.")
+        parser.add_argument('--client', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('-o', '--output', help="Write results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare the results with an earlier JSON file.")
+        parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                            help="Only compare two result files.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative growth that counts as a regression (default 0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            old, new = (self.load(path) for path in options['compare'])
+            return self.report_regressions(old, new, options['threshold'])
+
+        self.warn_uncovered()
+        results = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'client': options['client'],
+                'repeat': options['repeat'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'runs': [],
+        }
+
+        # Production-like settings; the throwaway datasets also get throwaway caches
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            if options['sizes']:
+                for size in options['sizes']:
+                    results['runs'].append(self.run_seeded(size, options))
+            else:
+                results['runs'].append(self.run_dataset('current', options))
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+        if options['baseline']:
+            self.report_regressions(self.load(options['baseline']), results, options['threshold'])
+
+    def load(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Can't read {path}: {exc}")
+
+    def warn_uncovered(self):
+        names = {
+            f'core:{pattern.name}' for pattern in get_resolver('core.urls').url_patterns if pattern.name
+        }
+        missing = names - {view for view, *_ in CASES} - SKIPPED
+        if missing:
+            self.stderr.write(f"Not benchmarked: {', '.join(sorted(missing))}")
+
+    # --------- datasets ----------
+    def run_seeded(self, size, options):
+        tmp = tempfile.TemporaryDirectory()
+        with ExitStack() as stack:
+            stack.callback(tmp.cleanup)
+            stack.enter_context(override_settings(
+                PDF_CACHE_DIR=f'{tmp.name}/pdf_cache',
+                SEARCH_INDEX_PATH=f'{tmp.name}/search.sqlite3',
+                CACHES={
+                    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'},
+                    'directory': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                  'LOCATION': 'bench-directory'},
+                },
+            ))
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            stack.callback(teardown_databases, old_config, verbosity=0)
+
+            self.stdout.write(f"Seeding {size:,} appointments...")
+            started = time.perf_counter()
+            call_command('seed_scale', appointments=size, seed=options['seed'], stdout=StringIO())
+            call_command('rebuild_search_index', stdout=StringIO())
+            User.objects.create_user(username='bench-staff', password='bench', is_staff=True)
+            self.stdout.write(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+            return self.run_dataset(f'{size} appointments', options)
+
+    def fixtures(self):
+        doctor = (
+            Doctor.objects.select_related('user')
+            .annotate(n=Count('appointment')).order_by('-n', 'id').first()
+        )
+        if doctor is None:
+            raise CommandError("No doctors in the database; run seed_scale or pass --sizes.")
+        appointment = Appointment.objects.filter(doctor=doctor).select_related('patient__user') \
+            .order_by('-date_time').first()
+        record = MedicalRecord.objects.filter(doctor=doctor).select_related('patient__user') \
+            .order_by('-created_at').first()
+        if appointment is None or record is None:
+            raise CommandError("The busiest doctor needs at least one appointment and one record.")
+
+        patient = record.patient
+        appointment = (Appointment.objects.filter(doctor=doctor, patient=patient).order_by('-date_time').first()
+                       or appointment)
+        return {
+            'doctor': doctor,
+            'patient': patient,
+            'appointment': appointment,
+            'record': record,
+            'today': timezone.localdate(),
+            'users': {
+                'anonymous': None,
+                'patient': patient.user,
+                'doctor': doctor.user,
+                'staff': User.objects.filter(is_staff=True).order_by('id').first(),
+            },
+        }
+
+    def run_dataset(self, label, options):
+        fixtures = self.fixtures()
+        self.stdout.write(f"\n{label}: {options['repeat']} requests per view ({options['client']})")
+        self.stdout.write(f"  {'view':42} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>7} {'peak KB':>8}")
+
+        rows = []
+        for view, role, kwargs, query in CASES:
+            user = fixtures['users'][role]
+            if role != 'anonymous' and user is None:
+                self.stderr.write(f"  skipping {case_name(view, role)}: no {role} user")
+                continue
+            url = reverse(view, kwargs=kwargs(fixtures) if kwargs else None)
+            params = query(fixtures) if callable(query) else query
+            measure = self.measure_asgi if options['client'] == 'asgi' else self.measure_wsgi
+            row = {'case': case_name(view, role), 'view': view, 'role': role}
+            row.update(measure(view, url, params, user, options['repeat']))
+            rows.append(row)
+            self.stdout.write(
+                f"  {row['case']:42} {row['status']:>6} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} "
+                f"{row['p99_ms']:8.2f} {row['queries']:>7} {row['peak_kb']:8.0f}"
+            )
+
+        return {'dataset': label, 'appointments': Appointment.objects.count(), 'results': rows}
+
+    # --------- measuring one view ----------
+    @staticmethod
+    def summarize(timings, status, queries, peak):
+        timings = sorted(timings)
+        return {
+            'status': status,
+            'p50_ms': percentile(timings, 50) * 1000,
+            'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000,
+            'mean_ms': statistics.fmean(timings) * 1000,
+            'queries': queries,
+            'peak_kb': peak / 1024,
+        }
+
+    def measure_wsgi(self, view, url, params, user, repeat):
+        client = Client()
+        if user:
+            client.force_login(user)
+
+        def get():
+            response = client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response
+
+        get()   # warm caches and lazy imports
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            status = get().status_code
+
+        tracemalloc.start()
+        try:
+            get()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            get()
+            timings.append(time.perf_counter() - started)
+        return self.summarize(timings, status, recorder.count, peak)
+
+    def measure_asgi(self, view, url, params, user, repeat):
+        async def main():
+            client = AsyncClient()
+            if user:
+                await client.aforce_login(user)
+
+            async def get():
+                response = await client.get(url, params)
+                if response.streaming:
+                    content = response.streaming_content
+                    if hasattr(content, '__aiter__'):
+                        async for _ in content:
+                            pass
+                    else:
+                        # The body of a sync iterator runs queries too
+                        await sync_to_async(b''.join)(content)
+                return response
+
+            await get()
+
+            # Sync views run on another thread's connection, so take the count
+            # from QueryInstrumentationMiddleware (the view itself, without the
+            # session save or the body of a streaming response).
+            middleware.reset()
+            status = (await get()).status_code
+            queries = middleware.snapshot().get(view, {}).get('max_queries', 0)
+
+            tracemalloc.start()
+            try:
+                await get()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await get()
+                timings.append(time.perf_counter() - started)
+            return self.summarize(timings, status, queries, peak)
+
+        return asyncio.run(main())
+
+    # --------- comparing runs ----------
+    def report_regressions(self, old, new, threshold):
+        before = {
+            (run['dataset'], row['case']): row for run in old['runs'] for row in run['results']
+        }
+        regressions = []
+        self.stdout.write(f"\n  {'dataset / view':62} {'p95 ms':>17} {'queries':>9} {'peak KB':>15}")
+        for run in new['runs']:
+            for row in run['results']:
+                prev = before.get((run['dataset'], row['case']))
+                if prev is None:
+                    continue
+                reasons = []
+                if (row['p95_ms'] > prev['p95_ms'] * (1 + threshold)
+                        and row['p95_ms'] - prev['p95_ms'] > MIN_P95_DELTA_MS):
+                    reasons.append('p95')
+                if row['queries'] > prev['queries']:
+                    reasons.append('queries')
+                if (row['peak_kb'] > prev['peak_kb'] * (1 + threshold)
+                        and row['peak_kb'] - prev['peak_kb'] > MIN_MEMORY_DELTA_KB):
+                    reasons.append('memory')
+
+                line = (
+                    f"  {run['dataset'] + ' / ' + row['case']:62} "
+                    f"{prev['p95_ms']:7.2f} -> {row['p95_ms']:7.2f} "
+                    f"{prev['queries']:>3} -> {row['queries']:<3} "
+                    f"{prev['peak_kb']:6.0f} -> {row['peak_kb']:<6.0f}"
+                )
+                if reasons:
+                    regressions.append(row['case'])
+                    self.stdout.write(self.style.ERROR(f"{line}  REGRESSION ({', '.join(reasons)})"))
+                else:
+                    self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) over {threshold:.0%}.")
+        self.stdout.write(self.style.SUCCESS("No regressions."))
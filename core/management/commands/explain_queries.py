@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.models import Appointment, Doctor, MedicalRecord, Patient
+from core.timeranges import day_range, in_range
+
+
+class Command(BaseCommand):
+    help = "Print EXPLAIN plans for the hot Appointment / MedicalRecord queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', help="EXPLAIN format passed to the backend (e.g. 'tree' or 'json' on MySQL).")
+
+    def queries(self):
+        patient_id = Patient.objects.values_list('id', flat=True).first() or 1
+        doctor_id = Doctor.objects.values_list('id', flat=True).first() or 1
+
+        return [
+            ("Patient appointments (dashboard / list)",
+             Appointment.objects.filter(patient_id=patient_id).order_by('-date_time', '-id')[:26]),
+            ("Doctor appointments (dashboard / list)",
+             Appointment.objects.filter(doctor_id=doctor_id).order_by('-date_time', '-id')[:26]),
+            ("All appointments, keyset page",
+             Appointment.objects.order_by('-date_time', '-id')[:26]),
+            ("Today's appointments (half-open range)",
+             Appointment.objects.filter(**in_range('date_time', day_range()))),
+            ("Status breakdown (GROUP BY status)",
+             Appointment.objects.values('status').annotate(total=Count('id')).order_by()),
+            ("Patient records",
+             MedicalRecord.objects.filter(patient_id=patient_id).order_by('-created_at', '-id')[:26]),
+            ("Doctor records",
+             MedicalRecord.objects.filter(doctor_id=doctor_id).order_by('-created_at', '-id')[:26]),
+            ("All records, keyset page",
+             MedicalRecord.objects.order_by('-created_at', '-id')[:26]),
+        ]
+
+    def handle(self, *args, **options):
+        explain_options = {'format': options['format']} if options['format'] else {}
+
+        for title, qs in self.queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(str(qs.query))
+            self.stdout.write(qs.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+from core.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Write a ZIP of a patient's record PDFs plus an appointments CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('patient_id', type=int)
+        parser.add_argument('-o', '--output', help="Output file (default: patient_<id>_history.zip)")
+
+    def handle(self, *args, **options):
+        try:
+            patient = Patient.objects.get(pk=options['patient_id'])
+        except Patient.DoesNotExist:
+            raise CommandError(f"Patient {options['patient_id']} does not exist.")
+
+        output = options['output'] or exports.patient_archive_name(patient)
+        records = 0
+
+        def progress(record):
+            nonlocal records
+            records += 1
+            if records % 1000 == 0:
+                self.stdout.write(f"  {records} records...")
+
+        started = time.perf_counter()
+        size = 0
+        with open(output, 'wb') as fh:
+            for chunk in exports.patient_archive(patient, progress=progress):
+                fh.write(chunk)
+                size += len(chunk)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output}: {records} records, {size / 1e6:.1f} MB in {elapsed:.1f}s "
+            f"({records / max(elapsed, 1e-9):,.0f} records/s)"
+        ))
@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = "Stream appointments or medical records to CSV / JSONL (optionally gzipped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--from', dest='from', help="First day (YYYY-MM-DD), inclusive.")
+        parser.add_argument('--to', help="Last day (YYYY-MM-DD), inclusive.")
+        parser.add_argument('--doctor', type=int)
+        parser.add_argument('--patient', type=int)
+        parser.add_argument('--status', help="Appointments only.")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+        parser.add_argument('-o', '--output', help="Output file (default: stdout).")
+
+    def handle(self, *args, **options):
+        kind, fmt = options['kind'], options['format']
+        try:
+            filters = exports.parse_filters(kind, options)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        chunks = exports.table_export(kind, filters, fmt, options['gzip'], options['chunk_size'])
+        started = time.perf_counter()
+        size = 0
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+                    size += len(chunk)
+        else:
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+            out.flush()
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']}: {size / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s"
+        ))
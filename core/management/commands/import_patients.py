@@ -0,0 +1,261 @@
+import csv
+import json
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from core.models import Patient, User
+
+
+GENDERS = {value.lower(): value for value, _ in Patient.GENDER_CHOICES}
+validate_username = UnicodeUsernameValidator()
+
+
+def unusable_password():
+    # Same format as make_password(None), without its slow per-character RNG
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30)
+
+
+def _init_worker():
+    # Spawned workers (macOS / Windows) start without Django set up
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+# ---------------------------------------------------
+# READING
+# ---------------------------------------------------
+def read_rows(path, fmt):
+    """Yield (line number, dict) pairs without loading the whole file."""
+    with open(path, newline='', encoding='utf-8') as fh:
+        if fmt == 'csv':
+            for line, row in enumerate(csv.DictReader(fh), start=2):
+                yield line, row
+        else:
+            for line, text in enumerate(fh, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError:
+                        yield line, None
+
+
+def clean_row(row):
+    if not isinstance(row, dict):
+        raise ValidationError("not a JSON object")
+
+    username = User.normalize_username((row.get('username') or '').strip())
+    if not username:
+        raise ValidationError("username is required")
+    validate_username(username)
+    if len(username) > 150:
+        raise ValidationError("username is too long")
+
+    email = (row.get('email') or '').strip()
+    if email:
+        validate_email(email)
+
+    try:
+        age = int(row.get('age') or 0)
+    except (TypeError, ValueError):
+        raise ValidationError("age must be a number")
+    if not 0 <= age <= 150:
+        raise ValidationError("age out of range")
+
+    gender = GENDERS.get(str(row.get('gender') or 'other').strip().lower())
+    if gender is None:
+        raise ValidationError("unknown gender")
+
+    phone = str(row.get('phone') or '').strip()
+    if len(phone) > 15:
+        raise ValidationError("phone is too long")
+
+    return {
+        'username': username,
+        'first_name': (row.get('first_name') or '').strip()[:150],
+        'last_name': (row.get('last_name') or '').strip()[:150],
+        'email': email,
+        'password': row.get('password') or None,
+        'phone': phone,
+        'age': age,
+        'gender': gender,
+    }
+
+
+# ---------------------------------------------------
+# COMMAND
+# ---------------------------------------------------
+class Command(BaseCommand):
+    help = "Bulk import patients (and their user accounts) from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Processes used to hash passwords (0 = hash in this process).")
+        parser.add_argument('--checkpoint', help="Default: <path>.checkpoint")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+        parser.add_argument('--rejects', help="Write rejected rows (line, reason) to this CSV.")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist.")
+
+        fmt = options['format'] or ('jsonl' if path.suffix in ('.jsonl', '.json', '.ndjson') else 'csv')
+        batch_size = options['batch_size']
+        checkpoint = Path(options['checkpoint'] or f'{path}.checkpoint')
+
+        state = {'line': 0, 'imported': 0, 'rejected': 0}
+        if checkpoint.exists() and not options['restart']:
+            state.update(json.loads(checkpoint.read_text()))
+            self.stdout.write(f"Resuming after line {state['line']} ({state['imported']} already imported)")
+
+        rejects_file = open(options['rejects'], 'a', newline='') if options['rejects'] else None
+        rejects = csv.writer(rejects_file) if rejects_file else None
+
+        pool = None
+        if options['workers'] > 0:
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+
+        rows = ((line, row) for line, row in read_rows(path, fmt) if line > state['line'])
+        started = time.perf_counter()
+        imported_this_run = 0
+
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+
+                valid, rejected = self.validate(batch)
+                created, clashes = self.insert(valid, pool)
+                rejected += clashes
+
+                for line, reason in rejected:
+                    if rejects:
+                        rejects.writerow([line, reason])
+
+                state['line'] = batch[-1][0]
+                state['imported'] += created
+                state['rejected'] += len(rejected)
+                imported_this_run += created
+                checkpoint.write_text(json.dumps(state))
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  line {state['line']}: {state['imported']} imported, {state['rejected']} rejected "
+                    f"({imported_this_run / max(elapsed, 1e-9):,.0f} rows/s)"
+                )
+        finally:
+            if pool:
+                pool.shutdown()
+            if rejects_file:
+                rejects_file.close()
+
+        elapsed = time.perf_counter() - started
+        checkpoint.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['imported']} patients ({state['rejected']} rejected) "
+            f"in {elapsed:.1f}s, {imported_this_run / max(elapsed, 1e-9):,.0f} rows/s"
+        ))
+
+    # --------- one batch ----------
+    # Usernames are compared lowercased: the production MySQL collation is
+    # case-insensitive, so "Alice" and "alice" are the same unique key there.
+    def validate(self, batch):
+        valid, rejected, seen = [], [], set()
+        for line, row in batch:
+            try:
+                cleaned = clean_row(row)
+            except ValidationError as exc:
+                rejected.append((line, '; '.join(exc.messages)))
+                continue
+            key = cleaned['username'].lower()
+            if key in seen:
+                rejected.append((line, "duplicate username in file"))
+                continue
+            seen.add(key)
+            valid.append((line, cleaned))
+
+        # One query per batch for usernames that already exist
+        taken = set(
+            User.objects.annotate(username_lower=Lower('username'))
+            .filter(username_lower__in=seen)
+            .values_list('username_lower', flat=True)
+        )
+        if taken:
+            rejected += [(line, "username already exists") for line, row in valid
+                         if row['username'].lower() in taken]
+            valid = [(line, row) for line, row in valid if row['username'].lower() not in taken]
+        return valid, rejected
+
+    def insert(self, valid, pool):
+        """Returns (rows created, [(line, reason)] rejected at insert time)."""
+        if not valid:
+            return 0, []
+
+        rows = [row for _, row in valid]
+        hashed = [unusable_password() for _ in rows]
+
+        # Real hashing is deliberately slow -> spread it over the pool
+        todo = [i for i, row in enumerate(rows) if row['password']]
+        passwords = [rows[i]['password'] for i in todo]
+        if pool and passwords:
+            results = pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32))
+        else:
+            results = map(make_password, passwords)
+        for i, password in zip(todo, results):
+            hashed[i] = password
+
+        users = [
+            User(username=row['username'], first_name=row['first_name'], last_name=row['last_name'],
+                 email=row['email'], password=password, is_patient=True)
+            for row, password in zip(rows, hashed)
+        ]
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=len(users))
+                # Not every backend returns primary keys from bulk_create (MySQL
+                # doesn't), so read them back with one query.
+                ids = dict(User.objects.filter(username__in=[u.username for u in users])
+                           .values_list('username', 'id'))
+                Patient.objects.bulk_create(
+                    [Patient(user_id=ids[row['username']], phone=row['phone'], age=row['age'],
+                             gender=row['gender'])
+                     for row in rows],
+                    batch_size=len(rows),
+                )
+            return len(rows), []
+        except IntegrityError:
+            # A username that only clashes under the database collation (accents,
+            # say) or was taken meanwhile: insert one by one, reject the clashes.
+            pass
+
+        created, rejected = 0, []
+        for (line, row), user in zip(valid, users):
+            user.pk, user._state.adding = None, True
+            try:
+                with transaction.atomic():
+                    user.save()
+                    Patient.objects.create(user=user, phone=row['phone'], age=row['age'], gender=row['gender'])
+            except IntegrityError:
+                rejected.append((line, "username already exists"))
+                continue
+            created += 1
+        return created, rejected
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import pdfs
+
+
+class Command(BaseCommand):
+    help = "Render (or refresh) the cached PDF of every medical record."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', type=int, help="Only this patient's records.")
+
+    def handle(self, *args, **options):
+        records = pdfs.record_queryset().order_by('pk')
+        if options['patient']:
+            records = records.filter(patient_id=options['patient'])
+
+        started = time.perf_counter()
+        count = 0
+        for record in records.iterator(chunk_size=500):
+            pdfs.cached_pdf(record)
+            count += 1
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} PDF(s) ready in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} records/s)"
+        ))
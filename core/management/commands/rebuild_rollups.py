@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly appointment rollup table from the Appointment rows."
+
+    def handle(self, *args, **options):
+        buckets = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} rollup bucket(s)."))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the medical record full-text search index from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = search.rebuild(
+            batch_size=options['batch_size'],
+            progress=lambda n: self.stdout.write(f"  {n} records indexed"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} record(s) in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the daily appointment counters with the Appointment rows, "
+        "doctor by doctor, and optionally repair any drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Fix the drifted counters.")
+        parser.add_argument('--doctor', type=int, action='append', help="Only check this doctor (repeatable).")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop and rebuild the whole table instead of diffing it.")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            buckets = counters.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} counter bucket(s)."))
+            return
+
+        doctors = drifted = 0
+        for doctor_id, drift in counters.reconcile(options['doctor'], fix=options['repair']):
+            doctors += 1
+            drifted += len(drift)
+            for d in drift:
+                self.stdout.write(
+                    f"doctor {d.doctor_id} {d.day} {d.status}: stored {d.stored}, actual {d.actual}"
+                )
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f"Checked {doctors} doctor(s): no drift."))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {drifted} counter(s) across {doctors} doctor(s)."))
+        else:
+            raise CommandError(f"{drifted} counter(s) drifted; rerun with --repair.")
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+PRUNE_INTERVAL = 3600
+
+@contextmanager
+def stop_on_signals(stop):
+    """SIGINT / SIGTERM set `stop` (running jobs finish) instead of killing the process."""
+    handlers = {sig: signal.signal(sig, lambda *args: stop.set()) for sig in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        yield
+    finally:
+        for sig, handler in handlers.items():
+            signal.signal(sig, handler)
+
+
+def run_threads(threads, poll, burst, stale_after, prefix, stop):
+    """Run `threads` worker loops in this process until stopped (or drained, with burst)."""
+    done = []
+
+    def loop(n):
+        try:
+            done.append(jobs.work(f'{prefix}-{n}', stop=stop, poll=poll, burst=burst))
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+
+    # Meanwhile, reclaim jobs orphaned by workers that died mid-run and,
+    # every PRUNE_INTERVAL seconds, drop finished jobs past their retention
+    next_prune = time.monotonic()
+    while any(worker.is_alive() for worker in workers):
+        jobs.requeue_stale(stale_after)
+        if time.monotonic() >= next_prune:
+            jobs.prune_finished()
+            next_prune = time.monotonic() + PRUNE_INTERVAL
+        deadline = time.monotonic() + max(poll, 1.0)
+        for worker in workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+    connections.close_all()
+    return sum(done)
+
+
+def _process_main(threads, poll, burst, stale_after, prefix):
+    if not apps.ready:   # "spawn" start method
+        django.setup()
+    stop = threading.Event()
+    with stop_on_signals(stop):
+        run_threads(threads, poll, burst, stale_after, prefix, stop)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the database queue (core.jobs): N worker threads, "
+        "optionally in several processes. Ctrl-C / SIGTERM lets running jobs finish."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help="Worker threads per process.")
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is due.")
+        parser.add_argument('--stale-after', type=int, help="Requeue jobs locked longer than this many "
+                                                            "seconds (default settings.JOB_LOCK_TIMEOUT).")
+
+    def handle(self, *args, **options):
+        prefix = f'{socket.gethostname()}-{os.getpid()}'
+        config = (options['threads'], options['poll'], options['burst'], options['stale_after'])
+        started = time.perf_counter()
+
+        if options['processes'] <= 1:
+            stop = threading.Event()
+            with stop_on_signals(stop):
+                done = run_threads(*config, prefix, stop)
+            self.stdout.write(f"Ran {done} job(s) in {time.perf_counter() - started:.1f}s.")
+            return
+
+        # Children must not share this process's database connections
+        connections.close_all()
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(method)
+        children = [
+            context.Process(target=_process_main, args=(*config, f'{prefix}-p{n}'))
+            for n in range(options['processes'])
+        ]
+        for child in children:
+            child.start()
+
+        stop = threading.Event()
+        forwarded = False
+        with stop_on_signals(stop):
+            while any(child.is_alive() for child in children):
+                if stop.is_set() and not forwarded:
+                    # Pass the signal on; each child lets its running jobs finish
+                    for child in children:
+                        child.terminate()
+                    forwarded = True
+                for child in children:
+                    child.join(0.5)
+        self.stdout.write(f"{len(children)} worker process(es) finished in {time.perf_counter() - started:.1f}s.")
@@ -0,0 +1,304 @@
+import math
+import random
+import time
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core import counters, rollups
+from core.fixtures_text import DRUGS, FILLER, FINDINGS
+from core.models import Appointment, Doctor, MedicalRecord, Patient, User
+from core.timeranges import start_of_day
+
+
+FIRST_NAMES = ['Aarav', 'Maya', 'Omar', 'Lena', 'Ravi', 'Sara', 'Ken', 'Ana', 'Ivan', 'Noor', 'Leo',
+               'Zara', 'Sam', 'Mei', 'Arjun', 'Nina', 'Tom', 'Aisha', 'Yusuf', 'Eva', 'Kofi', 'Lucia']
+LAST_NAMES = ['Khan', 'Patel', 'Garcia', 'Smith', 'Chen', 'Okafor', 'Silva', 'Nguyen', 'Ivanova',
+              'Haddad', 'Mehta', 'Rossi', 'Kim', 'Sato', 'Novak', 'Mensah', 'Costa', 'Iyer']
+SPECIALIZATIONS = ['General Practice', 'Cardiology', 'Dermatology', 'Pediatrics', 'Orthopedics',
+                   'Neurology', 'Gynecology', 'Psychiatry', 'ENT', 'Ophthalmology', 'Endocrinology']
+
+SLOTS_PER_DAY = 16           # 09:00-17:00 in 30 minute slots
+MAX_FILL = 0.7               # never book a doctor above this share of their slots
+WEEKDAY_LOAD = [1.0, 1.0, 1.0, 1.0, 0.9, 0.5, 0.1]
+
+# (status, share) for appointments before / after today
+PAST_STATUSES = [('Completed', 0.78), ('Rejected', 0.12), ('Confirmed', 0.06), ('Pending', 0.04)]
+FUTURE_STATUSES = [('Pending', 0.45), ('Confirmed', 0.50), ('Rejected', 0.05)]
+
+NOTE_POOL = 20_000           # distinct record descriptions to draw from
+
+# Fixed so identical seeds give identical rows; '!' marks it unusable
+SEED_PASSWORD = UNUSABLE_PASSWORD_PREFIX + 'seed-scale'
+
+
+def zipf_weights(n, exponent):
+    return [1 / (rank + 1) ** exponent for rank in range(n)]
+
+
+def split_counts(total, weights, caps):
+    """Share `total` out by `weights` without any share going over its cap."""
+    counts = [0] * len(weights)
+    open_ = set(range(len(weights)))
+    left = total
+    while left > 0 and open_:
+        weight_sum = sum(weights[i] for i in open_)
+        given = 0
+        for i in sorted(open_):
+            share = min(caps[i] - counts[i], max(1, round(left * weights[i] / weight_sum)))
+            share = min(share, left - given)
+            counts[i] += share
+            given += share
+            if counts[i] >= caps[i]:
+                open_.discard(i)
+            if given >= left:
+                break
+        left -= given
+        if given == 0:
+            break
+    return counts
+
+
+class Picker:
+    """random.choices with precomputed cumulative weights."""
+
+    def __init__(self, items, weights):
+        self.items = items
+        self.cum = list(accumulate(weights))
+
+    def pick(self, rng, k=1):
+        total = self.cum[-1]
+        return [self.items[bisect_left(self.cum, rng.random() * total)] for _ in range(k)]
+
+
+class Command(BaseCommand):
+    help = ("Generate a large, deterministic, realistic dataset (doctors, patients, appointments, "
+            "records) with raw batched inserts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--doctors', type=int, help="Default: one per 5,000 appointments (min 20).")
+        parser.add_argument('--patients', type=int, help="Default: one per 10 appointments (min 100).")
+        parser.add_argument('--years', type=float, default=3, help="History length before today.")
+        parser.add_argument('--future-days', type=int, default=60)
+        parser.add_argument('--records-per-visit', type=float, default=0.6,
+                            help="Share of completed appointments that get a medical record.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--skip-rollups', action='store_true', help="Don't rebuild the rollup and counter tables afterwards.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        total = options['appointments']
+        doctors = options['doctors'] or max(20, total // 5000)
+        patients = options['patients'] or max(100, total // 10)
+
+        today = timezone.localdate()
+        first_day = today - timedelta(days=round(options['years'] * 365))
+        days = (today - first_day).days + options['future_days']
+        capacity = int(days * SLOTS_PER_DAY * MAX_FILL)
+        if total > doctors * capacity:
+            raise CommandError(
+                f"{total} appointments don't fit {doctors} doctors over {days} days; "
+                f"use at least {math.ceil(total / capacity)} doctors."
+            )
+
+        self.day_starts = [start_of_day(first_day + timedelta(days=i)) for i in range(days)]
+        self.started = time.perf_counter()
+        self.inserted = 0
+        self.tables = {}
+        self.verbosity = options['verbosity']
+
+        with connection.cursor() as cursor:
+            self.fast_inserts(cursor)
+
+        doctor_ids, patient_ids = self.seed_people(doctors, patients)
+        self.seed_appointments(total, doctor_ids, patient_ids, capacity, options['records_per_visit'])
+
+        for model, table in self.tables.items():
+            self.stdout.write(f"  {model.__name__:14} {table['count']:>12,} rows")
+
+        if not options['skip_rollups']:
+            buckets = rollups.rebuild()
+            self.stdout.write(f"Rebuilt {buckets} rollup bucket(s).")
+            buckets = counters.rebuild()
+            self.stdout.write(f"Rebuilt {buckets} counter bucket(s).")
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {self.inserted:,} rows in {elapsed:.1f}s ({self.inserted / max(elapsed, 1e-9):,.0f} rows/s). "
+            f"Run rebuild_search_index to index the new records."
+        ))
+
+    # --------- raw batched inserts ----------
+    def fast_inserts(self, cursor):
+        # Every row is generated valid, so skip work the database would redo
+        if connection.in_atomic_block:
+            return
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA synchronous=OFF')
+            cursor.execute('PRAGMA cache_size=-262144')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+        elif connection.vendor == 'mysql':
+            cursor.execute('SET unique_checks=0, foreign_key_checks=0')
+
+    def table(self, model, columns):
+        """Register a target table; rows go in with add() and out in batches."""
+        fields = [model._meta.get_field(name) for name in columns]
+        self.tables[model] = {
+            'sql': 'INSERT INTO {} ({}) VALUES ({})'.format(
+                connection.ops.quote_name(model._meta.db_table),
+                ', '.join(connection.ops.quote_name(field.column) for field in fields),
+                ', '.join(['%s'] * len(fields)),
+            ),
+            'adapters': [self.adapter(field) for field in fields],
+            'rows': [],
+            'count': 0,
+        }
+
+    def add(self, model, row):
+        table = self.tables[model]
+        table['rows'].append([adapt(value) if adapt else value for adapt, value in zip(table['adapters'], row)])
+        if len(table['rows']) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model):
+        table = self.tables[model]
+        if not table['rows']:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(table['sql'], table['rows'])
+        table['count'] += len(table['rows'])
+        self.inserted += len(table['rows'])
+        table['rows'] = []
+
+        if self.verbosity > 1 or table['count'] % (self.batch_size * 20) == 0:
+            elapsed = time.perf_counter() - self.started
+            self.stdout.write(
+                f"  {model.__name__:14} {table['count']:>12,}   all tables {self.inserted:,} rows "
+                f"({self.inserted / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+
+    @staticmethod
+    def adapter(field):
+        internal = field.get_internal_type()
+        if internal == 'DateTimeField':
+            return connection.ops.adapt_datetimefield_value
+        if internal == 'DateField':
+            return connection.ops.adapt_datefield_value
+        return None
+
+    @staticmethod
+    def next_id(model):
+        # Ids are assigned here so no rows need reading back
+        return (model.objects.aggregate(top=Max('id'))['top'] or 0) + 1
+
+    # --------- users, doctors, patients ----------
+    def seed_people(self, doctors, patients):
+        rng = self.rng
+        first_user = self.next_id(User)
+        first_doctor, first_patient = self.next_id(Doctor), self.next_id(Patient)
+        joined = self.day_starts[0]
+
+        genders = [value for value, _ in Patient.GENDER_CHOICES]
+
+        self.table(User, ['id', 'password', 'username', 'first_name', 'last_name', 'email',
+                          'is_staff', 'is_active', 'is_superuser', 'date_joined',
+                          'is_doctor', 'is_patient', 'profile_version'])
+        for n in range(doctors + patients):
+            pk = first_user + n
+            role = 'doctor' if n < doctors else 'patient'
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            self.add(User, (pk, SEED_PASSWORD, f'{role}{pk}', first, last, f'{role}{pk}@example.com',
+                            False, True, False, joined, role == 'doctor', role == 'patient', 0))
+        self.flush(User)
+
+        self.table(Doctor, ['id', 'user_id', 'phone', 'specialization', 'qualification', 'experience',
+                            'bio', 'clinic_address', 'timings'])
+        for n in range(doctors):
+            self.add(Doctor, (first_doctor + n, first_user + n, f'+1555{rng.randrange(10**6, 10**7)}',
+                              rng.choice(SPECIALIZATIONS), 'MBBS', rng.randint(1, 35), '',
+                              f'{rng.randint(1, 999)} Clinic Road', 'Mon-Fri 09:00-17:00'))
+        self.flush(Doctor)
+
+        self.table(Patient, ['id', 'user_id', 'phone', 'age', 'gender'])
+        for n in range(patients):
+            self.add(Patient, (first_patient + n, first_user + doctors + n, f'+1555{rng.randrange(10**6, 10**7)}',
+                               min(99, max(0, int(rng.gauss(42, 20)))), rng.choice(genders)))
+        self.flush(Patient)
+
+        return (list(range(first_doctor, first_doctor + doctors)),
+                list(range(first_patient, first_patient + patients)))
+
+    # --------- appointments + records ----------
+    def day_weights(self):
+        weights = []
+        for start in self.day_starts:
+            day = start.date()
+            # Winter peak (flu season), quiet weekends
+            season = 1 + 0.25 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 15) / 365)
+            weights.append(season * WEEKDAY_LOAD[day.weekday()])
+        return weights
+
+    def seed_appointments(self, total, doctor_ids, patient_ids, capacity, records_per_visit):
+        rng = self.rng
+
+        # A few popular doctors take most of the bookings; frequent patients likewise
+        popularity = zipf_weights(len(doctor_ids), 0.8)
+        rng.shuffle(popularity)
+        counts = split_counts(total, popularity, [capacity] * len(doctor_ids))
+        patients = Picker(patient_ids, zipf_weights(len(patient_ids), 0.5))
+        days = Picker(range(len(self.day_starts)), self.day_weights())
+        past = Picker(*zip(*PAST_STATUSES))
+        future = Picker(*zip(*FUTURE_STATUSES))
+
+        # Work in the database's naive time zone so adapting values is a str()
+        db_tz = connection.timezone
+        now = timezone.make_naive(timezone.now(), db_tz)
+        slot_times = [
+            timezone.make_naive(start, db_tz) + timedelta(minutes=9 * 60 + 30 * index)
+            for start in self.day_starts for index in range(SLOTS_PER_DAY)
+        ]
+        write_ups = [timedelta(minutes=m) for m in range(10, 51)]
+        notes = [self.note(rng) for _ in range(NOTE_POOL)]
+
+        self.table(Appointment, ['id', 'patient_id', 'doctor_id', 'date_time', 'status', 'active_slot'])
+        self.table(MedicalRecord, ['id', 'patient_id', 'doctor_id', 'description', 'created_at'])
+        appointment_id, record_id = self.next_id(Appointment), self.next_id(MedicalRecord)
+
+        for doctor_id, count in zip(doctor_ids, counts):
+            # Distinct slots per doctor (the unique active-slot constraint), seasonal days
+            slots = set()
+            while len(slots) < count:
+                for day in days.pick(rng, count - len(slots)):
+                    slots.add(day * SLOTS_PER_DAY + rng.randrange(SLOTS_PER_DAY))
+
+            for slot, patient_id in zip(sorted(slots), patients.pick(rng, count)):
+                date_time = slot_times[slot]
+                status = (past if date_time < now else future).pick(rng)[0]
+                self.add(Appointment, (appointment_id, patient_id, doctor_id, date_time, status,
+                                       None if status == 'Rejected' else True))
+                appointment_id += 1
+
+                if status == 'Completed' and rng.random() < records_per_visit:
+                    self.add(MedicalRecord, (record_id, patient_id, doctor_id, rng.choice(notes),
+                                             date_time + rng.choice(write_ups)))
+                    record_id += 1
+
+        self.flush(Appointment)
+        self.flush(MedicalRecord)
+
+    @staticmethod
+    def note(rng):
+        words = rng.choices(FILLER, k=rng.randint(8, 30))
+        words.insert(rng.randrange(len(words)), rng.choice(FINDINGS))
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(DRUGS))
+        return ' '.join(words).capitalize() + '.'
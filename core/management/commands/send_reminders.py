@@ -0,0 +1,65 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import reminders
+from core.management.commands.run_workers import stop_on_signals
+
+
+class Command(BaseCommand):
+    help = (
+        "Send appointment reminders settings.REMINDER_OFFSETS_MINUTES before each "
+        "Pending / Confirmed appointment (core.reminders). Runs until Ctrl-C / SIGTERM; "
+        "safe to restart, reminders already sent are never sent again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send what is due now, then exit (for cron).")
+        parser.add_argument('--horizon', type=int, default=600,
+                            help="Seconds of upcoming reminders kept in memory.")
+        parser.add_argument('--refresh', type=int, default=60,
+                            help="Seconds between reads of newly booked / moved appointments.")
+        parser.add_argument('--grace', type=int, default=1800,
+                            help="On start, still send reminders missed by up to this many seconds.")
+        parser.add_argument('--sink', choices=['console', 'file'],
+                            help="Override settings.REMINDER_SINK.")
+        parser.add_argument('--output', help="File for --sink file (default settings.REMINDER_FILE).")
+
+    def handle(self, *args, **options):
+        if options['refresh'] > options['horizon']:
+            # Reminders due between two refreshes would only be seen late
+            raise CommandError("--refresh must not be longer than --horizon.")
+
+        if options['sink'] == 'console':
+            sink = reminders.ConsoleSink(stream=self.stdout)
+        elif options['sink'] == 'file':
+            sink = reminders.FileSink(options['output'])
+        else:
+            sink = reminders.get_sink()
+        scheduler = reminders.Scheduler(
+            sink,
+            horizon=timedelta(seconds=options['horizon']),
+            grace=timedelta(seconds=options['grace']),
+        )
+        refresh = timedelta(seconds=options['refresh'])
+        started = time.perf_counter()
+
+        stop = threading.Event()
+        sent = 0
+        next_refresh = None
+        with stop_on_signals(stop):
+            while not stop.is_set():
+                now = timezone.now()
+                if next_refresh is None or now >= next_refresh:
+                    scheduler.refill(now)
+                    next_refresh = now + refresh
+                sent += scheduler.fire_due(now)
+                if options['once']:
+                    break
+                wake = min(filter(None, [scheduler.next_due(), next_refresh]))
+                stop.wait(max((wake - timezone.now()).total_seconds(), 0.0))
+
+        self.stdout.write(f"Sent {sent} reminder(s) in {time.perf_counter() - started:.1f}s.")
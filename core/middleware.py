@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('core.instrumentation')
+
+
+# ---------------------------------------------------
+# PER-VIEW STATS REGISTRY
+# ---------------------------------------------------
+class ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.wall_time = 0.0
+        self.saved_queries = 0
+
+    def add(self, queries, db_time, wall_time, saved_queries=0):
+        self.requests += 1
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.db_time += db_time
+        self.wall_time += wall_time
+        self.saved_queries += saved_queries
+
+    def as_dict(self):
+        n = self.requests or 1
+        return {
+            'requests': self.requests,
+            'max_queries': self.max_queries,
+            'avg_queries': self.queries / n,
+            'avg_db_ms': self.db_time * 1000 / n,
+            'avg_wall_ms': self.wall_time * 1000 / n,
+            # Patient/Doctor lookups answered by request.profiles without a query
+            'saved_queries': self.saved_queries,
+            'avg_saved_queries': self.saved_queries / n,
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(view_name, queries, db_time, wall_time, saved_queries=0):
+    with _stats_lock:
+        _stats.setdefault(view_name, ViewStats()).add(queries, db_time, wall_time, saved_queries)
+
+
+def snapshot():
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
+
+
+def budget_for(view_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+
+
+# ---------------------------------------------------
+# QUERY RECORDER (installed with connection.execute_wrapper)
+# ---------------------------------------------------
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self._lock = threading.Lock()   # shared with worker threads
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.count += 1
+                self.db_time += time.perf_counter() - start
+
+
+# The request's recorder; sync_to_async copies it into worker threads
+_recorder = ContextVar('query_recorder', default=None)
+
+
+@contextmanager
+def recorded_queries():
+    """
+    Count this thread's queries towards the current request. Wrappers are
+    per connection, and connections per thread, so code running queries on
+    other threads (core.dashboards.in_worker) must enter this there too.
+    """
+    recorder = _recorder.get()
+    with ExitStack() as stack:
+        if recorder is not None:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+        yield
+
+
+# ---------------------------------------------------
+# MIDDLEWARE
+# ---------------------------------------------------
+class QueryInstrumentationMiddleware:
+    """
+    Records query count, DB time and wall time for every resolved view
+    (e.g. ``core:appointment_list``), plus the profile lookups that
+    ``request.profiles`` answered without a query, and warns when a view
+    goes over its entry in ``settings.QUERY_BUDGETS``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+
+        token = _recorder.set(recorder)
+        try:
+            with recorded_queries():
+                response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+
+        wall_time = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+
+        view_name = match.view_name
+        profiles = getattr(request, 'profiles', None)
+        saved = profiles.saved_queries if profiles else 0
+        record(view_name, recorder.count, recorder.db_time, wall_time, saved)
+
+        budget = budget_for(view_name)
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d) in %.1f ms",
+                view_name, recorder.count, budget, wall_time * 1000,
+            )
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Queries-Saved'] = str(saved)
+            response['Server-Timing'] = (
+                f'db;dur={recorder.db_time * 1000:.1f}, total;dur={wall_time * 1000:.1f}'
+            )
+
+        return response
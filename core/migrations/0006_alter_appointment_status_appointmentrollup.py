@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def fill_rollups(apps, schema_editor):
+    Appointment = apps.get_model('core', 'Appointment')
+    AppointmentRollup = apps.get_model('core', 'AppointmentRollup')
+
+    rows = (
+        Appointment.objects
+        .annotate(month=TruncMonth('date_time', output_field=DateField()))
+        .values('month', 'doctor_id', 'status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    AppointmentRollup.objects.bulk_create(
+        [
+            AppointmentRollup(
+                month=row['month'],
+                doctor_id=row['doctor_id'],
+                status=row['status'],
+                count=row['total'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_doctor_experience'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Completed', 'Completed'), ('Rejected', 'Rejected')], default='Pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='AppointmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'doctor', 'status'), name='unique_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:43
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Min
+from django.db.models.functions import TruncMonth
+
+
+def release_inactive_slots(apps, schema_editor):
+    Appointment = apps.get_model('core', 'Appointment')
+    AppointmentRollup = apps.get_model('core', 'AppointmentRollup')
+    Appointment.objects.filter(status='Rejected').update(active_slot=None)
+
+    # Existing double bookings: the oldest row keeps the slot, the others
+    # are rejected so the unique constraint can be created.
+    duplicates = (
+        Appointment.objects
+        .filter(active_slot=True)
+        .values('doctor_id', 'date_time')
+        .annotate(rows=Count('id'), keep=Min('id'))
+        .filter(rows__gt=1)
+    )
+    doctor_ids = set()
+    for dup in duplicates:
+        (Appointment.objects
+         .filter(doctor_id=dup['doctor_id'], date_time=dup['date_time'], active_slot=True)
+         .exclude(id=dup['keep'])
+         .update(status='Rejected', active_slot=None))
+        doctor_ids.add(dup['doctor_id'])
+
+    # update() skips the signals, so recount those doctors' rollups
+    if doctor_ids:
+        AppointmentRollup.objects.filter(doctor_id__in=doctor_ids).delete()
+        rows = (
+            Appointment.objects
+            .filter(doctor_id__in=doctor_ids)
+            .annotate(month=TruncMonth('date_time', output_field=DateField()))
+            .values('month', 'doctor_id', 'status')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        AppointmentRollup.objects.bulk_create(
+            [
+                AppointmentRollup(month=row['month'], doctor_id=row['doctor_id'],
+                                  status=row['status'], count=row['total'])
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_doctor_schedules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='active_slot',
+            field=models.BooleanField(default=True, editable=False, null=True),
+        ),
+        migrations.RunPython(release_inactive_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date_time', 'active_slot'), name='unique_active_doctor_slot'),
+        ),
+    ]
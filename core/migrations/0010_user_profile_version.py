@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_appointment_active_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
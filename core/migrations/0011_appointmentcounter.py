@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_counters(apps, schema_editor):
+    Appointment = apps.get_model('core', 'Appointment')
+    AppointmentCounter = apps.get_model('core', 'AppointmentCounter')
+
+    rows = (
+        Appointment.objects
+        .annotate(day=TruncDate('date_time'))
+        .values('day', 'doctor_id', 'status')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    AppointmentCounter.objects.bulk_create(
+        (
+            AppointmentCounter(
+                day=row['day'],
+                doctor_id=row['doctor_id'],
+                status=row['status'],
+                count=row['total'],
+            )
+            for row in rows
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_user_profile_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'day'], name='counter_doctor_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'doctor', 'status'), name='unique_counter_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_appointmentcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date_time', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('active_slot', models.BooleanField(null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'date_time'], name='arch_appt_patient_date_idx'), models.Index(fields=['doctor', 'date_time'], name='arch_appt_doctor_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMedicalRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('description', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['patient', 'created_at'], name='arch_rec_patient_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_patient_deletion_requested_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('appointment_id', models.BigIntegerField()),
+                ('doctor_id', models.BigIntegerField()),
+                ('from_status', models.PositiveSmallIntegerField(choices=[(0, '-'), (1, 'Pending'), (2, 'Confirmed'), (3, 'Completed'), (4, 'Rejected')])),
+                ('status', models.PositiveSmallIntegerField(choices=[(0, '-'), (1, 'Pending'), (2, 'Confirmed'), (3, 'Completed'), (4, 'Rejected')])),
+                ('at', models.DateTimeField()),
+                ('elapsed', models.IntegerField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['appointment_id', 'at'], name='event_appt_at_idx'), models.Index(fields=['doctor_id', 'from_status', 'status', 'elapsed'], name='event_transition_idx')],
+            },
+        ),
+    ]
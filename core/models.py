@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 # ---------------------------
@@ -7,6 +8,8 @@ from django.contrib.auth.models import AbstractUser
 class User(AbstractUser):
     is_doctor = models.BooleanField(default=False)
     is_patient = models.BooleanField(default=False)
+    # Bumped whenever this user's Patient/Doctor profile changes (see core.profiles)
+    profile_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.username
@@ -29,6 +32,64 @@ class Doctor(models.Model):
         return self.user.get_full_name()
 
 
+# ---------------------------
+# DOCTOR WEEKLY SCHEDULE
+# ---------------------------
+WEEKDAY_CHOICES = [
+    (0, 'Monday'),
+    (1, 'Tuesday'),
+    (2, 'Wednesday'),
+    (3, 'Thursday'),
+    (4, 'Friday'),
+    (5, 'Saturday'),
+    (6, 'Sunday'),
+]
+
+
+class DoctorSchedule(models.Model):
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        ordering = ['doctor', 'weekday', 'start_time']
+
+    def __str__(self):
+        return f"{self.doctor} {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class ScheduleBreak(models.Model):
+    schedule = models.ForeignKey(DoctorSchedule, on_delete=models.CASCADE, related_name='breaks')
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    def __str__(self):
+        return f"Break {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class ScheduleException(models.Model):
+    # Leave / holidays (is_available=False) or extra hours (is_available=True)
+    # on one date. Empty start/end times mean the whole day.
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedule_exceptions')
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    is_available = models.BooleanField(default=False)
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    reason = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='schedexc_doctor_date_idx'),
+        ]
+
+    def __str__(self):
+        kind = "Available" if self.is_available else "Unavailable"
+        return f"{self.doctor} {kind} on {self.date}"
+
+
 
 
 # ---------------------------
@@ -49,10 +110,16 @@ class Patient(models.Model):
     phone = models.CharField(max_length=15)
     age = models.IntegerField()
     gender = models.CharField(max_length=10, choices=GENDER_CHOICES, default='Male')
+    # Set when deletion is requested; the rows go in the background (core.deletion)
+    deletion_requested_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.phone}"
 
+    @property
+    def pending_deletion(self):
+        return self.deletion_requested_at is not None
+
 
 # ---------------------------
 # APPOINTMENT
@@ -72,10 +139,53 @@ class Appointment(models.Model):
         ],
         default='Pending'
     )
+    # True while the appointment holds its slot, NULL once Rejected.
+    # NULLs never collide in a unique index, so the constraint below allows
+    # any number of rejected rows but only one live booking per slot.
+    active_slot = models.BooleanField(null=True, default=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date_time', 'active_slot'],
+                name='unique_active_doctor_slot',
+            ),
+        ]
+        indexes = [
+            # per-patient / per-doctor lists ordered by -date_time
+            models.Index(fields=['patient', 'date_time'], name='appt_patient_date_idx'),
+            models.Index(fields=['doctor', 'date_time'], name='appt_doctor_date_idx'),
+            # staff list (keyset on date_time, id) and "today" ranges
+            models.Index(fields=['date_time', 'id'], name='appt_date_id_idx'),
+            # status breakdown (GROUP BY status) and status filters by date
+            models.Index(fields=['status', 'date_time'], name='appt_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient} with {self.doctor} on {self.date_time}"
 
+    def save(self, *args, **kwargs):
+        self.active_slot = None if self.status == 'Rejected' else True
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'active_slot'}
+        # The rollup/counter receivers run inside the same transaction
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember what was loaded so signal handlers can tell
+        # which rollup bucket the row is moving out of.
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        # The reloaded values don't pass through from_db() on this instance
+        self.__dict__.pop('_loaded_values', None)
+        super().refresh_from_db(*args, **kwargs)
+
 
 # ---------------------------
 # MEDICAL RECORD
@@ -86,8 +196,190 @@ class MedicalRecord(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='record_patient_created_idx'),
+            models.Index(fields=['doctor', 'created_at'], name='record_doctor_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='record_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Record for {self.patient} by {self.doctor}"
 
 
+# ---------------------------
+# APPOINTMENT ROLLUP (per month / status / doctor)
+# ---------------------------
+class AppointmentRollup(models.Model):
+    month = models.DateField()   # first day of the month (local time)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'doctor', 'status'],
+                name='unique_rollup_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%b %Y} {self.doctor_id} {self.status}: {self.count}"
+
+
+# ---------------------------
+# APPOINTMENT COUNTER (per day / doctor / status)
+# ---------------------------
+class AppointmentCounter(models.Model):
+    day = models.DateField()   # local date of the appointment
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'doctor', 'status'],
+                name='unique_counter_bucket',
+            ),
+        ]
+        indexes = [
+            # one doctor's totals / one doctor's days
+            models.Index(fields=['doctor', 'day'], name='counter_doctor_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.doctor_id} {self.status}: {self.count}"
+
 
+# ---------------------------
+# ARCHIVE (cold copies of old appointments / records, see core.archive)
+# ---------------------------
+# Same columns as the live tables, original ids kept, plus when the row moved.
+class ArchivedAppointment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    date_time = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    active_slot = models.BooleanField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date_time'], name='arch_appt_patient_date_idx'),
+            models.Index(fields=['doctor', 'date_time'], name='arch_appt_doctor_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} with {self.doctor} on {self.date_time} (archived)"
+
+
+class ArchivedMedicalRecord(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True, blank=True)
+    description = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'created_at'], name='arch_rec_patient_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Record for {self.patient} by {self.doctor} (archived)"
+
+
+# ---------------------------
+# BACKGROUND JOB (see core.jobs)
+# ---------------------------
+class Job(models.Model):
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=[(s, s.title()) for s in (QUEUED, RUNNING, DONE, FAILED)],
+        default=QUEUED,
+    )
+    priority = models.SmallIntegerField(default=0)   # higher runs first
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    # dedup_key while the job is queued or running, NULL afterwards. NULLs never
+    # collide in a unique index, so there is at most one live job per key.
+    active_key = models.CharField(max_length=200, null=True, unique=True, editable=False)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # next job to claim: WHERE status = 'queued' ORDER BY -priority, run_at
+            models.Index(fields=['status', 'priority', 'run_at'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# ---------------------------
+# APPOINTMENT STATUS HISTORY (append-only, see core.events)
+# ---------------------------
+# Compact on purpose: plain integer ids (no foreign keys, so history
+# survives archiving and costs no constraint checks on insert) and
+# small-int status codes.
+class AppointmentEvent(models.Model):
+    NONE, PENDING, CONFIRMED, COMPLETED, REJECTED = range(5)
+    STATUS_CODES = {'Pending': PENDING, 'Confirmed': CONFIRMED, 'Completed': COMPLETED, 'Rejected': REJECTED}
+    CODE_CHOICES = [(NONE, '-'), *((code, status) for status, code in STATUS_CODES.items())]
+
+    id = models.BigAutoField(primary_key=True)
+    # as wide as the BigAutoField keys they hold
+    appointment_id = models.BigIntegerField()
+    doctor_id = models.BigIntegerField()
+    from_status = models.PositiveSmallIntegerField(choices=CODE_CHOICES)   # NONE when booked
+    status = models.PositiveSmallIntegerField(choices=CODE_CHOICES)
+    at = models.DateTimeField()
+    # Seconds since the appointment's previous event (NULL for the first one)
+    elapsed = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            # one appointment's history, and its latest event when appending
+            models.Index(fields=['appointment_id', 'at'], name='event_appt_at_idx'),
+            # per-doctor transition durations, already sorted (medians)
+            models.Index(fields=['doctor_id', 'from_status', 'status', 'elapsed'], name='event_transition_idx'),
+        ]
+
+    def __str__(self):
+        return (f"Appointment {self.appointment_id}: "
+                f"{self.get_from_status_display()} -> {self.get_status_display()} at {self.at}")
+
+
+# ---------------------------
+# SENT APPOINTMENT REMINDERS (see core.reminders)
+# ---------------------------
+# One row per (appointment, offset) reminder; the unique constraint is what
+# keeps a restarted or second scheduler from sending it twice.
+class ReminderDelivery(models.Model):
+    appointment_id = models.BigIntegerField()
+    offset_minutes = models.PositiveIntegerField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['appointment_id', 'offset_minutes'], name='unique_reminder'),
+        ]
+
+    def __str__(self):
+        return f"Reminder {self.offset_minutes} min before appointment {self.appointment_id}"
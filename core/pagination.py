@@ -0,0 +1,138 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 25
+
+
+# ---------------------------------------------------
+# CURSOR TOKENS
+# ---------------------------------------------------
+# A cursor is the ordering key of a boundary row plus a direction
+# ("n" = rows after it, "p" = rows before it), as url-safe base64 JSON.
+def encode_cursor(values, direction):
+    payload = json.dumps({'k': values, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = data['k'], data['d']
+    except (ValueError, TypeError, KeyError):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return values, direction
+
+
+# ---------------------------------------------------
+# PAGINATOR
+# ---------------------------------------------------
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a unique ordering such as ('-date_time', '-id').
+    Each page is a single indexed range query (WHERE key < cursor ... LIMIT n+1),
+    so page 1000 costs the same as page 1, unlike OFFSET paging.
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        model_fields = {f.attname: f for f in queryset.model._meta.concrete_fields}
+        model_fields['pk'] = queryset.model._meta.pk
+        self.model_fields = [model_fields[name] for name in self.fields]
+
+    # --------- key helpers ----------
+    def _key(self, obj):
+        values = []
+        for field in self.fields:
+            value = getattr(obj, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _parse_key(self, values):
+        if len(values) != len(self.fields):
+            raise ValueError('cursor does not match ordering')
+        return [field.to_python(value) for field, value in zip(self.model_fields, values)]
+
+    def _seek(self, key, forward):
+        # (a, b) "after" (va, vb) == a > va OR (a = va AND b > vb),
+        # with > flipped to < for descending fields and when paging back.
+        condition = Q()
+        equal = {}
+        for name, field, value in zip(self.ordering, self.fields, key):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    @staticmethod
+    def _flip(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
+
+    # --------- public API ----------
+    def page(self, cursor=None):
+        decoded = decode_cursor(cursor) if cursor else None
+        key, direction = None, 'n'
+        if decoded:
+            try:
+                key, direction = self._parse_key(decoded[0]), decoded[1]
+            except (ValueError, TypeError, ValidationError):
+                key, direction = None, 'n'
+
+        forward = direction == 'n'
+        qs = self.queryset.order_by(*(
+            self.ordering if forward else map(self._flip, self.ordering)
+        ))
+        if key is not None:
+            qs = qs.filter(self._seek(key, forward))
+
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            has_next, has_previous = has_more, key is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = encode_cursor(self._key(rows[-1]), 'n') if rows and has_next else None
+        previous_cursor = encode_cursor(self._key(rows[0]), 'p') if rows and has_previous else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+    return KeysetPaginator(queryset, ordering, per_page).page(request.GET.get('cursor'))
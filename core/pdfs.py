@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Frame, Paragraph
+
+from .models import MedicalRecord
+
+
+# Bump when the layout below changes so every cached file is re-rendered.
+LAYOUT_VERSION = 1
+
+# Built once per process instead of on every download
+NOTE_STYLE = ParagraphStyle(
+    'MedicalNote',
+    parent=getSampleStyleSheet()['Normal'],
+    fontSize=12,
+    leading=16,
+)
+
+
+# ---------------------------------------------------
+# INPUTS / CONTENT HASH
+# ---------------------------------------------------
+def record_queryset():
+    return MedicalRecord.objects.select_related('patient__user', 'doctor__user')
+
+
+def pdf_inputs(record):
+    doctor = record.doctor
+    return {
+        'layout': LAYOUT_VERSION,
+        'record': record.pk,
+        'patient_name': record.patient.user.get_full_name(),
+        'patient_email': record.patient.user.email,
+        'patient_phone': record.patient.phone,
+        'doctor_name': doctor.user.get_full_name() if doctor else '—',
+        'specialization': doctor.specialization if doctor else '—',
+        'description': record.description,
+        'created_at': record.created_at.strftime('%b %d, %Y – %I:%M %p'),
+    }
+
+
+def content_hash(inputs):
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def download_name(record):
+    return f"MedicalRecord_{record.patient.user.get_full_name().replace(' ', '_')}.pdf"
+
+
+# ---------------------------------------------------
+# RENDERING
+# ---------------------------------------------------
+def render(inputs):
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer)
+    p.setTitle("Medical Report")
+
+    # ---------- HEADER ----------
+    p.setFont("Helvetica-Bold", 18)
+    p.drawCentredString(300, 800, "MediCare Pro – Medical Report")
+
+    p.setLineWidth(0.5)
+    p.line(50, 785, 550, 785)
+
+    # ---------- PATIENT INFO ----------
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, 760, "Patient Information:")
+
+    p.setFont("Helvetica", 12)
+    p.drawString(70, 740, f"Name: {inputs['patient_name']}")
+    p.drawString(70, 720, f"Email: {inputs['patient_email']}")
+    p.drawString(70, 700, f"Phone: {inputs['patient_phone']}")
+
+    # ---------- DOCTOR INFO ----------
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, 670, "Doctor Information:")
+
+    p.setFont("Helvetica", 12)
+    p.drawString(70, 650, f"Doctor: {inputs['doctor_name']}")
+    p.drawString(70, 630, f"Specialization: {inputs['specialization']}")
+
+    # ---------- MEDICAL NOTE ----------
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, 600, "Medical Note:")
+
+    # Wrap long text (no overlapping)
+    paragraph = Paragraph(inputs['description'].replace("\n", "<br/>"), NOTE_STYLE)
+    Frame(50, 260, 500, 320, showBoundary=0).addFromList([paragraph], p)
+
+    # ---------- FOOTER ----------
+    p.setFont("Helvetica", 11)
+    p.drawString(50, 220, f"Created on: {inputs['created_at']}")
+    p.drawString(50, 205, f"Doctor: {inputs['doctor_name']}")
+
+    # Signature line
+    p.line(50, 180, 250, 180)
+    p.drawString(50, 165, "Doctor Signature")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------
+# DISK CACHE:  <PDF_CACHE_DIR>/<record id>/<content hash>.pdf
+# ---------------------------------------------------
+def cache_dir():
+    return Path(settings.PDF_CACHE_DIR)
+
+
+def record_dir(record_id):
+    return cache_dir() / str(record_id)
+
+
+def cached_pdf(record):
+    """Return (path, etag) of the record's PDF, rendering it only on a cache miss."""
+    inputs = pdf_inputs(record)
+    etag = content_hash(inputs)
+    folder = record_dir(record.pk)
+    path = folder / f'{etag}.pdf'
+
+    if not path.exists():
+        # First download or inputs changed: write atomically, then drop
+        # renders of older inputs.
+        folder.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(render(inputs))
+            os.replace(tmp, path)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+        for old in folder.glob('*.pdf'):
+            if old != path:
+                old.unlink(missing_ok=True)
+
+    return path, etag
+
+
+def open_pdf(record, attempts=3):
+    """
+    Return (open file, etag) of the record's PDF. The file is opened here:
+    a concurrent render or invalidate() may delete the path (or its folder)
+    at any moment, and an open handle keeps the contents readable.
+    """
+    for attempt in range(attempts):
+        try:
+            path, etag = cached_pdf(record)
+            return open(path, 'rb'), etag
+        except FileNotFoundError:
+            if attempt == attempts - 1:
+                raise
+
+
+def invalidate(*record_ids):
+    for record_id in record_ids:
+        shutil.rmtree(record_dir(record_id), ignore_errors=True)
+
+
+def prerender(record_id):
+    record = record_queryset().filter(pk=record_id).first()
+    if record is not None:
+        cached_pdf(record)
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Doctor, Patient
+
+
+# ---------------------------------------------------
+# REQUEST-SCOPED ROLE PROFILES
+# ---------------------------------------------------
+# `request.profiles.patient` / `.doctor` replace the
+# `Patient.objects.get(user=request.user)` calls scattered through the views.
+# Each profile is looked up at most once per request and, with
+# PROFILE_SESSION_CACHE on, kept in the session between requests. The
+# session copy is tagged with User.profile_version (bumped by core.signals
+# whenever the profile is saved or deleted), and the user row is loaded on
+# every request anyway, so checking it costs nothing.
+SESSION_KEY = '_role_profiles'
+MODELS = {'patient': Patient, 'doctor': Doctor}
+_MISSING = object()
+
+
+def _fields(model):
+    return [f.attname for f in model._meta.concrete_fields]
+
+
+class ProfileLoader:
+
+    def __init__(self, request):
+        self.request = request
+        self.loaded = {}
+        self.lookups = 0    # profile accesses in this request
+        self.queries = 0    # ...of which had to hit the database
+
+    @property
+    def saved_queries(self):
+        return self.lookups - self.queries
+
+    @property
+    def patient(self):
+        return self._get('patient')
+
+    @property
+    def doctor(self):
+        return self._get('doctor')
+
+    @property
+    def patient_id(self):
+        return getattr(self.patient, 'pk', None)
+
+    @property
+    def doctor_id(self):
+        return getattr(self.doctor, 'pk', None)
+
+    def _get(self, role):
+        self.lookups += 1
+        profile = self.loaded.get(role, _MISSING)
+        if profile is _MISSING:
+            profile = self.loaded[role] = self._load(role)
+        return profile
+
+    def _load(self, role):
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+
+        model = MODELS[role]
+        cached = self._session_entry(user)
+        if cached is not None and role in cached['profiles']:
+            values = cached['profiles'][role]
+            if values is None:
+                return None
+            profile = model.from_db(DEFAULT_DB_ALIAS, _fields(model), values)
+        else:
+            self.queries += 1
+            profile = model.objects.filter(user=user).first()
+            if cached is not None:
+                cached['profiles'][role] = (
+                    None if profile is None else [getattr(profile, name) for name in _fields(model)]
+                )
+                self.request.session.modified = True
+
+        if profile is not None:
+            profile.user = user
+        return profile
+
+    def _session_entry(self, user):
+        if not getattr(settings, 'PROFILE_SESSION_CACHE', False):
+            return None
+        session = getattr(self.request, 'session', None)
+        if session is None:
+            return None
+
+        entry = session.get(SESSION_KEY)
+        if not entry or entry['user'] != user.pk or entry['version'] != user.profile_version:
+            entry = session[SESSION_KEY] = {'user': user.pk, 'version': user.profile_version, 'profiles': {}}
+        return entry
+
+
+class RoleProfileMiddleware:
+    """Attaches a lazy ProfileLoader as ``request.profiles``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profiles = ProfileLoader(request)
+        return self.get_response(request)
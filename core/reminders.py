@@ -0,0 +1,185 @@
+import heapq
+import json
+import logging
+import sys
+from collections import namedtuple
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment, ReminderDelivery
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('Pending', 'Confirmed')
+
+Reminder = namedtuple('Reminder', 'appointment_id offset_minutes date_time patient email doctor')
+
+
+# ---------------------------------------------------
+# SINKS
+# ---------------------------------------------------
+# Anything with send(reminder); settings.REMINDER_SINK names the class.
+# Raising from send() means "not delivered": the reminder is retried.
+class ConsoleSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, reminder):
+        when = timezone.localtime(reminder.date_time)
+        self.stream.write(f"[reminder] {reminder.patient} <{reminder.email}>: appointment with "
+                          f"Dr. {reminder.doctor} on {when:%Y-%m-%d %H:%M} "
+                          f"({reminder.offset_minutes} min notice)\n")
+        self.stream.flush()
+
+
+class FileSink:
+    """Appends one JSON line per reminder (a stand-in for an e-mail/SMS gateway)."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or settings.REMINDER_FILE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def send(self, reminder):
+        line = json.dumps({**reminder._asdict(), 'date_time': reminder.date_time.isoformat()})
+        with self.path.open('a') as fh:
+            fh.write(line + '\n')
+
+
+def get_sink(**kwargs):
+    return import_string(settings.REMINDER_SINK)(**kwargs)
+
+
+# ---------------------------------------------------
+# SCHEDULER (run by `manage.py send_reminders`)
+# ---------------------------------------------------
+# A reminder fires `offset` before its appointment. Instead of scanning all
+# upcoming appointments, each refresh reads only the reminders firing in
+# [previous refresh, now + horizon) - per offset one keyset-paged range scan
+# over the date_time index - and pushes them onto a heap ordered by fire
+# time. Memory is bounded by the reminders due within the horizon, however
+# many appointments lie further ahead.
+#
+# Windows start at the previous refresh, so a booking made (or moved) since
+# then is still picked up if its reminder hasn't passed. Before sending,
+# every due reminder is checked against the current row (still active, not
+# moved) and claimed with a ReminderDelivery insert; the unique constraint
+# makes that idempotent across restarts and concurrent schedulers.
+class Scheduler:
+
+    def __init__(self, sink, offsets=None, horizon=timedelta(minutes=10), grace=timedelta(minutes=30),
+                 retry_after=timedelta(minutes=1), page_size=5000):
+        minutes = offsets or settings.REMINDER_OFFSETS_MINUTES
+        self.offsets = sorted({int(m) for m in minutes}, reverse=True)
+        self.sink = sink
+        self.horizon = horizon
+        self.grace = grace              # after a restart, still send reminders this late
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.heap = []                  # (fire_at, appointment_id, offset_minutes, date_time)
+        self.seen = {}                  # those keys -> fire_at, to skip them in overlapping windows
+        self.window_start = None
+
+    def _window(self, start, end):
+        """(id, date_time) of active appointments in [start, end), in keyset-paged chunks."""
+        rows = (
+            Appointment.objects
+            .filter(date_time__gte=start, date_time__lt=end, status__in=ACTIVE_STATUSES)
+            .order_by('date_time', 'id')
+            .values_list('id', 'date_time')
+        )
+        last = None
+        while True:
+            page = rows if last is None else rows.filter(
+                Q(date_time__gt=last[1]) | Q(date_time=last[1], id__gt=last[0])
+            )
+            chunk = list(page[:self.page_size])
+            yield from chunk
+            if len(chunk) < self.page_size:
+                return
+            last = chunk[-1]
+
+    def refill(self, now):
+        start = self.window_start or now - self.grace
+        end = now + self.horizon
+        added = 0
+        for minutes in self.offsets:
+            offset = timedelta(minutes=minutes)
+            for pk, date_time in self._window(start + offset, end + offset):
+                key = (pk, minutes, date_time)
+                if key not in self.seen:
+                    self.seen[key] = date_time - offset
+                    heapq.heappush(self.heap, (date_time - offset, pk, minutes, date_time))
+                    added += 1
+        # Nothing before `start` can come back in a later window
+        self.seen = {key: fire_at for key, fire_at in self.seen.items() if fire_at >= start}
+        self.window_start = now
+        return added
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def fire_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        if not due:
+            return 0
+
+        ids = {pk for _, pk, _, _ in due}
+        current = {
+            row['id']: row for row in
+            Appointment.objects.filter(pk__in=ids, status__in=ACTIVE_STATUSES).values(
+                'id', 'date_time', 'patient__user__first_name', 'patient__user__last_name',
+                'patient__user__email', 'doctor__user__first_name', 'doctor__user__last_name',
+            )
+        }
+        sent = set(
+            ReminderDelivery.objects.filter(appointment_id__in=ids).values_list('appointment_id', 'offset_minutes')
+        )
+
+        delivered = 0
+        for fire_at, pk, minutes, date_time in due:
+            row = current.get(pk)
+            # Cancelled, moved (the new time comes through the window), too late, or already sent
+            if row is None or row['date_time'] != date_time or date_time <= now or (pk, minutes) in sent:
+                continue
+            if self.deliver(self._reminder(row, minutes)):
+                delivered += 1
+            else:
+                heapq.heappush(self.heap, (now + self.retry_after, pk, minutes, date_time))
+        return delivered
+
+    def _reminder(self, row, minutes):
+        return Reminder(
+            appointment_id=row['id'],
+            offset_minutes=minutes,
+            date_time=row['date_time'],
+            patient=f"{row['patient__user__first_name']} {row['patient__user__last_name']}".strip(),
+            email=row['patient__user__email'],
+            doctor=f"{row['doctor__user__first_name']} {row['doctor__user__last_name']}".strip(),
+        )
+
+    def deliver(self, reminder):
+        """Claim, then send; the claim is dropped again if sending fails. False means retry."""
+        try:
+            with transaction.atomic():
+                claim = ReminderDelivery.objects.create(
+                    appointment_id=reminder.appointment_id, offset_minutes=reminder.offset_minutes,
+                )
+        except IntegrityError:
+            return True     # another scheduler got there first
+
+        try:
+            self.sink.send(reminder)
+        except Exception:
+            logger.exception("Could not send reminder for appointment %s", reminder.appointment_id)
+            claim.delete()
+            return False
+        return True
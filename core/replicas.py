@@ -0,0 +1,89 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# ---------------------------------------------------
+# READ-REPLICA ROUTING
+# ---------------------------------------------------
+# Reads go to a replica (settings.REPLICA_DATABASES) only while a request
+# to one of settings.REPLICA_VIEWS is being handled, and only until that
+# request writes anything. After a write the user's session is pinned to
+# the primary for REPLICA_PIN_SECONDS, so they see their own change even
+# if the replicas lag. Everything else (other views, commands, workers)
+# reads from the primary.
+PIN_KEY = '_primary_until'
+
+# Sessions are written on (almost) every request; reading them from a
+# lagging replica would drop logins and messages.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+class Route:
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+_route = ContextVar('replica_route', default=None)
+
+
+def current():
+    return _route.get()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        if (
+            route is None or not route.use_replica or route.wrote or not replicas
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            # Explicit, so related lookups on replica-loaded instances follow too
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaMiddleware:
+    """Decides per request whether reads may use a replica (``request.use_replica``)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        route = Route()
+        token = _route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+
+        if route.wrote and getattr(settings, 'REPLICA_DATABASES', []) and hasattr(request, 'session'):
+            request.session[PIN_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = _route.get()
+        route.use_replica = bool(
+            getattr(settings, 'REPLICA_DATABASES', [])
+            and request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and request.session.get(PIN_KEY, 0) <= time.time()
+        )
+        request.use_replica = route.use_replica
@@ -0,0 +1,114 @@
+from collections import Counter, OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Appointment, AppointmentRollup, ArchivedAppointment
+
+
+STATUSES = ['Pending', 'Confirmed', 'Completed', 'Rejected']
+
+
+# ---------------------------------------------------
+# BUCKET HELPERS
+# ---------------------------------------------------
+def month_of(dt):
+    return timezone.localtime(dt).date().replace(day=1)
+
+
+def bucket_for(date_time, doctor_id, status):
+    if date_time is None or doctor_id is None:
+        return None
+    return (month_of(date_time), doctor_id, status)
+
+
+def bump(bucket, delta):
+    if bucket is None or delta == 0:
+        return
+
+    month, doctor_id, status = bucket
+    rows = AppointmentRollup.objects.filter(
+        month=month, doctor_id=doctor_id, status=status
+    )
+
+    if rows.update(count=F('count') + delta) or delta < 0:
+        # Nothing to decrement means the bucket went away with its doctor.
+        return
+
+    # First appointment in this bucket -> create it. Another request may
+    # have created it in the meantime, in which case just increment.
+    try:
+        with transaction.atomic():
+            AppointmentRollup.objects.create(
+                month=month, doctor_id=doctor_id, status=status, count=delta
+            )
+    except IntegrityError:
+        rows.update(count=F('count') + delta)
+
+
+def move(old_bucket, new_bucket):
+    if old_bucket == new_bucket:
+        return
+    bump(old_bucket, -1)
+    bump(new_bucket, 1)
+
+
+# ---------------------------------------------------
+# FULL REBUILD (used by `manage.py rebuild_rollups`)
+# ---------------------------------------------------
+@transaction.atomic
+def rebuild():
+    AppointmentRollup.objects.all().delete()
+
+    # Archived appointments still count (see core.archive)
+    totals = Counter()
+    for model in (Appointment, ArchivedAppointment):
+        rows = (
+            model.objects
+            .annotate(month=TruncMonth('date_time', output_field=DateField()))
+            .values('month', 'doctor_id', 'status')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        for row in rows:
+            totals[row['month'], row['doctor_id'], row['status']] += row['total']
+
+    buckets = [
+        AppointmentRollup(month=month, doctor_id=doctor_id, status=status, count=total)
+        for (month, doctor_id, status), total in totals.items()
+    ]
+    AppointmentRollup.objects.bulk_create(buckets, batch_size=1000)
+    return len(buckets)
+
+
+# ---------------------------------------------------
+# DASHBOARD READS
+# ---------------------------------------------------
+def status_counts():
+    counts = dict.fromkeys(STATUSES, 0)
+    rows = (
+        AppointmentRollup.objects
+        .values('status')
+        .annotate(total=Sum('count'))
+        .order_by()
+    )
+    for row in rows:
+        counts[row['status']] = row['total'] or 0
+    return counts
+
+
+def monthly_counts():
+    monthly = OrderedDict()
+    rows = (
+        AppointmentRollup.objects
+        .values('month')
+        .annotate(total=Sum('count'))
+        .order_by('month')
+    )
+    for row in rows:
+        if row['total']:
+            # Example: "Dec 2025"
+            monthly[row['month'].strftime('%b %Y')] = row['total']
+    return monthly
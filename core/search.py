@@ -0,0 +1,178 @@
+import re
+import sqlite3
+import threading
+from itertools import chain, islice
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import ArchivedMedicalRecord, MedicalRecord
+
+
+# ---------------------------------------------------
+# MEDICAL RECORD FULL-TEXT INDEX
+# ---------------------------------------------------
+# An SQLite FTS5 inverted index kept in its own file next to the main
+# database (which may be MySQL), so search needs no external service.
+# rowid is the MedicalRecord id. Doctor / patient filters are indexed as
+# "d<id> p<id>" tokens in `tags`, so a filtered search intersects posting
+# lists instead of checking every match; `tags` carries no weight in ranking.
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS record_fts USING fts5(
+    description,
+    tags,
+    created_at UNINDEXED,
+    tokenize = 'porter unicode61'
+)
+"""
+
+MARK_START, MARK_END = '\x02', '\x03'
+TOKEN_RE = re.compile(r'\w+\*?', re.UNICODE)
+
+_local = threading.local()
+
+
+class Hit:
+    __slots__ = ('record_id', 'score', 'snippet')
+
+    def __init__(self, record_id, score, snippet):
+        self.record_id = record_id
+        self.score = score
+        self.snippet = snippet
+
+
+def connection():
+    path = str(settings.SEARCH_INDEX_PATH)
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is None:
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(SCHEMA)
+        conns[path] = conn
+    return conn
+
+
+def _row(record_id, description, patient_id, doctor_id, created_at):
+    tags = f'p{patient_id}' if doctor_id is None else f'd{doctor_id} p{patient_id}'
+    return (record_id, description, tags, int(created_at.timestamp()) if created_at else 0)
+
+
+# ---------------------------------------------------
+# WRITES
+# ---------------------------------------------------
+def index_rows(rows, conn=None):
+    """rows: iterable of (id, description, patient_id, doctor_id, created_at)."""
+    conn = conn or connection()
+    conn.execute('BEGIN')
+    try:
+        conn.executemany(
+            'INSERT OR REPLACE INTO record_fts(rowid, description, tags, created_at) VALUES (?, ?, ?, ?)',
+            (_row(*row) for row in rows),
+        )
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def remove_record(record_id):
+    connection().execute('DELETE FROM record_fts WHERE rowid = ?', (record_id,))
+
+
+def remove_records(record_ids):
+    conn = connection()
+    conn.execute('BEGIN')
+    try:
+        conn.executemany('DELETE FROM record_fts WHERE rowid = ?', ((pk,) for pk in record_ids))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def clear(conn=None):
+    (conn or connection()).execute("DELETE FROM record_fts")
+
+
+def optimize(conn=None):
+    # Merge the index b-trees after a bulk load
+    (conn or connection()).execute("INSERT INTO record_fts(record_fts) VALUES ('optimize')")
+
+
+def rebuild(batch_size=5000, progress=None, conn=None):
+    """Re-index every record from the database; returns the number indexed."""
+    conn = conn or connection()
+    clear(conn)
+    # Archived records stay searchable (see core.archive)
+    rows = chain.from_iterable(
+        model.objects
+        .order_by('id')
+        .values_list('id', 'description', 'patient_id', 'doctor_id', 'created_at')
+        .iterator(chunk_size=batch_size)
+        for model in (MedicalRecord, ArchivedMedicalRecord)
+    )
+    total = 0
+    for batch in iter(lambda: list(islice(rows, batch_size)), []):
+        index_rows(batch, conn)
+        total += len(batch)
+        if progress:
+            progress(total)
+    optimize(conn)
+    return total
+
+
+# ---------------------------------------------------
+# QUERIES
+# ---------------------------------------------------
+def to_match(text):
+    """Turn free text into a safe FTS5 query: every word must appear, `word*` is a prefix."""
+    terms = []
+    for token in TOKEN_RE.findall(text or ''):
+        word = token.rstrip('*').replace('"', '')
+        if word:
+            terms.append(f'"{word}"*' if token.endswith('*') else f'"{word}"')
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    html = escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def search(text, doctor_id=None, patient_id=None, start=None, end=None, limit=25, offset=0, conn=None):
+    match = to_match(text)
+    if not match:
+        return []
+
+    match = f'description : ({match})'
+    if doctor_id is not None:
+        match += f' AND tags : d{int(doctor_id)}'
+    if patient_id is not None:
+        match += f' AND tags : p{int(patient_id)}'
+
+    sql = [
+        'SELECT rowid, bm25(record_fts, 1.0, 0.0), '
+        f"snippet(record_fts, 0, '{MARK_START}', '{MARK_END}', '…', 16) "
+        'FROM record_fts WHERE record_fts MATCH ?'
+    ]
+    params = [match]
+    if start is not None:
+        sql.append('AND created_at >= ?')
+        params.append(int(start.timestamp()))
+    if end is not None:
+        sql.append('AND created_at < ?')
+        params.append(int(end.timestamp()))
+    sql.append('ORDER BY bm25(record_fts, 1.0, 0.0) LIMIT ? OFFSET ?')
+    params += [limit, offset]
+
+    rows = (conn or connection()).execute(' '.join(sql), params).fetchall()
+    return [Hit(record_id, -score, highlight(snippet)) for record_id, score, snippet in rows]
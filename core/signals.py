@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, directory, events, jobs, pdfs, rollups, search
+from .models import Appointment, Doctor, MedicalRecord, Patient, User
+
+
+# ---------------------------------------------------
+# APPOINTMENT ROLLUPS AND COUNTERS
+# ---------------------------------------------------
+# Both tables are keyed on (date, doctor, status): monthly rollups for the
+# staff charts, daily counters for the doctor dashboard. A save moves the
+# appointment from the bucket it was loaded in to the one it is saved in.
+STATE_FIELDS = ('date_time', 'doctor_id', 'status')
+
+
+def _loaded_state(instance):
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded and set(STATE_FIELDS) <= loaded.keys():
+        return tuple(loaded[name] for name in STATE_FIELDS)
+
+    # Deferred fields or an instance built by hand -> ask the database.
+    return Appointment.objects.filter(pk=instance.pk).values_list(*STATE_FIELDS).first()
+
+
+def _current_state(instance):
+    return tuple(getattr(instance, name) for name in STATE_FIELDS)
+
+
+def _remember(instance):
+    instance._loaded_values = dict(zip(STATE_FIELDS, _current_state(instance)))
+
+
+def _move(old_state, new_state):
+    for table in (rollups, counters):
+        table.move(old_state and table.bucket_for(*old_state), new_state and table.bucket_for(*new_state))
+
+
+@receiver(pre_save, sender=Appointment)
+def appointment_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._old_state = None
+    else:
+        instance._old_state = _loaded_state(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_state = getattr(instance, '_old_state', None)
+    _move(old_state, _current_state(instance))
+    _remember(instance)
+    # Status history (core.events), kept only if this save commits
+    events.record(instance.pk, instance.doctor_id, old_state and old_state[2], instance.status)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_post_delete(sender, instance, **kwargs):
+    _move(_current_state(instance), None)
+
+
+# ---------------------------------------------------
+# CACHED RECORD PDFs
+# ---------------------------------------------------
+# The cache key already contains a hash of every rendered value, so stale
+# files are never served; these receivers just drop them from disk early
+# (and queue a pre-render of new records so the first download is a cache hit).
+PDF_USER_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver(post_save, sender=MedicalRecord)
+def record_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    pk = instance.pk
+    if not created:
+        pdfs.invalidate(pk)
+    # Part of the same transaction: the job only exists if the record does
+    jobs.enqueue('render_record_pdf', {'record_id': pk}, priority=-10, dedup_key=f'render_record_pdf:{pk}')
+
+
+@receiver(post_delete, sender=MedicalRecord)
+def record_deleted(sender, instance, **kwargs):
+    pdfs.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_saved_pdfs(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or created or not _touches(update_fields, PDF_USER_FIELDS):
+        return
+    ids = MedicalRecord.objects.filter(
+        Q(patient__user=instance) | Q(doctor__user=instance)
+    ).values_list('pk', flat=True)
+    pdfs.invalidate(*ids)
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved_pdfs(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or created or not _touches(update_fields, {'phone'}):
+        return
+    pdfs.invalidate(*MedicalRecord.objects.filter(patient=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved_pdfs(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or created or not _touches(update_fields, {'specialization'}):
+        return
+    pdfs.invalidate(*MedicalRecord.objects.filter(doctor=instance).values_list('pk', flat=True))
+
+
+# ---------------------------------------------------
+# RECORD SEARCH INDEX
+# ---------------------------------------------------
+# The index lives outside the main database, so it is only touched once the
+# record change has actually committed.
+@receiver(post_save, sender=MedicalRecord)
+def record_saved_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    row = (instance.pk, instance.description, instance.patient_id, instance.doctor_id, instance.created_at)
+    transaction.on_commit(lambda: search.index_rows([row]))
+
+
+@receiver(post_delete, sender=MedicalRecord)
+def record_deleted_search(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: search.remove_record(pk))
+
+
+# ---------------------------------------------------
+# PUBLIC DOCTOR DIRECTORY CACHE
+# ---------------------------------------------------
+# Dropped after commit so a request running meanwhile can't re-cache the
+# old rows. Login only updates last_login and never reaches the query below.
+DIRECTORY_USER_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+def _invalidate_directory(*doctor_ids):
+    transaction.on_commit(lambda: directory.invalidate(*doctor_ids))
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def doctor_changed_directory(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_directory(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_saved_directory(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or created or not _touches(update_fields, DIRECTORY_USER_FIELDS):
+        return
+    ids = list(Doctor.objects.filter(user=instance).values_list('pk', flat=True))
+    if ids:
+        _invalidate_directory(*ids)
+
+
+# ---------------------------------------------------
+# SESSION-CACHED ROLE PROFILES
+# ---------------------------------------------------
+# A plain UPDATE, so it doesn't fire the User receivers above.
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=Doctor)
+def profile_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        User.objects.filter(pk=instance.user_id).update(profile_version=F('profile_version') + 1)
@@ -0,0 +1,19 @@
+from django.conf import settings
+
+from . import deletion, jobs, pdfs
+
+
+# ---------------------------------------------------
+# BACKGROUND TASKS (run by `manage.py run_workers`)
+# ---------------------------------------------------
+@jobs.task('render_record_pdf')
+def render_record_pdf(record_id):
+    pdfs.prerender(record_id)
+
+
+@jobs.task('delete_patient')
+def delete_patient(patient_id):
+    report = deletion.delete_patient(patient_id, batch_size=settings.DELETE_BATCH_SIZE, progress=jobs.report)
+    if report is None:
+        return {'deleted': False}
+    return {'deleted': True, **report}
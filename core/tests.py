@@ -1,4 +1,1657 @@
-from django.test import TestCase
+import re
+import tempfile
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
+from . import counters, rollups
+from .models import (
+    User, Doctor, Patient, Appointment, AppointmentCounter, AppointmentRollup, MedicalRecord,
+    ArchivedAppointment, ArchivedMedicalRecord, Job, AppointmentEvent, ReminderDelivery,
+)
+
+
+def make_doctor(username, **extra):
+    user = User.objects.create_user(username=username, password='pass', is_doctor=True,
+                                    first_name=username.title())
+    return Doctor.objects.create(user=user, **extra)
+
+
+def make_patient(username):
+    user = User.objects.create_user(username=username, password='pass', is_patient=True,
+                                    first_name=username.title())
+    return Patient.objects.create(user=user, phone='123', age=30)
+
+
+def local_dt(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+def use_temp_pdf_cache(test):
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    override = test.settings(PDF_CACHE_DIR=tmp.name)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+def use_locmem_caches(test):
+    override = test.settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-default'},
+        'directory': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-directory'},
+    })
+    override.enable()
+    test.addCleanup(override.disable)
+    # LocMem entries outlive the cache objects, so start every test empty
+    for alias in ('default', 'directory'):
+        caches[alias].clear()
+
+
+def use_temp_search_index(test):
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    override = test.settings(SEARCH_INDEX_PATH=f'{tmp.name}/search.sqlite3')
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+# ---------------------------------------------------
+# APPOINTMENT ROLLUPS
+# ---------------------------------------------------
+class AppointmentRollupTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+
+    def book(self, when, status='Pending'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date_time=when, status=status
+        )
+
+    def test_create_and_status_change_move_buckets(self):
+        appt = self.book(local_dt(2025, 12, 3, 10))
+        self.book(local_dt(2026, 1, 5, 9), status='Confirmed')
+
+        self.assertEqual(rollups.status_counts()['Pending'], 1)
+
+        appt.status = 'Confirmed'
+        appt.save()
+
+        counts = rollups.status_counts()
+        self.assertEqual(counts['Pending'], 0)
+        self.assertEqual(counts['Confirmed'], 2)
+        self.assertEqual(list(rollups.monthly_counts().items()), [('Dec 2025', 1), ('Jan 2026', 1)])
+
+    def test_reschedule_and_delete(self):
+        appt = self.book(local_dt(2025, 12, 31, 10))
+        appt = Appointment.objects.get(pk=appt.pk)
+        appt.date_time = local_dt(2026, 1, 1, 10)
+        appt.save()
+        self.assertEqual(list(rollups.monthly_counts().items()), [('Jan 2026', 1)])
+
+        appt.delete()
+        self.assertEqual(rollups.monthly_counts(), {})
+
+    def test_rebuild_matches_incremental(self):
+        for day in range(1, 6):
+            self.book(local_dt(2025, 11, day, 10), status='Completed')
+        incremental = sorted(AppointmentRollup.objects.filter(count__gt=0)
+                             .values_list('month', 'doctor_id', 'status', 'count'))
+
+        rollups.rebuild()
+        rebuilt = sorted(AppointmentRollup.objects.values_list('month', 'doctor_id', 'status', 'count'))
+        self.assertEqual(incremental, rebuilt)
+
+
+# ---------------------------------------------------
+# DAILY APPOINTMENT COUNTERS
+# ---------------------------------------------------
+class AppointmentCounterTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+        self.today = timezone.localdate()
+        self.appt = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor,
+            date_time=local_dt(self.today.year, self.today.month, self.today.day, 10),
+        )
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                   date_time=local_dt(2025, 12, 3, 9), status='Completed')
+
+    def summary(self):
+        return counters.summary(self.doctor.pk, self.today)
+
+    def test_transitions_move_counts(self):
+        self.assertEqual(self.summary(), {
+            'status_counts': {'Pending': 1, 'Confirmed': 0, 'Completed': 1, 'Rejected': 0},
+            'today_count': 1,
+        })
+
+        self.client.force_login(self.doctor.user)
+        self.client.get(reverse('core:approve_appointment', kwargs={'pk': self.appt.pk}))
+        self.assertEqual(self.summary()['status_counts']['Confirmed'], 1)
+        self.assertEqual(self.summary()['status_counts']['Pending'], 0)
+
+        response = self.client.get(reverse('core:dashboard'))
+        self.assertEqual(response.context['summary']['today_count'], 1)
+
+        self.appt.refresh_from_db()
+        self.appt.date_time += timedelta(days=1)
+        self.appt.save()
+        self.assertEqual(self.summary()['today_count'], 0)
+
+        self.appt.delete()
+        self.assertEqual(self.summary()['status_counts']['Confirmed'], 0)
+        self.assertEqual(counters.find_drift(self.doctor.pk), [])
+
+    def test_reconcile_detects_and_repairs_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        # Changes that bypass the signals
+        Appointment.objects.filter(pk=self.appt.pk).update(status='Rejected')
+        AppointmentCounter.objects.filter(status='Completed').delete()
+
+        with self.assertRaisesMessage(CommandError, '3 counter(s) drifted'):
+            call_command('reconcile_counters', stdout=StringIO())
+
+        call_command('reconcile_counters', repair=True, stdout=StringIO())
+        self.assertEqual(counters.find_drift(self.doctor.pk), [])
+        self.assertFalse(AppointmentCounter.objects.filter(count=0).exists())
+        self.assertEqual(self.summary()['status_counts'],
+                         {'Pending': 0, 'Confirmed': 0, 'Completed': 1, 'Rejected': 1})
+
+
+# ---------------------------------------------------
+# QUERY BUDGETS (see settings.QUERY_BUDGETS)
+# ---------------------------------------------------
+def seed_clinic(rows):
+    staff = User.objects.create_user(username='admin', password='pass', is_staff=True)
+    doctor = make_doctor('doc0', specialization='Cardiology')
+    other_doctor = make_doctor('doc1', specialization='Neurology')
+    patient = make_patient('pat0')
+
+    others = [make_patient(f'pat{i}') for i in range(1, rows + 1)]
+    for i, p in enumerate([patient] + others):
+        for d in (doctor, other_doctor):
+            Appointment.objects.create(patient=p, doctor=d, date_time=local_dt(2025, 12, 1 + i % 28, 9))
+            MedicalRecord.objects.create(patient=p, doctor=d, description=f'note {i}')
+    archived = ArchivedMedicalRecord.objects.create(id=10**6, patient=patient, doctor=doctor,
+                                                    description='old note', created_at=local_dt(2020, 1, 1))
+
+    return {
+        'staff': staff,
+        'doctor': doctor.user,
+        'patient': patient.user,
+        'objects': {
+            'patient': patient,
+            'appointment': Appointment.objects.filter(patient=patient, doctor=doctor).first(),
+            'record': MedicalRecord.objects.filter(patient=patient, doctor=doctor).first(),
+            'archived_record': archived,
+            'doctor': doctor,
+        },
+    }
+
+
+# (view name, role, kwargs built from the seeded objects)
+BUDGETED_VIEWS = [
+    ('core:home', None, lambda o: {}),
+    ('core:services', None, lambda o: {}),
+    ('core:contact', None, lambda o: {}),
+    ('core:login', None, lambda o: {}),
+    ('core:signup', None, lambda o: {}),
+    ('core:doctor_list', None, lambda o: {}),
+    ('core:doctor_profile', None, lambda o: {'pk': o['doctor'].pk}),
+    ('core:dashboard', 'patient', lambda o: {}),
+    ('core:dashboard', 'doctor', lambda o: {}),
+    ('core:dashboard', 'staff', lambda o: {}),
+    ('core:patient_list', 'doctor', lambda o: {}),
+    ('core:patient_list', 'staff', lambda o: {}),
+    ('core:patient_create', 'staff', lambda o: {}),
+    ('core:patient_profile', 'doctor', lambda o: {'pk': o['patient'].pk}),
+    ('core:patient_edit', 'doctor', lambda o: {'pk': o['patient'].pk}),
+    ('core:patient_timeline', 'patient', lambda o: {'pk': o['patient'].pk}),
+    ('core:patient_timeline', 'doctor', lambda o: {'pk': o['patient'].pk}),
+    ('core:appointment_list', 'patient', lambda o: {}),
+    ('core:appointment_list', 'doctor', lambda o: {}),
+    ('core:appointment_list', 'staff', lambda o: {}),
+    ('core:appointment_create', 'patient', lambda o: {}),
+    ('core:appointment_edit', 'patient', lambda o: {'id': o['appointment'].pk}),
+    ('core:appointment_detail', 'patient', lambda o: {'id': o['appointment'].pk}),
+    ('core:record_list', 'staff', lambda o: {}),
+    ('core:record_create', 'doctor', lambda o: {'patient_id': o['patient'].pk}),
+    ('core:record_pdf', 'patient', lambda o: {'pk': o['record'].pk}),
+    ('core:record_pdf', 'doctor', lambda o: {'pk': o['archived_record'].pk}),   # archive fallback
+    ('core:record_search', 'doctor', lambda o: {}),
+]
+
+
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        use_temp_pdf_cache(self)
+        use_temp_search_index(self)
+        use_locmem_caches(self)
+
+    def measure(self, rows):
+        from . import directory, middleware
+
+        users = seed_clinic(rows)
+        directory.cache().clear()   # invalidation runs on commit, which TestCase never does
+        results = {}
+        for view_name, role, kwargs in BUDGETED_VIEWS:
+            self.client.logout()
+            if role:
+                self.client.force_login(users[role])
+
+            middleware.reset()
+            response = self.client.get(reverse(view_name, kwargs=kwargs(users['objects'])))
+            self.assertLess(response.status_code, 400, f'{view_name} as {role}')
+            results[(view_name, role)] = middleware.snapshot()[view_name]['max_queries']
+        return results
+
+    def test_views_stay_within_budget_as_rows_grow(self):
+        small = self.measure(rows=2)
+        User.objects.all().delete()   # cascades to every seeded row
+        large = self.measure(rows=25)
+
+        for key, queries in large.items():
+            with self.subTest(view=key):
+                self.assertLessEqual(queries, settings.QUERY_BUDGETS[key[0]])
+                self.assertEqual(queries, small[key], 'query count grows with row count')
+
+
+# ---------------------------------------------------
+# CACHED DOCTOR DIRECTORY
+# ---------------------------------------------------
+class DoctorDirectoryTests(TestCase):
+
+    def setUp(self):
+        use_locmem_caches(self)
+        self.doctor = make_doctor('house', specialization='Diagnostics')
+        self.list_url = reverse('core:doctor_list')
+        self.profile_url = reverse('core:doctor_profile', kwargs={'pk': self.doctor.pk})
+
+    def test_cached_pages_skip_the_database_and_revalidate(self):
+        first = self.client.get(self.profile_url)
+        self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.profile_url)
+            self.client.get(self.list_url)
+            not_modified = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=first['ETag'])
+            since = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+
+        self.assertContains(second, 'Diagnostics')
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(since.status_code, 304)
+        self.assertEqual(self.client.get(reverse('core:doctor_profile', kwargs={'pk': 999})).status_code, 404)
+
+    def test_doctor_and_user_changes_invalidate(self):
+        etag = self.client.get(self.profile_url)['ETag']
+        self.client.get(self.list_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.user.last_name = 'House'
+            self.doctor.user.save()
+        response = self.client.get(self.list_url)
+        self.assertContains(response, 'Dr. House House')
+        self.assertNotEqual(self.client.get(self.profile_url)['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.specialization = 'Nephrology'
+            self.doctor.save()
+        self.assertContains(self.client.get(self.profile_url), 'Nephrology')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.user.delete()
+        self.assertEqual(self.client.get(self.profile_url).status_code, 404)
+        self.assertNotContains(self.client.get(self.list_url), 'Nephrology')
+
+
+# ---------------------------------------------------
+# READ-REPLICA ROUTING
+# ---------------------------------------------------
+class ReplicaRouterTests(SimpleTestCase):
+
+    def route(self, route, func, *args):
+        from .replicas import _route
+
+        token = _route.set(route)
+        try:
+            return func(*args)
+        finally:
+            _route.reset(token)
+
+    @override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+    def test_routing_decisions(self):
+        from django.contrib.sessions.models import Session
+        from .replicas import ReplicaRouter, Route
+
+        router = ReplicaRouter()
+        eligible = Route()
+        eligible.use_replica = True
+
+        self.assertEqual(router.db_for_read(Appointment), 'default')                     # outside a request
+        self.assertEqual(self.route(Route(), router.db_for_read, Appointment), 'default')  # view not listed
+        self.assertIn(self.route(eligible, router.db_for_read, Appointment), {'replica1', 'replica2'})
+        self.assertEqual(self.route(eligible, router.db_for_read, Session), 'default')
+
+        # Read-your-writes: once the request writes, its reads stay on the primary
+        self.assertEqual(self.route(eligible, router.db_for_write, Appointment), 'default')
+        self.assertEqual(self.route(eligible, router.db_for_read, Appointment), 'default')
+
+        fresh = Route()
+        fresh.use_replica = True
+        with override_settings(REPLICA_DATABASES=[]):
+            self.assertEqual(self.route(fresh, router.db_for_read, Appointment), 'default')
+
+
+class ReplicaMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('house')
+        self.appt = Appointment.objects.create(patient=make_patient('alice'), doctor=self.doctor,
+                                               date_time=local_dt(2025, 12, 3, 10))
+        self.client.force_login(self.doctor.user)
+
+    def uses_replica(self, name, method='get', **kwargs):
+        response = getattr(self.client, method)(reverse(name, kwargs=kwargs or None))
+        return response.wsgi_request.use_replica
+
+    @override_settings(REPLICA_DATABASES=['default'])
+    def test_read_views_use_replica_until_the_user_writes(self):
+        self.assertTrue(self.uses_replica('core:appointment_list'))
+        self.assertTrue(self.uses_replica('core:dashboard'))
+        self.assertFalse(self.uses_replica('core:appointment_detail', id=self.appt.pk))
+        self.assertFalse(self.uses_replica('core:appointment_list', method='post'))
+
+        self.assertFalse(self.uses_replica('core:approve_appointment', pk=self.appt.pk))
+        self.assertFalse(self.uses_replica('core:appointment_list'))     # pinned to primary
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.uses_replica('core:reject_appointment', pk=self.appt.pk)
+            self.assertTrue(self.uses_replica('core:appointment_list'))
+
+    def test_no_replicas_configured(self):
+        self.assertFalse(self.uses_replica('core:appointment_list'))
+
+
+# ---------------------------------------------------
+# REQUEST-SCOPED ROLE PROFILES
+# ---------------------------------------------------
+class RoleProfileTests(TestCase):
+
+    def setUp(self):
+        self.patient = make_patient('alice')
+        self.client.force_login(self.patient.user)
+
+    def profiles(self, url_name='core:appointment_list'):
+        response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return response.wsgi_request.profiles
+
+    def test_profile_comes_from_the_session_after_first_lookup(self):
+        from . import middleware
+
+        first = self.profiles()
+        self.assertEqual((first.lookups, first.queries), (1, 1))
+
+        middleware.reset()
+        second = self.profiles()
+        self.assertEqual((second.lookups, second.queries), (1, 0))
+        self.assertEqual(second.patient, self.patient)
+        self.assertEqual(second.patient.phone, self.patient.phone)
+        self.assertEqual(middleware.snapshot()['core:appointment_list']['saved_queries'], 1)
+
+    def test_profile_change_invalidates_session_copy(self):
+        self.profiles()
+        self.patient.phone = '555-0100'
+        self.patient.save()
+
+        profiles = self.profiles()
+        self.assertEqual(profiles.queries, 1)
+        self.assertEqual(profiles.patient.phone, '555-0100')
+        self.assertEqual(self.profiles().queries, 0)
+
+
+# ---------------------------------------------------
+# KEYSET PAGINATION
+# ---------------------------------------------------
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        doctors = [make_doctor(f'doc{i}') for i in range(3)]
+        patient = make_patient('alice')
+        # Several rows share a date_time so the id tie-breaker matters
+        for i in range(23):
+            Appointment.objects.create(patient=patient, doctor=doctors[i % 3],
+                                       date_time=local_dt(2025, 12, 1 + i // 3, 9))
+        self.expected = list(Appointment.objects.order_by('-date_time', '-id').values_list('id', flat=True))
+
+    def test_walk_forward_and_back(self):
+        from .pagination import KeysetPaginator
+
+        paginator = KeysetPaginator(Appointment.objects.all(), ('-date_time', '-id'), per_page=5)
+        pages, page = [], paginator.page()
+        while True:
+            pages.append([a.id for a in page])
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(p) for p in pages], [5, 5, 5, 5, 3])
+
+        back = paginator.page(page.previous_cursor)
+        self.assertEqual([a.id for a in back], pages[-2])
+        self.assertTrue(back.has_next)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        from .pagination import KeysetPaginator
+
+        page = KeysetPaginator(Appointment.objects.all(), ('-date_time', '-id'), per_page=5).page('garbage')
+        self.assertEqual([a.id for a in page], self.expected[:5])
+        self.assertFalse(page.has_previous)
+
+
+# ---------------------------------------------------
+# HALF-OPEN DAY RANGES
+# ---------------------------------------------------
+class DayRangeTests(TestCase):
+
+    def test_local_day_is_half_open(self):
+        from datetime import date
+        from .timeranges import day_range, in_range
+
+        doctor, patient = make_doctor('house'), make_patient('alice')
+        for when in (local_dt(2025, 12, 1, 0, 0), local_dt(2025, 12, 1, 23, 59), local_dt(2025, 12, 2, 0, 0)):
+            Appointment.objects.create(patient=patient, doctor=doctor, date_time=when)
+
+        qs = Appointment.objects.filter(**in_range('date_time', day_range(date(2025, 12, 1))))
+        self.assertEqual(qs.count(), 2)
+
+
+# ---------------------------------------------------
+# DOCTOR SCHEDULES / FREE SLOTS
+# ---------------------------------------------------
+class AvailabilityTests(TestCase):
+
+    def setUp(self):
+        from datetime import time
+        from .models import DoctorSchedule, ScheduleBreak
+
+        self.doctor = make_doctor('house', specialization='Cardiology')
+        self.patient = make_patient('alice')
+        # Mondays 09:00-12:00, 30 min slots, coffee break 10:30-11:00
+        rule = DoctorSchedule.objects.create(doctor=self.doctor, weekday=0, slot_minutes=30,
+                                             start_time=time(9), end_time=time(12))
+        ScheduleBreak.objects.create(schedule=rule, start_time=time(10, 30), end_time=time(11))
+        self.monday = local_dt(2030, 1, 7).date()
+
+    def starts(self, slots):
+        return [timezone.localtime(s['start']).strftime('%H:%M') for s in slots]
+
+    def test_schedule_minus_break_and_appointments(self):
+        from . import availability
+
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date_time=local_dt(2030, 1, 7, 9, 30))
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, status='Rejected',
+                                   date_time=local_dt(2030, 1, 7, 10))
+
+        slots = availability.free_slots(self.doctor, self.monday, self.monday + timedelta(days=1))
+        self.assertEqual(self.starts(slots), ['09:00', '10:00', '11:00', '11:30'])
+
+    def test_exception_blocks_day(self):
+        from . import availability
+        from .models import ScheduleException
+
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday)
+        self.assertEqual(availability.free_slots(self.doctor, self.monday, self.monday), [])
+
+    def test_next_slots_across_doctors_is_batched(self):
+        from datetime import time
+        from . import availability
+        from .models import DoctorSchedule
+
+        other = make_doctor('wilson', specialization='Cardiology')
+        DoctorSchedule.objects.create(doctor=other, weekday=0, slot_minutes=60,
+                                      start_time=time(8), end_time=time(10))
+
+        with self.assertNumQueries(5):
+            slots = availability.next_free_slots(Doctor.objects.filter(specialization='Cardiology'),
+                                                 limit=3, first_day=self.monday)
+        self.assertEqual([(s['doctor_id'], timezone.localtime(s['start']).strftime('%H:%M')) for s in slots],
+                         [(other.pk, '08:00'), (self.doctor.pk, '09:00'), (other.pk, '09:00')])
+
+    def test_available_slots_clamps_limit_and_days(self):
+        url = reverse('core:available_slots')
+        for params, most in [({'limit': -1, 'days': 14}, 1), ({'limit': 0, 'days': 14}, 1),
+                             ({'limit': 5, 'days': -3}, 5), ({'limit': 5, 'days': 0}, 5)]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, params)
+            self.assertLessEqual(len(response.json()['slots']), most, params)
+        self.assertEqual(len(self.client.get(url, {'limit': -1, 'days': 14}).json()['slots']), 1)
+        self.assertEqual(self.client.get(url, {'limit': 'x'}).status_code, 400)
+
+    def test_form_rejects_unavailable_time(self):
+        from .forms import AppointmentForm
+
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date_time=local_dt(2030, 1, 7, 9))
+        taken = AppointmentForm(data={'doctor': self.doctor.pk, 'date_time': '2030-01-07 09:00'})
+        on_break = AppointmentForm(data={'doctor': self.doctor.pk, 'date_time': '2030-01-07 10:30'})
+        free = AppointmentForm(data={'doctor': self.doctor.pk, 'date_time': '2030-01-07 11:00'})
+        self.assertFalse(taken.is_valid())
+        self.assertFalse(on_break.is_valid())
+        self.assertTrue(free.is_valid())
+
+
+# ---------------------------------------------------
+# ASYNC DASHBOARDS
+# ---------------------------------------------------
+class AsyncDashboardTests(TransactionTestCase):
+
+    def setUp(self):
+        use_temp_pdf_cache(self)
+        use_temp_search_index(self)
+        use_locmem_caches(self)
+
+    def test_async_dashboards_match_sync(self):
+        from asgiref.sync import async_to_sync
+        from .management.commands.bench_dashboards import make_request
+        from . import views
+
+        staff = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        doctor = make_doctor('house')
+        for i, patient in enumerate([make_patient('alice'), make_patient('bob')]):
+            Appointment.objects.create(patient=patient, doctor=doctor, date_time=timezone.now() + timedelta(hours=i))
+            MedicalRecord.objects.create(patient=patient, doctor=doctor, description=f'note {i}')
+
+        def page(response):
+            # CSRF tokens are masked differently on every render
+            return re.sub(rb'name="csrfmiddlewaretoken" value="[^"]*"', b'', response.content)
+
+        for user in (staff, doctor.user, patient.user):
+            with self.subTest(user=user.username):
+                sync = views.dashboard(make_request(user))
+                concurrent = async_to_sync(views.dashboard_async)(make_request(user))
+                self.assertEqual(concurrent.status_code, 200)
+                self.assertEqual(page(concurrent), page(sync))
+
+    def test_worker_thread_queries_are_counted(self):
+        from asgiref.sync import async_to_sync
+        from django.urls import resolve
+        from .management.commands.bench_dashboards import make_request
+        from . import middleware, views
+
+        staff = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        counts = {}
+        for name, view in [('sync', views.dashboard), ('async', async_to_sync(views.dashboard_async))]:
+            request = make_request(staff)
+            request.resolver_match = resolve(reverse('core:dashboard'))
+            middleware.reset()
+            middleware.QueryInstrumentationMiddleware(view)(request)
+            counts[name] = middleware.snapshot()['core:dashboard']['max_queries']
+        self.assertGreater(counts['sync'], 0)
+        self.assertEqual(counts['async'], counts['sync'])
+
+
+# ---------------------------------------------------
+# CONCURRENT BOOKING
+# ---------------------------------------------------
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 16
+    BOOKINGS = 240
+    SLOTS = 12
+
+    def setUp(self):
+        use_locmem_caches(self)
+
+    def test_no_double_booking_under_contention(self):
+        import threading
+        import time
+        from django.db import connection
+        from . import booking
+
+        doctor = make_doctor('house')
+        patients = [make_patient(f'p{i}') for i in range(self.THREADS)]
+        slots = [local_dt(2030, 1, 7, 9) + timedelta(minutes=30 * i) for i in range(self.SLOTS)]
+
+        results = {'booked': 0, 'rejected': 0, 'errors': []}
+        lock = threading.Lock()
+        start_gate = threading.Barrier(self.THREADS)
+
+        def worker(n):
+            start_gate.wait()
+            try:
+                for i in range(n, self.BOOKINGS, self.THREADS):
+                    appt = Appointment(patient=patients[n], doctor=doctor, date_time=slots[i % self.SLOTS])
+                    try:
+                        booking.book(appt, attempts=50)
+                        outcome = 'booked'
+                    except booking.SlotUnavailable:
+                        outcome = 'rejected'
+                    with lock:
+                        results[outcome] += 1
+            except Exception as exc:   # surfaced by the assertions below
+                with lock:
+                    results['errors'].append(repr(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results['errors'], [])
+        self.assertEqual(results['booked'], self.SLOTS)
+        self.assertEqual(results['rejected'], self.BOOKINGS - self.SLOTS)
+        per_slot = Appointment.objects.values('date_time').annotate(n=Count('id'))
+        self.assertTrue(all(row['n'] == 1 for row in per_slot))
+        self.assertEqual(rollups.status_counts()['Pending'], self.SLOTS)
+        print(f"\n{self.BOOKINGS} concurrent bookings on {self.THREADS} threads: "
+              f"{self.BOOKINGS / elapsed:,.0f} bookings/s, 0 double bookings")
+
+    def test_rejected_appointment_frees_slot(self):
+        from . import booking
+
+        doctor, patient = make_doctor('house'), make_patient('alice')
+        when = local_dt(2030, 1, 7, 9)
+        first = booking.book(Appointment(patient=patient, doctor=doctor, date_time=when))
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.book(Appointment(patient=patient, doctor=doctor, date_time=when))
+
+        first.status = 'Rejected'
+        first.save()
+        booking.book(Appointment(patient=patient, doctor=doctor, date_time=when))
+
+    def test_confirming_rejected_appointment_whose_slot_was_rebooked(self):
+        from django.contrib.messages import get_messages
+        from . import booking
+
+        doctor, alice, bob = make_doctor('house'), make_patient('alice'), make_patient('bob')
+        when = local_dt(2030, 1, 7, 9)
+        first = booking.book(Appointment(patient=alice, doctor=doctor, date_time=when))
+        first.status = 'Rejected'
+        first.save()
+        booking.book(Appointment(patient=bob, doctor=doctor, date_time=when))
+
+        self.client.force_login(doctor.user)
+        response = self.client.get(reverse('core:approve_appointment', args=[first.pk]))
+        self.assertRedirects(response, reverse('core:appointment_list'), fetch_redirect_response=False)
+        self.assertIn('already been taken', str(list(get_messages(response.wsgi_request))[0]))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.active_slot), ('Rejected', None))
+
+
+# ---------------------------------------------------
+# CACHED RECORD PDFs
+# ---------------------------------------------------
+class RecordPdfCacheTests(TestCase):
+
+    def setUp(self):
+        use_temp_pdf_cache(self)
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+        self.record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor,
+                                                   description='Start metformin 500mg')
+        self.client.force_login(self.patient.user)
+        self.url = reverse('core:record_pdf', kwargs={'pk': self.record.pk})
+
+    def test_repeat_downloads_render_once_and_revalidate(self):
+        from unittest import mock
+        from . import pdfs
+
+        with mock.patch.object(pdfs, 'render', wraps=pdfs.render) as render:
+            first = self.client.get(self.url)
+            second = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(first.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_name_change_produces_new_version(self):
+        etag = self.client.get(self.url)['ETag']
+
+        user = self.doctor.user
+        user.last_name = 'House'
+        user.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_concurrent_invalidate_and_failed_render(self):
+        from unittest import mock
+        from . import pdfs
+
+        original = pdfs.cached_pdf
+
+        def invalidated_after_render(record):
+            # Another request drops the folder between render and open()
+            path, etag = original(record)
+            if invalidated.call_count == 1:
+                pdfs.invalidate(record.pk)
+            return path, etag
+
+        with mock.patch.object(pdfs, 'cached_pdf', side_effect=invalidated_after_render) as invalidated:
+            response = self.client.get(self.url)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(invalidated.call_count, 2)
+
+        pdfs.invalidate(self.record.pk)
+        with mock.patch.object(pdfs, 'render', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                pdfs.cached_pdf(self.record)
+        self.assertEqual(list(pdfs.record_dir(self.record.pk).iterdir()), [])
+
+
+# ---------------------------------------------------
+# RECORD SEARCH
+# ---------------------------------------------------
+class RecordSearchTests(TestCase):
+
+    def setUp(self):
+        use_temp_pdf_cache(self)
+        use_temp_search_index(self)
+        self.doctor = make_doctor('house')
+        self.other = make_doctor('wilson')
+        self.patient = make_patient('alice')
+
+    def add(self, description, doctor=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MedicalRecord.objects.create(patient=self.patient, doctor=doctor or self.doctor,
+                                                description=description)
+
+    def test_index_follows_creates_and_deletes(self):
+        from . import search
+
+        strong = self.add('Metformin 500mg. Continue metformin, review metformin dose.')
+        weak = self.add('Blood pressure normal. Also on metformin since last year and other drugs.')
+        other = self.add('Started metformin', doctor=self.other)
+        self.add('Sprained ankle <b>rest</b>')
+
+        hits = search.search('METFORMIN')
+        self.assertEqual([h.record_id for h in hits][:1], [strong.pk])
+        self.assertEqual({h.record_id for h in hits}, {strong.pk, weak.pk, other.pk})
+        self.assertIn('<mark>Metformin</mark>', hits[0].snippet)
+
+        self.assertEqual([h.record_id for h in search.search('metf*', doctor_id=self.other.pk)], [other.pk])
+        self.assertEqual(search.search('metformin', start=timezone.now() + timedelta(days=1)), [])
+        self.assertIn('&lt;b&gt;', search.search('ankle')[0].snippet)
+        self.assertEqual(search.search('"); DROP TABLE record_fts; --'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            weak.delete()
+        self.assertEqual({h.record_id for h in search.search('metformin')}, {strong.pk, other.pk})
+
+    def test_doctors_only_find_their_own_notes(self):
+        mine = self.add('Metformin started')
+        self.add('Metformin stopped', doctor=self.other)
+
+        self.client.force_login(self.doctor.user)
+        response = self.client.get(reverse('core:record_search'), {'q': 'metformin'})
+
+        self.assertEqual([rec.pk for rec, hit in response.context['results']], [mine.pk])
+        self.assertContains(response, '<mark>Metformin</mark> started', html=False)
+
+
+# ---------------------------------------------------
+# PATIENT HISTORY EXPORT
+# ---------------------------------------------------
+class PatientExportTests(TestCase):
+
+    def test_zip_contains_every_record_and_appointments_csv(self):
+        import io
+        import zipfile
+        from unittest import mock
+        from . import exports
+
+        use_temp_pdf_cache(self)
+        doctor, patient = make_doctor('house'), make_patient('alice')
+        created = timezone.now()
+        for i in range(5):
+            record = MedicalRecord.objects.create(patient=patient, doctor=doctor, description=f'note {i}')
+            Appointment.objects.create(patient=patient, doctor=doctor, date_time=local_dt(2025, 12, 1 + i, 9))
+        # Ties on created_at across a chunk boundary
+        MedicalRecord.objects.filter(patient=patient).update(created_at=created)
+
+        self.client.force_login(doctor.user)
+        with mock.patch.object(exports, 'CHUNK_SIZE', 2):
+            response = self.client.get(reverse('core:patient_export', kwargs={'pk': patient.pk}))
+            self.assertTrue(response.streaming)
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+        names = archive.namelist()
+        self.assertEqual(len({n for n in names if n.endswith('.pdf')}), 5)
+        self.assertIn(f'records/{timezone.localtime(created):%Y-%m-%d}_{record.pk}.pdf', names)
+        csv_lines = archive.read('appointments.csv').decode().splitlines()
+        self.assertEqual(csv_lines[0], 'id,date_time,status,doctor,specialization')
+        self.assertEqual(len(csv_lines), 6)
+
+    def test_doctor_export_only_has_their_own_records(self):
+        import io
+        import zipfile
+
+        use_temp_pdf_cache(self)
+        house, wilson, patient = make_doctor('house'), make_doctor('wilson'), make_patient('alice')
+        mine = MedicalRecord.objects.create(patient=patient, doctor=house, description='mine')
+        MedicalRecord.objects.create(patient=patient, doctor=wilson, description='theirs')
+        admin = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        url = reverse('core:patient_export', kwargs={'pk': patient.pk})
+
+        def pdf_names(user):
+            self.client.force_login(user)
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(self.client.get(url).streaming_content)))
+            return [name for name in archive.namelist() if name.endswith('.pdf')]
+
+        self.assertEqual([name.rsplit('_', 1)[1] for name in pdf_names(house.user)], [f'{mine.pk}.pdf'])
+        self.assertEqual(len(pdf_names(admin)), 2)
+
+
+# ---------------------------------------------------
+# TABLE EXPORTS
+# ---------------------------------------------------
+class TableExportTests(TestCase):
+
+    def setUp(self):
+        self.house, self.wilson = make_doctor('house'), make_doctor('wilson')
+        self.patient = make_patient('alice')
+        # Two doctors share every slot, so chunk boundaries fall inside ties
+        for day in range(1, 6):
+            for doctor in (self.house, self.wilson):
+                Appointment.objects.create(patient=self.patient, doctor=doctor, date_time=local_dt(2025, 12, day, 9),
+                                           status='Confirmed' if day % 2 else 'Pending')
+
+    def test_chunked_csv_covers_every_row_once(self):
+        import csv
+        from . import exports
+
+        body = b''.join(exports.table_export('appointments', chunk_size=3)).decode()
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(sorted(int(r['id']) for r in rows),
+                         sorted(Appointment.objects.values_list('id', flat=True)))
+
+        filters = exports.parse_filters('appointments', {
+            'from': '2025-12-02', 'to': '2025-12-04', 'doctor': str(self.house.pk), 'status': 'Confirmed',
+        })
+        body = b''.join(exports.table_export('appointments', filters, chunk_size=1)).decode()
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual([r['date_time'][:10] for r in rows], ['2025-12-03'])
+        self.assertEqual(rows[0]['doctor'], 'House')
+
+    def test_gzipped_jsonl_endpoint_is_staff_only(self):
+        import gzip
+        import json
+
+        url = reverse('core:table_export', kwargs={'kind': 'records'})
+        MedicalRecord.objects.create(patient=self.patient, doctor=self.house, description='Ünïcode note')
+
+        self.client.force_login(self.house.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user(username='admin', password='pass', is_staff=True))
+        response = self.client.get(url, {'format': 'jsonl', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)['description'] for line in lines], ['Ünïcode note'])
+
+        self.assertEqual(self.client.get(url, {'status': 'Pending'}).status_code, 400)
+
+
+# ---------------------------------------------------
+# SYNTHETIC DATA
+# ---------------------------------------------------
+class SeedScaleTests(TestCase):
+
+    def seed(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('seed_scale', appointments=600, doctors=4, patients=40, years=0.25,
+                     future_days=10, seed=7, batch_size=100, stdout=StringIO())
+        return list(Appointment.objects.order_by('id').values_list('id', 'patient_id', 'doctor_id',
+                                                                    'date_time', 'status'))
+
+    def test_dataset_is_valid_and_deterministic(self):
+        first = self.seed()
+
+        self.assertEqual(len(first), 600)
+        self.assertEqual(len({row[4] for row in first}), 4)
+        live = [(doctor, when) for _, _, doctor, when, status in first if status != 'Rejected']
+        self.assertEqual(len(live), len(set(live)))
+        self.assertFalse(Appointment.objects.filter(status='Rejected', active_slot=True).exists())
+        self.assertEqual(sum(rollups.status_counts().values()), 600)
+        self.assertTrue(MedicalRecord.objects.exists())
+
+        User.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+
+
+# ---------------------------------------------------
+# HOT / COLD ARCHIVAL
+# ---------------------------------------------------
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        use_temp_pdf_cache(self)
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+        old = timezone.now() - timedelta(days=800)
+
+        def book(when, status):
+            return Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                              date_time=when, status=status)
+
+        self.old_done = [book(old + timedelta(days=i), 'Completed') for i in range(3)]
+        self.old_pending = book(old - timedelta(hours=1), 'Pending')
+        self.recent = book(timezone.now() - timedelta(days=3), 'Completed')
+
+        self.old_record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor,
+                                                       description='old note')
+        MedicalRecord.objects.filter(pk=self.old_record.pk).update(created_at=old)
+        self.new_record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor,
+                                                       description='new note')
+
+    def archive(self, **options):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('archive_old_data', days=365, batch_size=2, stdout=StringIO(), **options)
+
+    def test_moves_old_rows_in_resumable_batches(self):
+        counts = rollups.status_counts()
+
+        self.archive(only=['appointments'], limit=2)
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+        self.archive()
+
+        self.assertEqual(sorted(ArchivedAppointment.objects.values_list('id', flat=True)),
+                         [a.pk for a in self.old_done])
+        self.assertEqual(sorted(Appointment.objects.values_list('id', flat=True)),
+                         [self.old_pending.pk, self.recent.pk])
+        self.assertEqual(list(ArchivedMedicalRecord.objects.values_list('id', flat=True)), [self.old_record.pk])
+        self.assertEqual(list(MedicalRecord.objects.values_list('id', flat=True)), [self.new_record.pk])
+
+        # Archived appointments keep counting
+        self.assertEqual(rollups.status_counts(), counts)
+        self.assertEqual(counters.find_drift(self.doctor.pk), [])
+
+    def test_profile_and_record_views_fall_back_to_archive(self):
+        self.archive()
+        self.client.force_login(self.doctor.user)
+
+        response = self.client.get(reverse('core:patient_profile', kwargs={'pk': self.patient.pk}))
+        self.assertEqual(len(response.context['appointments']), 5)
+        self.assertEqual([r['archived'] for r in response.context['records']], [False, True])
+        self.assertContains(response, 'old note')
+
+        response = self.client.get(reverse('core:record_pdf', kwargs={'pk': self.old_record.pk}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuilt_search_index_keeps_archived_records(self):
+        from . import search
+
+        use_temp_search_index(self)
+        self.archive()
+        self.assertEqual(search.rebuild(), 2)
+        self.assertEqual([hit.record_id for hit in search.search('old note')], [self.old_record.pk])
+
+
+# ---------------------------------------------------
+# BULK APPROVE / REJECT
+# ---------------------------------------------------
+class BulkStatusTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('house')
+        self.other_doctor = make_doctor('wilson')
+        self.patient = make_patient('alice')
+        tomorrow = self.tomorrow = timezone.localdate() + timedelta(days=1)
+
+        def at(day, hour):
+            return local_dt(day.year, day.month, day.day, hour)
+
+        def book(doctor, when, status='Pending'):
+            return Appointment.objects.create(patient=self.patient, doctor=doctor, date_time=when, status=status)
+
+        self.pending = [book(self.doctor, at(tomorrow, hour)) for hour in (9, 10, 11)]
+        self.later = book(self.doctor, at(tomorrow + timedelta(days=1), 9))
+        self.confirmed = book(self.doctor, at(tomorrow, 12), 'Confirmed')
+        self.foreign = book(self.other_doctor, at(tomorrow, 9))
+        self.url = reverse('core:appointment_bulk_status')
+        self.client.force_login(self.doctor.user)
+
+    def assert_buckets_consistent(self):
+        self.assertEqual(counters.find_drift(self.doctor.pk), [])
+        expected = dict.fromkeys(rollups.STATUSES, 0)
+        for status in Appointment.objects.values_list('status', flat=True):
+            expected[status] += 1
+        self.assertEqual(rollups.status_counts(), expected)
+
+    def test_approve_ids_reports_each_id(self):
+        ids = [self.pending[0].pk, self.pending[1].pk, self.confirmed.pk, self.foreign.pk, 999999]
+        response = self.client.post(self.url, {'action': 'approve', 'ids': ids})
+
+        self.assertEqual(response.json(), {
+            'status': 'Confirmed',
+            'updated': 2,
+            'results': {
+                str(self.pending[0].pk): 'updated', str(self.pending[1].pk): 'updated',
+                str(self.confirmed.pk): 'not_pending', str(self.foreign.pk): 'not_found', '999999': 'not_found',
+            },
+        })
+        self.assertEqual(Appointment.objects.get(pk=self.foreign.pk).status, 'Pending')
+        self.assertEqual(Appointment.objects.get(pk=self.pending[2].pk).status, 'Pending')
+        self.assert_buckets_consistent()
+
+    def test_query_count_does_not_grow_with_the_selection(self):
+        from . import transitions
+
+        for n in (1, 3):
+            Appointment.objects.filter(pk__in=[a.pk for a in self.pending]).update(status='Pending')
+            with self.assertNumQueries(8):
+                transitions.apply(self.doctor.pk, 'approve', ids=[a.pk for a in self.pending[:n]])
+
+    def test_reject_a_day_from_the_dashboard_frees_the_slots(self):
+        response = self.client.post(self.url, {'action': 'reject', 'date': self.tomorrow.isoformat(),
+                                               'next': reverse('core:dashboard')})
+        self.assertRedirects(response, reverse('core:dashboard'), fetch_redirect_response=False)
+
+        rejected = Appointment.objects.filter(status='Rejected')
+        self.assertEqual(sorted(rejected.values_list('id', flat=True)), [a.pk for a in self.pending])
+        self.assertEqual(set(rejected.values_list('active_slot', flat=True)), {None})
+        self.assertEqual(Appointment.objects.get(pk=self.later.pk).status, 'Pending')
+        self.assert_buckets_consistent()
+
+        # The freed slot can be booked again
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date_time=self.pending[0].date_time)
+
+    def test_only_doctors_and_only_post(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(self.client.post(self.url, {'action': 'delete', 'ids': [1]}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'action': 'approve'}).status_code, 400)
+
+        self.client.force_login(self.patient.user)
+        self.assertEqual(self.client.post(self.url, {'action': 'approve', 'ids': [self.pending[0].pk]}).status_code, 403)
+        self.assertEqual(Appointment.objects.get(pk=self.pending[0].pk).status, 'Pending')
+
+
+# ---------------------------------------------------
+# APPOINTMENT STATUS HISTORY
+# ---------------------------------------------------
+class StatusEventTests(TransactionTestCase):
+
+    def setUp(self):
+        use_locmem_caches(self)
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                       date_time=local_dt(2030, 1, 7, 9 + i))
+            for i in range(3)
+        ]
+
+    def test_request_writes_its_events_in_one_insert(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import events
+
+        booked = AppointmentEvent.objects.filter(status=AppointmentEvent.PENDING)
+        self.assertEqual(booked.count(), 3)
+        booked.update(at=timezone.now() - timedelta(hours=2))
+
+        self.client.force_login(self.doctor.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('core:appointment_bulk_status'),
+                             {'action': 'approve', 'ids': [a.pk for a in self.appointments]})
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "core_appointmentevent"')]
+        self.assertEqual(len(inserts), 1)
+
+        confirmed = AppointmentEvent.objects.filter(from_status=AppointmentEvent.PENDING,
+                                                    status=AppointmentEvent.CONFIRMED)
+        self.assertEqual(confirmed.count(), 3)
+        median = events.median_time_to_confirm([self.doctor.pk])[self.doctor.pk]
+        self.assertAlmostEqual(median, 7200, delta=5)
+
+    def test_single_changes_and_rollbacks(self):
+        from django.db import transaction
+
+        appointment = self.appointments[0]
+        self.client.force_login(self.doctor.user)
+        self.client.get(reverse('core:reject_appointment', kwargs={'pk': appointment.pk}))
+
+        try:
+            with transaction.atomic():
+                appointment.refresh_from_db()
+                appointment.status = 'Confirmed'
+                appointment.save()
+                raise RuntimeError('rolled back')
+        except RuntimeError:
+            pass
+
+        history = AppointmentEvent.objects.filter(appointment_id=appointment.pk).order_by('at', 'id')
+        self.assertEqual([(e.get_from_status_display(), e.get_status_display()) for e in history],
+                         [('-', 'Pending'), ('Pending', 'Rejected')])
+
+    def test_median_of_even_count(self):
+        from . import events
+
+        now = timezone.now()
+        AppointmentEvent.objects.bulk_create([
+            AppointmentEvent(appointment_id=100 + i, doctor_id=self.doctor.pk, at=now, elapsed=elapsed,
+                             from_status=AppointmentEvent.PENDING, status=AppointmentEvent.CONFIRMED)
+            for i, elapsed in enumerate([40, 10, 30, 20])
+        ])
+        self.assertEqual(events.median_elapsed(self.doctor.pk, 'Pending', 'Confirmed'), 25)
+        self.assertIsNone(events.median_elapsed(self.doctor.pk, 'Confirmed', 'Completed'))
+
+
+# ---------------------------------------------------
+# BATCHED PATIENT DELETION
+# ---------------------------------------------------
+class PatientDeletionTests(TestCase):
+
+    def setUp(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        use_temp_pdf_cache(self)
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+        self.other = make_patient('bob')
+        old = timezone.now() - timedelta(days=800)
+        for i in range(5):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                       date_time=old + timedelta(days=i), status='Completed')
+            MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, description=f'note {i}')
+        Appointment.objects.create(patient=self.other, doctor=self.doctor,
+                                   date_time=old - timedelta(hours=1), status='Pending')
+        call_command('archive_old_data', days=365, only=['appointments'], limit=2, stdout=StringIO())
+
+    def test_deletes_history_in_batches_and_keeps_counts(self):
+        from . import deletion
+
+        done = []
+        report = deletion.delete_patient(self.patient.pk, batch_size=2,
+                                         progress=lambda report: done.append(report['done']))
+
+        self.assertEqual(report['rows'], {'appointments': 3, 'archived_appointments': 2,
+                                          'records': 5, 'archived_records': 0})
+        self.assertEqual(report['total'], 10)
+        self.assertEqual(done, [2, 3, 5, 7, 9, 10])
+        self.assertFalse(Patient.objects.filter(pk=self.patient.pk).exists())
+        self.assertFalse(User.objects.filter(username='alice').exists())
+        self.assertEqual(Appointment.objects.get().patient, self.other)
+
+        self.assertEqual(counters.find_drift(self.doctor.pk), [])
+        self.assertEqual(rollups.status_counts(), {'Pending': 1, 'Confirmed': 0, 'Completed': 0, 'Rejected': 0})
+
+    def test_view_flags_patient_and_worker_reports_progress(self):
+        from . import jobs
+
+        self.client.force_login(self.doctor.user)
+        self.client.get(reverse('core:patient_delete', kwargs={'pk': self.patient.pk}))
+
+        self.patient.refresh_from_db()
+        self.assertTrue(self.patient.pending_deletion)
+        self.assertFalse(User.objects.get(username='alice').is_active)
+        self.assertContains(self.client.get(reverse('core:patient_list')), 'Being deleted', count=1)
+
+        job = jobs.claim('w1')
+        self.assertTrue(jobs.run(job))
+        job.refresh_from_db()
+        self.assertEqual((job.result['deleted'], job.result['done']), (True, 10))
+        self.assertFalse(Patient.objects.filter(pk=self.patient.pk).exists())
+
+
+# ---------------------------------------------------
+# PATIENT TIMELINE
+# ---------------------------------------------------
+class PatientTimelineTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+
+    def add_history(self, days, first=0):
+        for day in range(first, first + days):
+            when = local_dt(2025, 1, 1, 9) + timedelta(days=day)
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date_time=when,
+                                       status='Completed')
+            record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor,
+                                                  description=f'note {day}')
+            # Same instant as the appointment: the tie is broken by kind
+            MedicalRecord.objects.filter(pk=record.pk).update(created_at=when)
+
+    def fetch(self, **params):
+        response = self.client.get(reverse('core:patient_timeline', kwargs={'pk': self.patient.pk}), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_merge_both_kinds_newest_first(self):
+        self.add_history(6)
+        ArchivedAppointment.objects.create(id=999, patient=self.patient, doctor=self.doctor,
+                                           date_time=local_dt(2024, 6, 1, 9), status='Completed')
+        self.client.force_login(self.patient.user)
+
+        entries, cursor = [], None
+        while True:
+            page = self.fetch(limit=5, **({'cursor': cursor} if cursor else {}))
+            entries += page['entries']
+            cursor = page['next']
+            if not cursor:
+                break
+
+        self.assertEqual(len(entries), 13)
+        self.assertEqual(len({(e['type'], e['id']) for e in entries}), 13)
+        self.assertEqual([e['type'] for e in entries[:2]], ['appointment', 'record'])
+        self.assertEqual(entries[0]['doctor'], 'House')
+        self.assertEqual(entries[-1], {**entries[-1], 'id': 999, 'archived': True})
+        times = [e['at'] for e in entries]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.client.force_login(self.doctor.user)
+        self.add_history(2)
+        with self.assertNumQueries(7) as small:
+            self.fetch()
+        self.add_history(40, first=2)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.assertEqual(len(self.fetch()['entries']), 20)
+
+    def test_other_patients_are_forbidden(self):
+        self.client.force_login(make_patient('bob').user)
+        url = reverse('core:patient_timeline', kwargs={'pk': self.patient.pk})
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+# ---------------------------------------------------
+# BACKGROUND JOB QUEUE
+# ---------------------------------------------------
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        from . import jobs
+
+        self.calls = []
+
+        def flaky(n):
+            self.calls.append(n)
+            if len(self.calls) < 2:
+                raise RuntimeError('try again')
+            return {'n': n}
+
+        jobs.TASKS['test_flaky'] = flaky
+        self.addCleanup(jobs.TASKS.pop, 'test_flaky')
+
+    def test_priority_dedup_and_retry_with_backoff(self):
+        from . import jobs
+
+        low = jobs.enqueue('test_flaky', {'n': 1})
+        high = jobs.enqueue('test_flaky', {'n': 2}, priority=5, dedup_key='k', max_attempts=2)
+        self.assertEqual(jobs.enqueue('test_flaky', {'n': 3}, dedup_key='k').pk, high.pk)
+
+        job = jobs.claim('w1')
+        self.assertEqual(job.pk, high.pk)
+        self.assertFalse(jobs.run(job))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('try again', job.last_error)
+
+        self.assertEqual(jobs.claim('w1').pk, low.pk)     # the retry isn't due yet
+        Job.objects.filter(pk=high.pk).update(run_at=timezone.now())
+        self.assertTrue(jobs.run(jobs.claim('w1')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.active_key), (Job.DONE, {'n': 2}, None))
+
+        # Key is free again once the job is finished
+        self.assertNotEqual(jobs.enqueue('test_flaky', {'n': 4}, dedup_key='k').pk, high.pk)
+
+    def test_gives_up_after_max_attempts_and_requeues_stale(self):
+        from . import jobs
+
+        job = jobs.enqueue('test_flaky', {'n': 1}, max_attempts=1)
+        jobs.run(jobs.claim('w1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+        stuck = jobs.enqueue('test_flaky', {'n': 2})
+        jobs.claim('dead-worker')
+        Job.objects.filter(pk=stuck.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(60), 1)
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, Job.QUEUED)
+
+    def test_prune_finished_keeps_recent_and_unfinished_jobs(self):
+        from . import jobs
+
+        old = timezone.now() - timedelta(days=30)
+        done = [jobs.enqueue('test_flaky', {'n': n}) for n in range(3)]
+        Job.objects.filter(pk__in=[job.pk for job in done[:2]]).update(status=Job.DONE, finished_at=old)
+        Job.objects.filter(pk=done[2].pk).update(status=Job.FAILED, finished_at=timezone.now())
+        queued = jobs.enqueue('test_flaky', {'n': 9})
+
+        self.assertEqual(jobs.prune_finished(older_than_days=7, batch_size=1), 2)
+        self.assertEqual(sorted(Job.objects.values_list('id', flat=True)), [done[2].pk, queued.pk])
+
+    def test_report_is_a_heartbeat_and_a_requeued_run_keeps_its_state(self):
+        from . import jobs
+
+        long_ago = timezone.now() - timedelta(hours=1)
+        outcomes = []
+
+        def slow(n):
+            # Claimed long ago, but still reporting: not stale
+            Job.objects.filter(locked_by='w1').update(locked_at=long_ago)
+            outcomes.append(jobs.report({'done': n}))
+            outcomes.append(jobs.requeue_stale(60))
+            # Silent past the timeout: requeued, and claimed again by w2
+            Job.objects.filter(locked_by='w1').update(locked_at=long_ago)
+            jobs.requeue_stale(60)
+            outcomes.append(jobs.claim('w2').pk)
+            outcomes.append(jobs.report({'done': n + 1}))
+            return {'done': n}
+
+        jobs.TASKS['test_slow'] = slow
+        self.addCleanup(jobs.TASKS.pop, 'test_slow')
+        job = jobs.enqueue('test_slow', {'n': 1})
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.run(jobs.claim('w1'))
+        self.assertEqual(outcomes, [True, 0, job.pk, False])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.result), (Job.RUNNING, 'w2', {'done': 1}))
+
+    def test_patient_delete_is_queued_and_status_endpoint(self):
+        staff = User.objects.create_user(username='admin', password='pass', is_staff=True)
+        patient = make_patient('alice')
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('core:patient_delete', kwargs={'pk': patient.pk}))
+        self.assertRedirects(response, reverse('core:patient_list'))
+        self.assertTrue(Patient.objects.filter(pk=patient.pk).exists())
+
+        job = Job.objects.get(name='delete_patient')
+        status_url = reverse('core:job_status', kwargs={'pk': job.pk})
+        self.assertEqual(self.client.get(status_url).json()['status'], 'queued')
+
+        from . import jobs
+        jobs.run(jobs.claim('w1'))
+        self.assertFalse(Patient.objects.filter(pk=patient.pk).exists())
+        self.assertTrue(self.client.get(status_url).json()['result']['deleted'])
+
+        self.client.force_login(make_patient('bob').user)
+        self.assertEqual(self.client.get(status_url).status_code, 403)
+
+
+class RunWorkersTests(TransactionTestCase):
+
+    def test_threads_drain_the_queue_once(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from . import jobs
+
+        seen = []
+        jobs.TASKS['test_record'] = lambda n: seen.append(n)
+        self.addCleanup(jobs.TASKS.pop, 'test_record')
+        for n in range(20):
+            jobs.enqueue('test_record', {'n': n})
+
+        out = StringIO()
+        call_command('run_workers', threads=3, burst=True, poll=0.1, stdout=out)
+
+        self.assertEqual(sorted(seen), list(range(20)))
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 20)
+        self.assertIn('Ran 20 job(s)', out.getvalue())
+
+
+# ---------------------------------------------------
+# VIEW BENCHMARK SUITE
+# ---------------------------------------------------
+class BenchViewsTests(TestCase):
+
+    def setUp(self):
+        use_temp_pdf_cache(self)
+        use_temp_search_index(self)
+        use_locmem_caches(self)
+        seed_clinic(3)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def bench(self, *args, **options):
+        from io import StringIO
+        from django.core.management import call_command
+
+        call_command('bench_views', *args, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_runs_every_case_and_flags_regressions(self):
+        import json
+        from django.core.management.base import CommandError
+        from core.management.commands.bench_views import CASES
+
+        output = f'{self.dir}/run.json'
+        self.bench(repeat=2, output=output)
+        with open(output) as fh:
+            results = json.load(fh)
+
+        rows = results['runs'][0]['results']
+        self.assertEqual(len(rows), len(CASES))
+        for row in rows:
+            self.assertLess(row['status'], 400, row['case'])
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+
+        self.bench('--compare', output, output)
+
+        rows[0]['queries'] -= 1
+        baseline = f'{self.dir}/baseline.json'
+        with open(baseline, 'w') as fh:
+            json.dump(results, fh)
+        with self.assertRaisesMessage(CommandError, '1 regression'):
+            self.bench('--compare', baseline, output)
+
+
+# ---------------------------------------------------
+# BULK PATIENT IMPORT
+# ---------------------------------------------------
+class ImportPatientsTests(TestCase):
+
+    def write(self, name, text):
+        import os
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, name)
+        with open(path, 'w') as fh:
+            fh.write(text)
+        return path
+
+    def test_csv_import_validates_and_batches(self):
+        from io import StringIO
+        from django.contrib.auth import authenticate
+        from django.core.management import call_command
+
+        make_patient('taken')
+        path = self.write('patients.csv', '\n'.join([
+            'username,first_name,last_name,email,phone,age,gender,password',
+            'ann,Ann,Lee,ann@example.com,555,34,female,s3cret',
+            'bob,Bob,,,556,51,Male,',
+            'bad user!,X,,,,1,male,',        # invalid username
+            'cy,Cy,,not-an-email,,3,male,',  # invalid email
+            'ann,Ann,Again,,,34,female,',    # duplicate in file
+            'taken,T,,,,20,male,',           # already in the database
+            'dee,Dee,,,,abc,female,',        # bad age
+            'eve,Eve,,,,29,other,',
+        ]))
+        out = StringIO()
+        call_command('import_patients', path, batch_size=3, workers=2, stdout=out)
+
+        self.assertIn('Imported 3 patients (5 rejected)', out.getvalue())
+        self.assertEqual(
+            sorted(Patient.objects.filter(user__username__in=['ann', 'bob', 'eve'])
+                   .values_list('user__username', 'gender')),
+            [('ann', 'Female'), ('bob', 'Male'), ('eve', 'Other')],
+        )
+        self.assertIsNotNone(authenticate(username='ann', password='s3cret'))
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+
+    def test_usernames_clash_case_insensitively(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .management.commands.import_patients import Command
+
+        make_patient('Alice')
+        path = self.write('patients.csv', 'username,age\nalice,30\nBOB,40\nbob,41\n')
+        out = StringIO()
+        call_command('import_patients', path, workers=0, stdout=out)
+        self.assertIn('Imported 1 patients (2 rejected)', out.getvalue())
+        self.assertEqual(User.objects.filter(username__iexact='bob').get().username, 'BOB')
+
+        # A clash only the database sees (e.g. its collation) rejects that row alone
+        rows = [(1, {'username': 'BOB', 'first_name': '', 'last_name': '', 'email': '', 'password': None,
+                     'phone': '', 'age': 1, 'gender': 'Other'}),
+                (2, {'username': 'cy', 'first_name': '', 'last_name': '', 'email': '', 'password': None,
+                     'phone': '', 'age': 2, 'gender': 'Other'})]
+        self.assertEqual(Command().insert(rows, None), (1, [(1, 'username already exists')]))
+        self.assertTrue(Patient.objects.filter(user__username='cy').exists())
+
+    def test_jsonl_import_resumes_from_checkpoint(self):
+        import json
+        from io import StringIO
+        from django.core.management import call_command
+
+        lines = [json.dumps({'username': f'u{i}', 'age': 20 + i, 'phone': str(i)}) for i in range(1, 6)]
+        path = self.write('patients.jsonl', '\n'.join(lines) + '\n')
+        with open(path + '.checkpoint', 'w') as fh:
+            json.dump({'line': 2, 'imported': 2, 'rejected': 0}, fh)
+
+        call_command('import_patients', path, workers=0, stdout=StringIO())
+
+        self.assertEqual(sorted(User.objects.filter(is_patient=True).values_list('username', flat=True)),
+                         ['u3', 'u4', 'u5'])
+
+
+# ---------------------------------------------------
+# APPOINTMENT REMINDERS
+# ---------------------------------------------------
+class ReminderTests(TestCase):
+
+    class ListSink:
+        def __init__(self):
+            self.sent = []
+
+        def send(self, reminder):
+            self.sent.append((reminder.appointment_id, reminder.offset_minutes))
+
+    def setUp(self):
+        self.doctor = make_doctor('house')
+        self.patient = make_patient('alice')
+        self.now = local_dt(2030, 5, 1, 8, 0)
+
+    def book(self, **delta):
+        return Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                          date_time=self.now + timedelta(**delta), status='Pending')
+
+    def test_fires_each_offset_once_from_a_sliding_window(self):
+        from .reminders import Scheduler
+
+        soon = self.book(minutes=65)               # 1h reminder at 08:05
+        tomorrow = self.book(days=1, minutes=5)    # 24h reminder at 08:05
+        self.book(days=3)                          # outside every window
+
+        sink = self.ListSink()
+        scheduler = Scheduler(sink, offsets=[1440, 60], horizon=timedelta(minutes=10))
+        self.assertEqual(scheduler.refill(self.now), 2)
+        self.assertEqual(scheduler.fire_due(self.now), 0)
+        self.assertEqual(scheduler.fire_due(self.now + timedelta(minutes=5)), 2)
+
+        # Booked after the first refresh but before its reminder is due
+        late = self.book(minutes=68)
+        for minutes in (10, 20, 30, 40, 50, 60, 70):
+            at = self.now + timedelta(minutes=minutes)
+            scheduler.refill(at)
+            scheduler.fire_due(at)
+
+        self.assertEqual(sink.sent, [(soon.pk, 60), (tomorrow.pk, 1440), (late.pk, 60)])
+        self.assertEqual(ReminderDelivery.objects.count(), 3)
+        self.assertLessEqual(len(scheduler.heap), 1)
+
+    def test_restart_skips_sent_moved_and_rejected(self):
+        from .reminders import Scheduler
+
+        sent = self.book(minutes=50)
+        moved = self.book(minutes=55)
+        rejected = self.book(minutes=58)
+        first = self.ListSink()
+        scheduler = Scheduler(first, offsets=[60])
+        scheduler.refill(self.now)
+        scheduler.fire_due(self.now)
+        self.assertEqual(first.sent, [(sent.pk, 60), (moved.pk, 60), (rejected.pk, 60)])
+
+        ReminderDelivery.objects.exclude(appointment_id=sent.pk).delete()
+        second = self.ListSink()
+        restarted = Scheduler(second, offsets=[60])
+        restarted.refill(self.now)
+        moved.date_time += timedelta(days=1)
+        moved.save()
+        rejected.status = 'Rejected'
+        rejected.save()
+        restarted.fire_due(self.now)
+        self.assertEqual(second.sent, [])
+
+    def test_failed_send_is_retried(self):
+        from .reminders import Scheduler
+
+        appointment = self.book(minutes=50)
+
+        class FlakySink(self.ListSink):
+            def send(self, reminder):
+                if not self.sent:
+                    self.sent.append(None)
+                    raise ConnectionError('gateway down')
+                super().send(reminder)
+
+        sink = FlakySink()
+        scheduler = Scheduler(sink, offsets=[60], retry_after=timedelta(minutes=1))
+        scheduler.refill(self.now)
+        with self.assertLogs('core.reminders', 'ERROR'):
+            self.assertEqual(scheduler.fire_due(self.now), 0)
+        self.assertFalse(ReminderDelivery.objects.exists())
+        self.assertEqual(scheduler.fire_due(self.now + timedelta(minutes=1)), 1)
+        self.assertEqual(sink.sent, [None, (appointment.pk, 60)])
+
+    def test_command_writes_file_sink_once(self):
+        import json
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'reminders.jsonl')
+        appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, status='Confirmed',
+                                                 date_time=timezone.now() + timedelta(minutes=59))
+
+        for _ in range(2):
+            call_command('send_reminders', once=True, sink='file', output=path, stdout=StringIO())
+
+        with open(path) as fh:
+            lines = [json.loads(line) for line in fh]
+        self.assertEqual([(line['appointment_id'], line['offset_minutes'], line['patient']) for line in lines],
+                         [(appointment.pk, 60, 'Alice')])
@@ -0,0 +1,113 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Appointment, ArchivedAppointment, ArchivedMedicalRecord, MedicalRecord
+from .pagination import decode_cursor, encode_cursor
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+# ---------------------------------------------------
+# SOURCES
+# ---------------------------------------------------
+# A patient's timeline is four streams, each already in timeline order:
+# live and archived appointments, live and archived records. Each page
+# reads at most limit+1 rows from every stream (one indexed query each,
+# doctor names joined in) and merges them lazily, so a page costs four
+# queries whether the patient has ten entries or ten thousand.
+#
+# Order is newest first by (time, kind rank, id); the rank breaks ties
+# between an appointment and a record at the same instant.
+Entry = namedtuple('Entry', 'kind at obj archived')
+
+SOURCES = [
+    # (kind, rank, model, time field, archived)
+    ('appointment', 1, Appointment, 'date_time', False),
+    ('appointment', 1, ArchivedAppointment, 'date_time', True),
+    ('record', 0, MedicalRecord, 'created_at', False),
+    ('record', 0, ArchivedMedicalRecord, 'created_at', True),
+]
+RANKS = {'appointment': 1, 'record': 0}
+
+
+def _older_than(field, rank, cursor):
+    """Rows that come after `cursor` = (at, rank, id) in newest-first order."""
+    at, cursor_rank, pk = cursor
+    condition = Q(**{f'{field}__lt': at})
+    if rank < cursor_rank:
+        condition |= Q(**{field: at})
+    elif rank == cursor_rank:
+        condition |= Q(**{field: at, 'id__lt': pk})
+    return condition
+
+
+def _stream(patient, source, cursor, limit):
+    kind, rank, model, field, archived = source
+    rows = model.objects.filter(patient=patient).select_related('doctor__user')
+    if cursor is not None:
+        rows = rows.filter(_older_than(field, rank, cursor))
+    rows = rows.order_by(f'-{field}', '-id')[:limit]
+    return (Entry(kind, getattr(obj, field), obj, archived) for obj in rows)
+
+
+def _sort_key(entry):
+    return (entry.at, RANKS[entry.kind], entry.obj.pk)
+
+
+def _parse_cursor(token):
+    decoded = decode_cursor(token) if token else None
+    if decoded is None:
+        return None
+    try:
+        at, rank, pk = decoded[0]
+        return datetime.fromisoformat(at), int(rank), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+# ---------------------------------------------------
+# PUBLIC API
+# ---------------------------------------------------
+def patient_timeline(patient, limit=DEFAULT_LIMIT, cursor=None):
+    """Return (entries, next_cursor) for one page of `patient`'s history, newest first."""
+    key = _parse_cursor(cursor)
+    streams = [_stream(patient, source, key, limit + 1) for source in SOURCES]
+    merged = heapq.merge(*streams, key=_sort_key, reverse=True)
+
+    entries = list(islice(merged, limit + 1))
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        at, rank, pk = _sort_key(entries[-1])
+        next_cursor = encode_cursor([at.isoformat(), rank, pk], 'n')
+    return entries, next_cursor
+
+
+def _doctor_name(doctor):
+    return doctor.user.get_full_name() if doctor else None
+
+
+def as_json(entry):
+    obj = entry.obj
+    data = {
+        'type': entry.kind,
+        'id': obj.pk,
+        'at': timezone.localtime(entry.at).isoformat(),
+        'doctor': _doctor_name(obj.doctor),
+        'archived': entry.archived,
+    }
+    if entry.kind == 'appointment':
+        data['status'] = obj.status
+        data['specialization'] = obj.doctor.specialization
+    else:
+        data['description'] = obj.description
+        data['pdf'] = reverse('core:record_pdf', kwargs={'pk': obj.pk})
+    return data
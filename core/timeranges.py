@@ -0,0 +1,30 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+# ---------------------------------------------------
+# HALF-OPEN DATETIME RANGES
+# ---------------------------------------------------
+# Filtering with `date_time__date=...` wraps the column in a function
+# (DATE(CONVERT_TZ(...))) so no index can be used. These helpers turn a
+# local calendar day / date span into [start, end) datetimes instead:
+#     .filter(date_time__gte=start, date_time__lt=end)
+def start_of_day(day, tz=None):
+    tz = tz or timezone.get_current_timezone()
+    return timezone.make_aware(datetime.combine(day, time.min), tz)
+
+
+def date_range(first_day, last_day, tz=None):
+    """[start of first_day, start of the day after last_day) in local time."""
+    return start_of_day(first_day, tz), start_of_day(last_day + timedelta(days=1), tz)
+
+
+def day_range(day=None, tz=None):
+    day = day or timezone.localdate()
+    return date_range(day, day, tz)
+
+
+def in_range(field, bounds):
+    start, end = bounds
+    return {f'{field}__gte': start, f'{field}__lt': end}
@@ -0,0 +1,64 @@
+from django.db import transaction
+
+from . import buckets, events
+from .models import Appointment
+from .timeranges import day_range, in_range
+
+
+# ---------------------------------------------------
+# BULK STATUS CHANGES
+# ---------------------------------------------------
+# A doctor clears their Pending queue in one request: the matching rows are
+# locked and read (id, date_time only), changed with one conditional UPDATE
+# that repeats the ownership and status checks, and the rollups/counters are
+# moved in bulk. Appointment.save() and its signals are skipped on purpose,
+# so this function does their work: active_slot, the buckets and the status
+# history.
+ACTIONS = {'approve': 'Confirmed', 'reject': 'Rejected'}
+FROM_STATUS = 'Pending'
+MAX_IDS = 1000
+
+UPDATED, NOT_PENDING, NOT_FOUND = 'updated', 'not_pending', 'not_found'
+
+
+def apply(doctor_id, action, ids=None, day=None):
+    """
+    Move the doctor's Pending appointments - `ids`, all of them on `day`, or
+    both filters together - to the status of `action`.
+
+    Returns {id: result}: 'updated' for every changed row and, for requested
+    ids that were left alone, 'not_pending' or 'not_found' (which also covers
+    other doctors' appointments).
+    """
+    new_status = ACTIONS[action]
+    selection = Appointment.objects.filter(doctor_id=doctor_id)
+    if ids is not None:
+        selection = selection.filter(pk__in=ids)
+    if day is not None:
+        selection = selection.filter(**in_range('date_time', day_range(day)))
+
+    with transaction.atomic():
+        rows = list(
+            selection.filter(status=FROM_STATUS)
+            .select_for_update()
+            .values_list('id', 'date_time')
+        )
+        changed = [pk for pk, _ in rows]
+        if changed:
+            Appointment.objects.filter(pk__in=changed, doctor_id=doctor_id, status=FROM_STATUS).update(
+                status=new_status,
+                active_slot=None if new_status == 'Rejected' else True,
+            )
+            buckets.move_many(
+                ((date_time, doctor_id, FROM_STATUS), (date_time, doctor_id, new_status))
+                for _, date_time in rows
+            )
+            for pk in changed:
+                events.record(pk, doctor_id, FROM_STATUS, new_status)
+
+    results = dict.fromkeys(changed, UPDATED)
+    missing = [pk for pk in ids or () if pk not in results]
+    if missing:
+        owned = set(Appointment.objects.filter(pk__in=missing, doctor_id=doctor_id).values_list('id', flat=True))
+        results.update((pk, NOT_PENDING if pk in owned else NOT_FOUND) for pk in missing)
+    return results
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -14,7 +15,8 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
 
     # Dashboard (after login)
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', views.dashboard_async if settings.ASYNC_DASHBOARDS else views.dashboard,
+         name='dashboard'),
 
     # Patients
     path('patients/', views.patient_list, name='patient_list'),
@@ -22,6 +24,9 @@ urlpatterns = [
     path('patients/<int:pk>/', views.patient_profile, name='patient_profile'),
     path('patients/<int:pk>/edit/', views.patient_edit, name='patient_edit'),
     path('patients/<int:pk>/delete/', views.patient_delete, name='patient_delete'),
+    path('patients/<int:pk>/export/', views.patient_export, name='patient_export'),
+    path('patients/<int:pk>/timeline/', views.patient_timeline, name='patient_timeline'),
+    path('export/<str:kind>/', views.table_export, name='table_export'),
 
     # Appointments
     path('appointments/', views.appointment_list, name='appointment_list'),
@@ -32,6 +37,8 @@ urlpatterns = [
     # ✅ NEW Doctor URLs
     path('doctors/<int:pk>/', views.doctor_profile, name='doctor_profile'),
     path('doctors/', views.doctor_list, name='doctor_list'),
+    path('doctors/<int:pk>/availability/', views.doctor_availability, name='doctor_availability'),
+    path('doctors/available-slots/', views.available_slots, name='available_slots'),
 
 
     path('services/', views.services, name='services'),
@@ -41,15 +48,20 @@ urlpatterns = [
 
     path('appointments/<int:pk>/approve/', views.approve_appointment, name='approve_appointment'),
     path('appointments/<int:pk>/reject/', views.reject_appointment, name='reject_appointment'),
+    path('appointments/bulk-status/', views.appointment_bulk_status, name='appointment_bulk_status'),
 
     
     
     # Admin – view all medical records
     path('records/', views.record_list, name='record_list'),
+    path('records/search/', views.record_search, name='record_search'),
 
     path('record/<int:pk>/delete/', views.record_delete, name='record_delete'),
     path('record/<int:pk>/pdf/', views.record_pdf, name='record_pdf'),
 
+    # Background jobs
+    path('jobs/<int:pk>/', views.job_status, name='job_status'),
+
    
     
     
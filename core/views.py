@@ -3,12 +3,21 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
-from django.http import HttpResponseForbidden
-from datetime import date
-from .models import Patient, Appointment, Doctor, MedicalRecord
+from django.http import Http404, HttpResponseForbidden, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from datetime import date, timedelta
+from .models import Patient, Appointment, Doctor, Job, MedicalRecord
 from .forms import PatientForm, AppointmentForm, MedicalRecordForm, SignupForm
-from reportlab.pdfgen import canvas
-from django.http import HttpResponse
+from . import (
+    archive, availability, booking, dashboards, deletion, directory, exports, jobs, pdfs, search, timeline,
+    transitions,
+)
+from .pagination import paginate
+from .timeranges import start_of_day
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 
 
 # ---------------------------------------------------
@@ -86,116 +95,54 @@ def signup_view(request):
 # ---------------------------------------------------
 # ROLE-BASED DASHBOARD
 # ---------------------------------------------------
+# Queries live in core.dashboards; `dashboard` runs them in sequence (WSGI),
+# `dashboard_async` runs them concurrently (ASGI, see ASYNC_DASHBOARDS).
 @login_required
 def dashboard(request):
     user = request.user
 
-# ---------------------------------------------------
     # PATIENT DASHBOARD
-    # -------------------------------
     if user.is_patient and not user.is_staff:
-        patient = Patient.objects.get(user=user)
-
-        appointments = Appointment.objects.filter(
-            patient=patient
-        ).order_by('-date_time')
+        patient = request.profiles.patient
+        results = dashboards.run(dashboards.patient_queries(patient))
+        return render(request, 'dashboard_patient.html', {'patient': patient, **results})
 
-        records = MedicalRecord.objects.filter(
-            patient=patient
-        ).order_by('-created_at')
-
-        return render(request, 'dashboard_patient.html', {
-            'patient': patient,
-            'appointments': appointments,
-            'records': records,
-        })
+    # DOCTOR DASHBOARD
+    if user.is_doctor and not user.is_staff:
+        doctor = request.profiles.doctor
+        results = dashboards.run(dashboards.doctor_queries(doctor))
+        return render(request, 'dashboard_doctor.html', dashboards.doctor_context(doctor, results))
 
+    # ADMIN DASHBOARD
+    if user.is_staff:
+        results = dashboards.run(dashboards.staff_queries())
+        return render(request, 'dashboard_admin.html', dashboards.staff_context(results))
 
 
-    # DOCTOR DASHBOARD
-    if user.is_doctor and not user.is_staff:
-        doctor = Doctor.objects.get(user=user)
+@login_required
+async def dashboard_async(request):
+    user = await request.auser()
 
-        appointments = Appointment.objects.filter(
-            doctor=doctor
-        ).order_by('-date_time')
+    if user.is_staff:
+        results = await dashboards.arun(dashboards.staff_queries())
+        template, context = 'dashboard_admin.html', dashboards.staff_context(results)
 
-        patients = Patient.objects.filter(
-            appointment__doctor=doctor
-        ).distinct()
+    elif user.is_patient:
+        patient = await dashboards.in_worker(lambda: request.profiles.patient)()
+        results = await dashboards.arun(dashboards.patient_queries(patient))
+        template, context = 'dashboard_patient.html', {'patient': patient, **results}
 
-        records = MedicalRecord.objects.filter(
-            patient__appointment__doctor=doctor
-        ).distinct()
+    elif user.is_doctor:
+        doctor = await dashboards.in_worker(lambda: request.profiles.doctor)()
+        results = await dashboards.arun(dashboards.doctor_queries(doctor))
+        template, context = 'dashboard_doctor.html', dashboards.doctor_context(doctor, results)
 
-        return render(request, 'dashboard_doctor.html', {
-            'doctor': doctor,
-            'appointments': appointments,
-            'patients': patients,
-            'records': records,
-        })
+    else:
+        return HttpResponseForbidden("Not allowed.")
 
-    # ADMIN DASHBOARD
-    if user.is_staff:
-        from django.db.models import Count
-        from collections import OrderedDict
-
-        # --------- BASIC STATS ----------
-        total_patients = Patient.objects.count()
-        total_appointments = Appointment.objects.count()
-        doctors_count = Doctor.objects.count()
-        todays_appointments = Appointment.objects.filter(date_time__date=date.today())
-
-        # --------- STATUS COUNTS (for pie chart) ----------
-        # Initialize all to 0 so chart never breaks
-        pending_count = 0
-        confirmed_count = 0
-        completed_count = 0
-        rejected_count = 0
-
-        status_qs = (
-            Appointment.objects
-            .values('status')
-            .annotate(total=Count('id'))
-        )
-
-        for row in status_qs:
-            status = row['status']
-            total = row['total']
-            if status == 'Pending':
-                pending_count = total
-            elif status == 'Confirmed':
-                confirmed_count = total
-            elif status == 'Completed':
-                completed_count = total
-            elif status == 'Rejected':
-                rejected_count = total
-
-        # --------- MONTHLY COUNTS (for bar chart) ----------
-        monthly = OrderedDict()
-
-        for appt in Appointment.objects.order_by('date_time'):
-            # Example: "Dec 2025"
-            label = appt.date_time.strftime('%b %Y')
-            monthly[label] = monthly.get(label, 0) + 1
-
-        month_labels = list(monthly.keys())
-        month_counts = list(monthly.values())
-
-        return render(request, 'dashboard_admin.html', {
-            'total_patients': total_patients,
-            'total_appointments': total_appointments,
-            'doctors_count': doctors_count,
-            'todays_appointments': todays_appointments,
-
-            # chart data
-            'pending_count': pending_count,
-            'confirmed_count': confirmed_count,
-            'completed_count': completed_count,
-            'rejected_count': rejected_count,
-            'month_labels': month_labels,
-            'month_counts': month_counts,
-        })
+    # Rendering is sync (messages touch the session); on a worker thread so
+    # concurrent requests don't queue behind one another
+    return await dashboards.in_worker(render)(request, template, context)
 
 
 
@@ -205,13 +152,12 @@ def dashboard(request):
 @login_required
 def patient_list(request):
     if request.user.is_patient and not request.user.is_staff:
-        patient = Patient.objects.get(user=request.user)
-        return redirect('core:patient_profile', pk=patient.pk)
+        return redirect('core:patient_profile', pk=request.profiles.patient_id)
 
     if not (request.user.is_doctor or request.user.is_staff):
         return HttpResponseForbidden("Not allowed.")
 
-    patients = Patient.objects.all()
+    patients = paginate(request, Patient.objects.select_related('user'), ('id',))
     return render(request, 'patients/patient_list.html', {'patients': patients})
 
 
@@ -262,7 +208,7 @@ def patient_edit(request, pk):
 # ---------------------------------------------------
 @login_required
 def patient_profile(request, pk):
-    patient = get_object_or_404(Patient, pk=pk)
+    patient = get_object_or_404(Patient.objects.select_related('user'), pk=pk)
 
     # ---------------------------
     # PATIENT ACCESS CONTROL FIX
@@ -283,8 +229,9 @@ def patient_profile(request, pk):
     print("🟦 FULL NAME:", patient.user.get_full_name())
     print("🟦 EMAIL:", patient.user.email)
 
-    records = MedicalRecord.objects.filter(patient=patient)
-    appointments = Appointment.objects.filter(patient=patient)
+    # Full history: live rows plus anything moved to the archive tables
+    records = archive.patient_records(patient)
+    appointments = archive.patient_appointments(patient)
 
     return render(request, 'patients/patient_profile.html', {
         'patient': patient,
@@ -295,6 +242,33 @@ def patient_profile(request, pk):
 
 
 
+# ---------------------------------------------------
+# PATIENT TIMELINE (JSON: appointments + records, newest first)
+# ---------------------------------------------------
+@login_required
+def patient_timeline(request, pk):
+    patient = get_object_or_404(Patient, pk=pk)
+
+    # Patients see their own timeline; doctors and admin see anyone's
+    if request.user.is_patient and not request.user.is_staff:
+        if patient.user_id != request.user.pk:
+            return HttpResponseForbidden("Not allowed.")
+    elif not (request.user.is_doctor or request.user.is_staff):
+        return HttpResponseForbidden("Not allowed.")
+
+    try:
+        limit = min(max(int(request.GET.get('limit', timeline.DEFAULT_LIMIT)), 1), timeline.MAX_LIMIT)
+    except ValueError:
+        return HttpResponseBadRequest("limit must be a number.")
+
+    entries, next_cursor = timeline.patient_timeline(patient, limit, request.GET.get('cursor'))
+    return JsonResponse({
+        'patient': patient.pk,
+        'entries': [timeline.as_json(entry) for entry in entries],
+        'next': next_cursor,
+    })
+
+
 # ---------------------------------------------------
 # DELETE PATIENT
 # ---------------------------------------------------
@@ -304,14 +278,67 @@ def patient_delete(request, pk):
         return HttpResponseForbidden("Not allowed.")
 
     patient = get_object_or_404(Patient, pk=pk)
-    user = patient.user
-    patient.delete()
-    user.delete()
 
-    messages.success(request, "Patient deleted.")
+    # Flag it now, delete the (possibly long) history in batches from a worker
+    with transaction.atomic():
+        deletion.mark_pending(patient)
+        jobs.enqueue('delete_patient', {'patient_id': patient.pk}, priority=10,
+                     dedup_key=f'delete_patient:{patient.pk}', user=request.user)
+
+    messages.success(request, "Patient deletion scheduled.")
     return redirect('core:patient_list')
 
 
+# ---------------------------------------------------
+# EXPORT PATIENT HISTORY (ZIP of record PDFs + appointments CSV)
+# ---------------------------------------------------
+@login_required
+def patient_export(request, pk):
+    if not (request.user.is_doctor or request.user.is_staff):
+        return HttpResponseForbidden("Not allowed.")
+
+    patient = get_object_or_404(Patient, pk=pk)
+    # Doctors get their own records only, like record_pdf
+    doctor = request.profiles.doctor if request.user.is_doctor else None
+
+    response = StreamingHttpResponse(exports.patient_archive(patient, doctor=doctor),
+                                     content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{exports.patient_archive_name(patient)}"'
+    return response
+
+
+# ---------------------------------------------------
+# EXPORT APPOINTMENTS / RECORDS (Admin only, streamed CSV or JSONL)
+# ---------------------------------------------------
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+@login_required
+def table_export(request, kind):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Only admin can export data.")
+    if kind not in exports.EXPORTS:
+        raise Http404("Unknown export.")
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return HttpResponseBadRequest("format must be csv or jsonl.")
+    compress = request.GET.get('gzip') in ('1', 'true', 'yes')
+    try:
+        filters = exports.parse_filters(kind, request.GET)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    response = StreamingHttpResponse(
+        exports.table_export(kind, filters, fmt, compress),
+        content_type='application/gzip' if compress else EXPORT_CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{exports.table_export_name(kind, fmt, compress)}"'
+    )
+    return response
+
+
 # ---------------------------------------------------
 # APPOINTMENTS LIST
 # ---------------------------------------------------
@@ -320,16 +347,20 @@ def appointment_list(request):
     user = request.user
 
     if user.is_patient:
-        patient = Patient.objects.get(user=user)
-        appointments = Appointment.objects.filter(patient=patient)
+        appointments = Appointment.objects.filter(patient=request.profiles.patient)
 
     elif user.is_doctor:
-        doctor = Doctor.objects.get(user=user)
-        appointments = Appointment.objects.filter(doctor=doctor)
+        appointments = Appointment.objects.filter(doctor=request.profiles.doctor)
 
     else:
         appointments = Appointment.objects.all()
 
+    appointments = paginate(
+        request,
+        appointments.select_related('patient__user', 'doctor__user'),
+        ('-date_time', '-id'),
+    )
+
     return render(request, 'appointments/appointment_list.html', {
         'appointments': appointments
     })
@@ -354,16 +385,22 @@ def appointment_create(request):
             # Patient making appointment
             # ---------------------------
             if request.user.is_patient:
-                appointment.patient = Patient.objects.get(user=request.user)
+                appointment.patient = request.profiles.patient
                 appointment.status = "Pending"
 
             # ---------------------------
             # Doctor logged in
             # ---------------------------
             elif request.user.is_doctor:
-                appointment.doctor = Doctor.objects.get(user=request.user)
+                appointment.doctor = request.profiles.doctor
+
+            try:
+                booking.book(appointment)
+            except booking.SlotUnavailable as exc:
+                # Lost the race for this slot to another request
+                form.add_error(None, exc.message)
+                return render(request, 'appointments/appointment_form.html', {'form': form}, status=409)
 
-            appointment.save()
             messages.success(request, "Appointment created successfully.")
             return redirect('core:appointment_list')
 
@@ -381,7 +418,7 @@ def appointment_create(request):
 # ---------------------------------------------------
 @login_required
 def appointment_edit(request, id):
-    appointment = get_object_or_404(Appointment, id=id)
+    appointment = get_object_or_404(Appointment.objects.select_related('patient__user'), id=id)
 
     if request.user.is_patient and request.user != appointment.patient.user:
         return HttpResponseForbidden("Not allowed.")
@@ -389,7 +426,12 @@ def appointment_edit(request, id):
     if request.method == 'POST':
         form = AppointmentForm(request.POST, instance=appointment)
         if form.is_valid():
-            form.save()
+            try:
+                booking.book(form.save(commit=False))
+            except booking.SlotUnavailable as exc:
+                form.add_error(None, exc.message)
+                return render(request, 'appointments/appointment_form.html', {'form': form}, status=409)
+
             messages.success(request, "Updated successfully.")
             return redirect('core:appointment_list')
     else:
@@ -403,7 +445,9 @@ def appointment_edit(request, id):
 # ---------------------------------------------------
 @login_required
 def appointment_detail(request, id):
-    appointment = get_object_or_404(Appointment, id=id)
+    appointment = get_object_or_404(
+        Appointment.objects.select_related('patient__user', 'doctor__user'), id=id
+    )
 
     if request.user.is_patient and appointment.patient.user != request.user:
         return HttpResponseForbidden("Not allowed.")
@@ -419,8 +463,7 @@ def my_profile(request):
     if not request.user.is_patient:
         return HttpResponseForbidden("Not allowed.")
 
-    patient = Patient.objects.get(user=request.user)
-    return render(request, 'patients/my_profile.html', {'patient': patient})
+    return render(request, 'patients/my_profile.html', {'patient': request.profiles.patient})
 
 
 @login_required
@@ -428,8 +471,7 @@ def my_appointments(request):
     if not request.user.is_patient:
         return HttpResponseForbidden("Not allowed.")
 
-    patient = Patient.objects.get(user=request.user)
-    appointments = Appointment.objects.filter(patient=patient)
+    appointments = Appointment.objects.filter(patient=request.profiles.patient)
 
     return render(request, 'patients/my_appointments.html', {'appointments': appointments})
 
@@ -438,21 +480,32 @@ def my_appointments(request):
 # ---------------------------------------------------
 # APPOINTMENT APPROVAL (Doctor Only)
 # ---------------------------------------------------
+def _confirm(request, appointment):
+    # A rejected appointment's slot may have been booked again since;
+    # confirming it would take the slot back (unique active slot)
+    appointment.status = "Confirmed"
+    try:
+        booking.book(appointment)
+    except booking.SlotUnavailable:
+        messages.error(request, "This time slot has already been taken by another appointment.")
+        return False
+    return True
+
+
 @login_required
 def update_appointment_status(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
 
     # Only the doctor of this appointment can change status
-    if not request.user.is_doctor or appointment.doctor.user != request.user:
+    if not request.user.is_doctor or appointment.doctor_id != request.profiles.doctor_id:
         return HttpResponseForbidden("Not allowed.")
 
     if request.method == "POST":
         action = request.POST.get("action")
 
         if action == "confirm":
-            appointment.status = "Confirmed"
-            appointment.save()
-            messages.success(request, "Appointment confirmed successfully.")
+            if _confirm(request, appointment):
+                messages.success(request, "Appointment confirmed successfully.")
 
         elif action == "reject":
             appointment.status = "Rejected"
@@ -470,8 +523,7 @@ def my_records(request):
     if not request.user.is_patient:
         return HttpResponseForbidden("Not allowed.")
 
-    patient = Patient.objects.get(user=request.user)
-    records = MedicalRecord.objects.filter(patient=patient)
+    records = MedicalRecord.objects.filter(patient=request.profiles.patient)
 
     return render(request, 'patients/my_records.html', {'records': records})
 
@@ -482,16 +534,62 @@ def my_records(request):
 # DOCTOR LIST (Public)
 # ---------------------------------------------------
 def doctor_list(request):
-    doctors = Doctor.objects.select_related('user').all()
-    return render(request, 'doctors/doctor_list.html', {'doctors': doctors})
+    # Rendered cards are cached (see core.directory)
+    return directory.respond(request, 'doctors/doctor_list.html', directory.doctor_list())
 
 
 # ---------------------------------------------------
 # DOCTOR PROFILE (Public)
 # ---------------------------------------------------
 def doctor_profile(request, pk):
+    entry = directory.doctor_profile(pk)
+    if entry is None:
+        raise Http404("No such doctor.")
+    return directory.respond(request, 'doctors/doctor_profile.html', entry)
+
+
+# ---------------------------------------------------
+# DOCTOR AVAILABILITY (Public, JSON)
+# ---------------------------------------------------
+def _parse_day(value, default):
+    try:
+        return date.fromisoformat(value) if value else default
+    except ValueError:
+        return default
+
+
+def doctor_availability(request, pk):
     doctor = get_object_or_404(Doctor, pk=pk)
-    return render(request, 'doctors/doctor_profile.html', {'doctor': doctor})
+    today = timezone.localdate()
+    first_day = _parse_day(request.GET.get('from'), today)
+    last_day = _parse_day(request.GET.get('to'), first_day + timedelta(days=6))
+    last_day = min(last_day, first_day + timedelta(days=89))   # at most 90 days
+
+    slots = availability.free_slots(doctor, first_day, last_day)
+    return JsonResponse({
+        'doctor': doctor.pk,
+        'slots': [{'start': s['start'].isoformat(), 'end': s['end'].isoformat()} for s in slots],
+    })
+
+
+def available_slots(request):
+    doctors = Doctor.objects.all()
+    if request.GET.get('specialization'):
+        doctors = doctors.filter(specialization__iexact=request.GET['specialization'])
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+        days = min(max(int(request.GET.get('days', 30)), 1), 90)
+    except ValueError:
+        return HttpResponseBadRequest("limit and days must be numbers.")
+
+    slots = availability.next_free_slots(doctors, limit=limit, days=days)
+    return JsonResponse({
+        'slots': [
+            {'doctor': s['doctor_id'], 'start': s['start'].isoformat(), 'end': s['end'].isoformat()}
+            for s in slots
+        ],
+    })
 
 
 @login_required
@@ -499,18 +597,77 @@ def record_list(request):
     if not request.user.is_staff:
         return HttpResponseForbidden("Only admin can access all medical records.")
 
-    records = MedicalRecord.objects.select_related('patient', 'doctor', 'doctor__user').order_by('-created_at')
+    records = paginate(
+        request,
+        MedicalRecord.objects.select_related('patient__user', 'doctor__user'),
+        ('-created_at', '-id'),
+    )
 
     return render(request, 'records/record_list.html', {
         'records': records
     })
 
 
+# ---------------------------------------------------
+# SEARCH MEDICAL RECORDS (ranked full-text)
+# ---------------------------------------------------
+SEARCH_PER_PAGE = 20
+
+
+@login_required
+def record_search(request):
+    query = request.GET.get('q', '').strip()
+    filters = {}
+
+    # Staff search everything, doctors their own notes, patients their own history
+    if request.user.is_staff:
+        for name in ('doctor', 'patient'):
+            if request.GET.get(name):
+                try:
+                    filters[f'{name}_id'] = int(request.GET[name])
+                except ValueError:
+                    return HttpResponseBadRequest(f"{name} must be a number.")
+    elif request.user.is_doctor:
+        filters['doctor_id'] = request.profiles.doctor_id
+    elif request.user.is_patient:
+        filters['patient_id'] = request.profiles.patient_id
+
+    # Non-staff without a profile get nothing rather than an unfiltered search
+    if not request.user.is_staff and not any(filters.values()):
+        return HttpResponseForbidden("Not allowed.")
+
+    try:
+        first = date.fromisoformat(request.GET['from']) if request.GET.get('from') else None
+        last = date.fromisoformat(request.GET['to']) if request.GET.get('to') else None
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid date or page.")
+    if first:
+        filters['start'] = start_of_day(first)
+    if last:
+        filters['end'] = start_of_day(last + timedelta(days=1))
+
+    # One extra hit tells us whether there is a next page
+    hits = search.search(query, limit=SEARCH_PER_PAGE + 1, offset=(page - 1) * SEARCH_PER_PAGE, **filters)
+    has_next = len(hits) > SEARCH_PER_PAGE
+    hits = hits[:SEARCH_PER_PAGE]
+
+    records = archive.records_by_id([hit.record_id for hit in hits])
+    results = [(records[hit.record_id], hit) for hit in hits if hit.record_id in records]
+
+    return render(request, 'records/record_search.html', {
+        'query': query,
+        'results': results,
+        'page': page,
+        'has_next': has_next,
+    })
+
+
 
 
 @login_required
 def record_create(request, patient_id):
-    patient = get_object_or_404(Patient, id=patient_id)
+    patient = get_object_or_404(Patient.objects.select_related('user'), id=patient_id)
 
     # Only doctors can add medical notes
     if not request.user.is_doctor:
@@ -521,7 +678,7 @@ def record_create(request, patient_id):
         if form.is_valid():
             record = form.save(commit=False)
             record.patient = patient
-            record.doctor = Doctor.objects.get(user=request.user)
+            record.doctor = request.profiles.doctor
             record.save()
             messages.success(request, "Medical record added successfully.")
             return redirect('core:patient_profile', pk=patient_id)
@@ -545,15 +702,14 @@ def record_delete(request, pk):
 
     # Doctor can delete only his own record
     if request.user.is_doctor:
-        doctor = Doctor.objects.get(user=request.user)
-        if record.doctor != doctor:
+        if record.doctor_id != request.profiles.doctor_id:
             return HttpResponseForbidden("You cannot delete another doctor's note.")
 
     # Admin can delete everything
     if request.user.is_staff:
         pass
 
-    patient_id = record.patient.id
+    patient_id = record.patient_id
     record.delete()
 
     messages.success(request, "Medical record deleted successfully.")
@@ -567,13 +723,11 @@ def record_delete(request, pk):
 def approve_appointment(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
 
-    if not request.user.is_doctor or appointment.doctor.user != request.user:
+    if not request.user.is_doctor or appointment.doctor_id != request.profiles.doctor_id:
         return HttpResponseForbidden("Not allowed.")
 
-    appointment.status = "Confirmed"
-    appointment.save()
-
-    messages.success(request, "Appointment approved.")
+    if _confirm(request, appointment):
+        messages.success(request, "Appointment approved.")
     return redirect('core:appointment_list')
 
 
@@ -581,7 +735,7 @@ def approve_appointment(request, pk):
 def reject_appointment(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
 
-    if not request.user.is_doctor or appointment.doctor.user != request.user:
+    if not request.user.is_doctor or appointment.doctor_id != request.profiles.doctor_id:
         return HttpResponseForbidden("Not allowed.")
 
     appointment.status = "Rejected"
@@ -591,6 +745,54 @@ def reject_appointment(request, pk):
     return redirect('core:appointment_list')
 
 
+# ---------------------------------------------------
+# DOCTOR BULK APPROVE / REJECT
+# ---------------------------------------------------
+# POST action=approve|reject plus ids=<id> (repeatable) and/or date=YYYY-MM-DD.
+# Answers with per-id results as JSON, or redirects to a local `next` URL
+# with a message (the dashboard form).
+@login_required
+def appointment_bulk_status(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    doctor_id = request.profiles.doctor_id if request.user.is_doctor else None
+    if doctor_id is None:
+        return HttpResponseForbidden("Not allowed.")
+
+    action = request.POST.get('action')
+    if action not in transitions.ACTIONS:
+        return HttpResponseBadRequest("action must be approve or reject.")
+
+    ids = day = None
+    try:
+        if 'ids' in request.POST:
+            ids = [int(pk) for pk in request.POST.getlist('ids') if pk]
+        if request.POST.get('date'):
+            day = date.fromisoformat(request.POST['date'])
+    except ValueError:
+        return HttpResponseBadRequest("ids must be numbers and date YYYY-MM-DD.")
+    if ids is None and day is None:
+        return HttpResponseBadRequest("Pass ids or a date.")
+    if ids is not None and len(ids) > transitions.MAX_IDS:
+        return HttpResponseBadRequest(f"At most {transitions.MAX_IDS} ids per request.")
+
+    results = transitions.apply(doctor_id, action, ids=ids, day=day)
+    updated = sum(result == transitions.UPDATED for result in results.values())
+    status = transitions.ACTIONS[action]
+
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        messages.success(request, f"{updated} appointment(s) {status.lower()}.")
+        return redirect(next_url)
+
+    return JsonResponse({
+        'status': status,
+        'updated': updated,
+        'results': {str(pk): result for pk, result in results.items()},
+    })
+
+
 
 
 
@@ -603,88 +805,44 @@ def reject_appointment(request, pk):
 
 @login_required
 def record_pdf(request, pk):
-    record = get_object_or_404(MedicalRecord, pk=pk)
+    record = archive.find_record(pk)
+    if record is None:
+        raise Http404("No such record.")
 
     # Permission checks
     if request.user.is_patient and record.patient.user != request.user:
         return HttpResponseForbidden("Not allowed.")
-    if request.user.is_doctor and record.doctor.user != request.user:
+    if request.user.is_doctor and (record.doctor is None or record.doctor.user != request.user):
         return HttpResponseForbidden("Not allowed.")
 
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"MedicalRecord_{record.patient.user.get_full_name().replace(' ', '_')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename=\"{filename}\"'
-
-    # Create PDF
-    p = canvas.Canvas(response)
-    p.setTitle("Medical Report")
-
-    # ---------- HEADER ----------
-    p.setFont("Helvetica-Bold", 18)
-    p.drawCentredString(300, 800, "MediCare Pro – Medical Report")
-
-    p.setLineWidth(0.5)
-    p.line(50, 785, 550, 785)
-
-    # ---------- PATIENT INFO ----------
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, 760, "Patient Information:")
-
-    p.setFont("Helvetica", 12)
-    p.drawString(70, 740, f"Name: {record.patient.user.get_full_name()}")
-    p.drawString(70, 720, f"Email: {record.patient.user.email}")
-    p.drawString(70, 700, f"Phone: {record.patient.phone}")
-
-    # ---------- DOCTOR INFO ----------
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, 670, "Doctor Information:")
-
-    p.setFont("Helvetica", 12)
-    p.drawString(70, 650, f"Doctor: {record.doctor.user.get_full_name()}")
-    p.drawString(70, 630, f"Specialization: {record.doctor.specialization}")
-
-    # ---------- MEDICAL NOTE ----------
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(50, 600, "Medical Note:")
-
-    from reportlab.platypus import Paragraph, Frame
-    from reportlab.lib.styles import getSampleStyleSheet
-
-    styles = getSampleStyleSheet()
-    style = styles["Normal"]
-    style.fontSize = 12
-    style.leading = 16
-
-    # Wrap long text
-    note_text = record.description.replace("\n", "<br/>")
-    paragraph = Paragraph(note_text, style)
-
-    # Large text area (no overlapping)
-    frame = Frame(50, 260, 500, 320, showBoundary=0)
-    frame.addFromList([paragraph], p)
-
-    # ---------- FOOTER ----------
-    p.setFont("Helvetica", 11)
-    p.drawString(50, 220, f"Created on: {record.created_at.strftime('%b %d, %Y – %I:%M %p')}")
-    p.drawString(50, 205, f"Doctor: {record.doctor.user.get_full_name()}")
-
-    # Signature line (ONLY ONCE)
-    p.line(50, 180, 250, 180)
-    p.drawString(50, 165, "Doctor Signature")
-
-    p.showPage()
-    p.save()
+    # Rendered once per content hash; repeat downloads are served from disk
+    # or answered with 304 when the browser already has this version.
+    pdf, etag = pdfs.open_pdf(record)
+    etag = f'"{etag}"'
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        pdf.close()
+        not_modified['ETag'] = etag
+        return not_modified
+
+    response = FileResponse(
+        pdf,
+        as_attachment=True,
+        filename=pdfs.download_name(record),
+        content_type='application/pdf',
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
-
-
-
-
-
-
-   
-
-
-
-   
\ No newline at end of file
+# ---------------------------------------------------
+# BACKGROUND JOB STATUS (JSON)
+# ---------------------------------------------------
+@login_required
+def job_status(request, pk):
+    job = get_object_or_404(Job, pk=pk)
+    if not (request.user.is_staff or job.created_by_id == request.user.pk):
+        return HttpResponseForbidden("Not allowed.")
+    return JsonResponse(jobs.as_json(job))
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medicare_pro.settings')
+os.environ.setdefault('MEDICARE_ASGI', '1')
 
 application = get_asgi_application()
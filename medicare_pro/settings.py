@@ -21,12 +21,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.events.EventBufferMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiles.RoleProfileMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryInstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'medicare_pro.urls'
@@ -62,6 +66,34 @@ DATABASES = {
     }
 }
 
+# Read replicas (see core.replicas): MEDICARE_REPLICAS="host[:port],..." adds
+# one alias per replica with the primary's credentials. Tests mirror them to
+# 'default'. For a local try-out with SQLite, point 'default' and 'replica1' at
+# two files, set REPLICA_DATABASES = ['replica1'] and copy the primary file over
+# the replica to "replicate".
+for i, address in enumerate(filter(None, os.environ.get('MEDICARE_REPLICAS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica{i}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica')]
+
+# Read-only views whose queries may go to a replica
+REPLICA_VIEWS = {
+    'core:dashboard',
+    'core:doctor_list',
+    'core:record_list',
+    'core:appointment_list',
+}
+
+# After a user's own write, keep their reads on the primary this long
+REPLICA_PIN_SECONDS = 5
+
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
 
@@ -80,7 +112,88 @@ STATICFILES_DIRS = [BASE_DIR / 'core' / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Rendered medical record PDFs (see core.pdfs)
+PDF_CACHE_DIR = BASE_DIR / 'var' / 'pdf_cache'
+
+# 'directory' holds the rendered public doctor pages (see core.directory).
+# File-based so an invalidation in one worker process is seen by all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'directory': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache' / 'directory',
+    },
+}
+
+# Serve the async dashboard (concurrent queries) when running under ASGI;
+# medicare_pro/asgi.py sets MEDICARE_ASGI. Each concurrent query uses its own
+# worker-thread connection, so give DATABASES a CONN_MAX_AGE there.
+ASYNC_DASHBOARDS = os.environ.get('MEDICARE_ASGI') == '1'
+
+# Keep the logged-in user's Patient/Doctor profile in the session (see core.profiles)
+PROFILE_SESSION_CACHE = True
+
+# SQLite FTS5 index over medical record descriptions (see core.search)
+SEARCH_INDEX_PATH = BASE_DIR / 'var' / 'search.sqlite3'
+
+# `manage.py archive_old_data` moves finished appointments and medical records
+# older than this many days into the archive tables (see core.archive)
+ARCHIVE_AFTER_DAYS = 365
+
+# Background jobs (see core.jobs, run by `manage.py run_workers`): first retry
+# after ~JOB_BACKOFF_SECONDS, doubling each time; a running job that hasn't
+# reported progress (jobs.report) for JOB_LOCK_TIMEOUT is assumed orphaned by
+# a dead worker and queued again.
+JOB_BACKOFF_SECONDS = 10
+JOB_LOCK_TIMEOUT = 600
+# Finished (done / failed) jobs are deleted by run_workers after this many days
+JOB_RETENTION_DAYS = 7
+
+# Patient deletion (core.deletion) removes dependent rows this many per
+# transaction, so other writers are never blocked for long
+DELETE_BATCH_SIZE = 1000
+
+# Appointment status events (core.events) are buffered per request and
+# written in one INSERT at the end, or every this many events
+STATUS_EVENT_BATCH_SIZE = 500
+
+# `manage.py send_reminders` (core.reminders): minutes before an appointment
+# to remind the patient, and where reminders go (any class with send())
+REMINDER_OFFSETS_MINUTES = [24 * 60, 60]
+REMINDER_SINK = 'core.reminders.ConsoleSink'
+REMINDER_FILE = BASE_DIR / 'var' / 'reminders.jsonl'
+
 # Login / logout redirects
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
+
+# Max queries per view (checked by core.middleware and core.tests).
+# Includes the session + user lookups of an authenticated request.
+QUERY_BUDGETS = {
+    'core:home': 0,
+    'core:index': 0,
+    'core:services': 0,
+    'core:contact': 0,
+    'core:login': 0,
+    'core:signup': 0,
+    'core:dashboard': 7,
+    'core:patient_list': 3,
+    'core:patient_create': 2,
+    'core:patient_profile': 5,
+    'core:patient_timeline': 7,  # 4 of them are the timeline streams
+    'core:patient_edit': 3,
+    'core:appointment_list': 4,
+    'core:appointment_create': 4,
+    'core:appointment_edit': 5,
+    'core:appointment_detail': 3,
+    'core:doctor_profile': 1,   # 0 once cached
+    'core:doctor_list': 1,      # 0 once cached
+    'core:record_list': 3,
+    'core:record_create': 5,
+    'core:record_pdf': 4,       # archived records: a live-table miss, then the archive
+    'core:record_search': 4,
+    'core:table_export': 2,      # rows are read while streaming, after the view returns
+}